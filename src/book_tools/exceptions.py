@@ -20,3 +20,10 @@ class EpubStructureException(EbookParserException):
 
     def __init__(self, message):
         super().__init__(f"ePub verification failed: {message}")
+
+
+class MobiStructureException(EbookParserException):
+    """Исключение при чтении заголовков книги в формате mobi"""
+
+    def __init__(self, message):
+        super().__init__(f"mobi verification failed: {message}")
@@ -5,7 +5,7 @@ from book_tools.services import create_bookfile_service, detect_mime_service
 import os
 import zipfile
 from xml import sax
-from io import BytesIO
+from io import BufferedReader, BytesIO
 from contextlib import suppress
 
 from book_tools.format.mimetype import Mimetype
@@ -93,16 +93,39 @@ def detect_mime(file, original_filename):
     return mime
 
 
-def create_bookfile(file, original_filename) -> BookFile:
-    logger.info(f"Extract metadata from {original_filename}")
+def book_stream(file):
+    """Поток содержимого книги с произвольным доступом.
+
+    Файлы в ФС и данные в памяти используются как есть: детекторы типа и
+    парсеры читают из них только нужные части книги. Остальные потоки (например,
+    книги из zip архива) позволяют эффективно читать содержимое только
+    последовательно, поэтому они считываются в память.
+
+    Args:
+        file: имя файла в ФС или поток с содержимым книги
+    """
     if isinstance(file, str):
-        logger.info(f"Read {original_filename} content from file system")
-        file = open(file, "rb")
-    file = BytesIO(file.read())
+        return open(file, "rb")
+    if isinstance(file, (BytesIO, BufferedReader)):
+        return file
+    return BytesIO(file.read())
+
+
+def create_bookfile(file, original_filename, verify=False) -> BookFile:
+    """Извлечение метаданных книги
+
+    Args:
+        file: имя файла в ФС или поток с содержимым книги
+        original_filename: имя файла книги
+        verify: проверить целостность zip архивов EPUB и FB2+ZIP (контрольные
+            суммы всех файлов архива)
+    """
+    logger.info(f"Extract metadata from {original_filename}")
+    file = book_stream(file)
     logger.info(f"Detect {original_filename} mimetype")
     mimetype = detect_mime_service(file, original_filename)
     if mimetype == Mimetype.EPUB:
-        return EPub(file, original_filename)
+        return EPub(file, original_filename, verify)
     elif mimetype == Mimetype.FB2:
         return create_bookfile_service(file, original_filename)
         #     FB2sax2(file, original_filename)
@@ -110,7 +133,7 @@ def create_bookfile(file, original_filename) -> BookFile:
         #     else FB2_(file, original_filename, Mimetype.FB2)
         # )
     elif mimetype == Mimetype.FB2_ZIP:
-        return FB2Zip(file, original_filename)
+        return FB2Zip(file, original_filename, verify)
     elif mimetype == Mimetype.MOBI:
         return Mobipocket(file, original_filename)
     elif mimetype in (
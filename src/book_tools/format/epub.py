@@ -45,8 +45,15 @@ class EPub(BookFile):
         def __init__(self, message):
             Exception.__init__(self, "ePub verification failed: " + message)
 
-    def __init__(self, file, original_filename):
+    def __init__(self, file, original_filename, verify=False):
+        """
+        Args:
+            verify: проверить контрольные суммы всех файлов архива. Проверка
+                распаковывает архив целиком, поэтому по умолчанию не выполняется
+                и читаются только container.xml, OPF и обложка.
+        """
         BookFile.__init__(self, file, original_filename, Mimetype.EPUB)
+        self.verify = verify
         self.root_filename = None
         self.cover_fileinfos = []
 
@@ -58,7 +65,7 @@ class EPub(BookFile):
         self.__zip_file = zipfile.ZipFile(self.file)
         self.issues = []
         try:
-            if self.__zip_file.testzip():
+            if self.verify and self.__zip_file.testzip():
                 raise EPub.StructureException("broken zip archive")
 
             infos = self.__zip_file.infolist()
@@ -567,9 +574,10 @@ class EPub_new(object):
         def __init__(self, message):
             Exception.__init__(self, "ePub verification failed: " + message)
 
-    def __init__(self, file, original_filename):
+    def __init__(self, file, original_filename, verify=False):
         # BookFile.__init__(self, file, original_filename, Mimetype.EPUB)
         self.file = file
+        self.verify = verify
         self.root_filename = None
         self.cover_fileinfos = []
 
@@ -581,7 +589,7 @@ class EPub_new(object):
         self.__zip_file = zipfile.ZipFile(self.file)
         self.issues = []
         try:
-            if self.__zip_file.testzip():
+            if self.verify and self.__zip_file.testzip():
                 raise EPub.StructureException("broken zip archive")
 
             infos = self.__zip_file.infolist()
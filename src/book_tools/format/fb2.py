@@ -230,9 +230,9 @@ class FB2(FB2Base):
 
 
 class FB2Zip(FB2Base):
-    def __init__(self, file: BytesIO, original_filename: str):
+    def __init__(self, file: BytesIO, original_filename: str, verify: bool = False):
         with zipfile.ZipFile(file, "r") as test:
-            if test.testzip():
+            if verify and test.testzip():
                 # некорректный zip файл
                 raise FB2StructureException("broken zip archive")
             count = len(list_zip_file_infos(test))
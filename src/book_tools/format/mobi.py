@@ -1,24 +1,157 @@
+import datetime
 import os
-import shutil
-from tempfile import mkdtemp
+import struct
 
+from book_tools.exceptions import MobiStructureException
 from book_tools.format.bookfile import BookFile
 from book_tools.format.mimetype import Mimetype
-from book_tools.pymobi.mobi import BookMobi
+from book_tools.pymobi.mobi import encryption_type
+
+PALMDB_HEADER = struct.Struct(">32s2H2L16x8s8xH")
+MOBI_IDENT = b"BOOKMOBI"
+EXTH_IDENT = b"EXTH"
+EXTH_FLAG = 0x40
+NO_RECORD = 0xFFFFFFFF
+
+# Типы записей EXTH
+EXTH_AUTHOR = 100
+EXTH_DESCRIPTION = 103
+EXTH_SUBJECT = 105
+EXTH_ASIN = 113
+EXTH_COVER_OFFSET = 201
+EXTH_THUMB_OFFSET = 202
+EXTH_LANGUAGE = 524
+
+TEXT_ENCODINGS = {1252: "cp1252", 65001: "utf-8"}
+
+
+def palm_datetime(value: int) -> datetime.datetime:
+    """Дата PalmDB: при установленном старшем бите отсчет идет от 1904 года"""
+    if value & 0x80000000:
+        start = datetime.datetime(1904, 1, 1)
+    else:
+        start = datetime.datetime(1970, 1, 1)
+    return start + datetime.timedelta(seconds=value)
+
+
+class MobiHeader:
+    """Метаданные книги MOBI/AZW3 из заголовков файла.
+
+    Читаются только заголовок PalmDB, запись 0 (заголовки PalmDOC, MOBI и EXTH)
+    и, по запросу, запись с обложкой. Таблица записей и текст книги не читаются.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        file.seek(0)
+        header = file.read(PALMDB_HEADER.size)
+        if len(header) < PALMDB_HEADER.size:
+            raise MobiStructureException("file is too short")
+        (
+            name,
+            _attributes,
+            _version,
+            _created,
+            modified,
+            ident,
+            self.records_count,
+        ) = PALMDB_HEADER.unpack(header)
+
+        self.title = name.split(b"\0", 1)[0].decode("latin-1")
+        self.modification_date = palm_datetime(modified)
+        self.authors: list[str] = []
+        self.subjects: list[str] = []
+        self.description: str | None = None
+        self.language: str | None = None
+        self.asin: str | None = None
+        self.encryption = encryption_type[0]
+        self.first_image = NO_RECORD
+        self.exth: dict[int, list[bytes]] = {}
+        if ident != MOBI_IDENT:
+            return
+
+        record0 = self.read_record(0)
+        (encryption,) = struct.unpack_from(">H", record0, 12)
+        self.encryption = encryption_type.get(encryption, "unknown")
+        if len(record0) < 0x74 or record0[16:20] != b"MOBI":
+            raise MobiStructureException("MOBI header not found")
+
+        (header_length, text_encoding) = struct.unpack_from(">L4xL", record0, 20)
+        (full_name_offset, full_name_length) = struct.unpack_from(">LL", record0, 84)
+        (self.first_image,) = struct.unpack_from(">L", record0, 108)
+        encoding = TEXT_ENCODINGS.get(text_encoding, "utf-8")
+
+        (exth_flags,) = struct.unpack_from(">L", record0, 128)
+        if exth_flags & EXTH_FLAG:
+            self.exth = self.__read_exth(record0, 16 + header_length)
+
+        full_name = record0[full_name_offset : full_name_offset + full_name_length]
+        if full_name:
+            self.title = full_name.decode(encoding, errors="replace")
+        self.authors = self.__texts(EXTH_AUTHOR, encoding)
+        self.subjects = self.__texts(EXTH_SUBJECT, encoding)
+        self.description = next(iter(self.__texts(EXTH_DESCRIPTION, encoding)), None)
+        self.language = next(iter(self.__texts(EXTH_LANGUAGE, encoding)), None)
+        self.asin = next(iter(self.__texts(EXTH_ASIN, encoding)), None)
+
+    @staticmethod
+    def __read_exth(record0: bytes, offset: int) -> dict[int, list[bytes]]:
+        ident, _length, count = struct.unpack_from(">4sLL", record0, offset)
+        if ident != EXTH_IDENT:
+            raise MobiStructureException("EXTH header not found")
+        exth: dict[int, list[bytes]] = {}
+        offset += 12
+        for _ in range(count):
+            record_type, record_length = struct.unpack_from(">LL", record0, offset)
+            if record_length < 8:
+                raise MobiStructureException("EXTH record is corrupted")
+            data = record0[offset + 8 : offset + record_length]
+            exth.setdefault(record_type, []).append(data)
+            offset += record_length
+        return exth
+
+    def __texts(self, record_type: int, encoding: str) -> list[str]:
+        return [
+            data.decode(encoding, errors="replace")
+            for data in self.exth.get(record_type, [])
+        ]
+
+    def read_record(self, index: int) -> bytes:
+        """Чтение записи PalmDB по ее номеру"""
+        if index >= self.records_count:
+            raise MobiStructureException(f"record {index} not found")
+        # Смещение записи и смещение следующей за ней (8 байт на запись)
+        self.file.seek(PALMDB_HEADER.size + index * 8)
+        entries = self.file.read(16 if index + 1 < self.records_count else 8)
+        (start,) = struct.unpack_from(">L", entries, 0)
+        self.file.seek(start)
+        if len(entries) == 16:
+            (end,) = struct.unpack_from(">L", entries, 8)
+            return self.file.read(end - start)
+        return self.file.read()
+
+    def read_cover(self, thumbnail: bool = False) -> bytes | None:
+        """Чтение изображения обложки (или ее миниатюры)"""
+        records = self.exth.get(EXTH_THUMB_OFFSET if thumbnail else EXTH_COVER_OFFSET)
+        if not records or self.first_image == NO_RECORD:
+            return None
+        (offset,) = struct.unpack(">L", records[0][:4])
+        if offset == NO_RECORD:
+            return None
+        return self.read_record(self.first_image + offset) or None
 
 
 class Mobipocket(BookFile):
     def __init__(self, file, original_filename):
         BookFile.__init__(self, file, original_filename, Mimetype.MOBI)
-        bm = BookMobi(file)
-        self._encryption_method = bm["encryption"]
-        self.__set_title__(bm["title"])
-        self.__add_author__(bm["author"])
-        self.__set_docdate__(bm["modificationDate"].strftime("%Y-%m-%d"))
-        if bm["subject"]:
-            for tag in bm["subject"]:
-                self.__add_tag__(tag)
-        self.description: str = bm["description"]
+        header = MobiHeader(file)
+        self._encryption_method = header.encryption
+        self.__set_title__(header.title)
+        for author in header.authors or ["unknown"]:
+            self.__add_author__(author)
+        self.__set_docdate__(header.modification_date.strftime("%Y-%m-%d"))
+        self.description: str | None = None
+        self.language_code = header.language
 
     def __exit__(self, kind, value, traceback):
         pass
@@ -31,20 +164,16 @@ class Mobipocket(BookFile):
         )
 
     def extract_cover_internal(self, working_dir):
-        tmp_dir = mkdtemp(dir=working_dir)
-        BookMobi(self.file).unpackMobi(tmp_dir + "/bookmobi")
-        try:
-            if os.path.isfile(tmp_dir + "/bookmobi_cover.jpg"):
-                shutil.copy(tmp_dir + "/bookmobi_cover.jpg", working_dir)
-                return ("bookmobi_cover.jpg", False)
-            else:
-                return (None, False)
-        finally:
-            shutil.rmtree(tmp_dir)
+        image = self.extract_cover_memory()
+        if not image:
+            return (None, False)
+        with open(os.path.join(working_dir, "bookmobi_cover.jpg"), "wb") as cover:
+            cover.write(image)
+        return ("bookmobi_cover.jpg", False)
 
     def extract_cover_memory(self):
         try:
-            image = BookMobi(self.file).unpackMobiCover()
+            image = MobiHeader(self.file).read_cover()
         except Exception as err:
             print(err)
             image = None
@@ -55,8 +184,7 @@ class Mobipocket(BookFile):
 class Mobipocket_new(object):
     def __init__(self, file, original_filename):
         # BookFile.__init__(self, file, original_filename, Mimetype.MOBI)
-        bm = BookMobi(file)
-        self._encryption_method = bm["encryption"]
+        self._encryption_method = MobiHeader(file).encryption
         # self.__set_title__(bm["title"])
         # self.__add_author__(bm["author"])
         # self.__set_docdate__(bm["modificationDate"].strftime("%Y-%m-%d"))
@@ -70,15 +198,14 @@ class Mobipocket_new(object):
 
     def parse_book_data(self, file, original_filename):
         book_file = BookFile(file, original_filename, Mimetype.MOBI)
-        bm = BookMobi(file)
-        self._encryption_method = bm["encryption"]
-        book_file.__set_title__(bm["title"])
-        book_file.__add_author__(bm["author"])
-        book_file.__set_docdate__(bm["modificationDate"].strftime("%Y-%m-%d"))
-        if bm["subject"]:
-            for tag in bm["subject"]:
-                book_file.__add_tag__(tag)
-        book_file.description = bm["description"]
+        header = MobiHeader(file)
+        self._encryption_method = header.encryption
+        book_file.__set_title__(header.title)
+        for author in header.authors or ["unknown"]:
+            book_file.__add_author__(author)
+        book_file.__set_docdate__(header.modification_date.strftime("%Y-%m-%d"))
+        book_file.description = None
+        book_file.language_code = header.language
         return book_file
 
     def get_encryption_info(self):
@@ -89,20 +216,16 @@ class Mobipocket_new(object):
         )
 
     def extract_cover_internal(self, file, working_dir):
-        tmp_dir = mkdtemp(dir=working_dir)
-        BookMobi(file).unpackMobi(tmp_dir + "/bookmobi")
-        try:
-            if os.path.isfile(tmp_dir + "/bookmobi_cover.jpg"):
-                shutil.copy(tmp_dir + "/bookmobi_cover.jpg", working_dir)
-                return ("bookmobi_cover.jpg", False)
-            else:
-                return (None, False)
-        finally:
-            shutil.rmtree(tmp_dir)
+        image = self.extract_cover_memory(file)
+        if not image:
+            return (None, False)
+        with open(os.path.join(working_dir, "bookmobi_cover.jpg"), "wb") as cover:
+            cover.write(image)
+        return ("bookmobi_cover.jpg", False)
 
     def extract_cover_memory(self, file):
         try:
-            image = BookMobi(file).unpackMobiCover()
+            image = MobiHeader(file).read_cover()
         except Exception as err:
             print(err)
             image = None
@@ -119,7 +119,7 @@ class FB2(EbookMetaParser):
     """Базовый класс для извлечения метаданных из книг в формате FB2 с помощью lxml."""
 
     # def __init__(self, file: BytesIO, original_filename: str, mimetype: str):
-    def __init__(self, file: BytesIO):
+    def __init__(self, file: BytesIO, header_only: bool = False):
         """Инициализация объекта.
 
         Автоматически устанавливает параметры
@@ -130,6 +130,11 @@ class FB2(EbookMetaParser):
             file (BytesIO):
                 Cодержимое файла книги для парсинга
 
+            header_only (bool):
+                Разбирать файл только до конца элемента description. Текст книги
+                и вложения (binary) при этом не читаются, поэтому обложка из
+                такого разбора не извлекается.
+
             original_filename (str):
                 Наименовние оригинального файла книги. Если файл размещен в ФС, то это наименование файла в ФС.
                 Если файл книги находится в zip архиве, то это наименование файла внутри архива.
@@ -143,13 +148,17 @@ class FB2(EbookMetaParser):
         self._etree: etree._ElementTree
         self._namespaces: dict[str, str] = {}
         self._log = logging.getLogger(str(self.__class__))
+        self._header_only = header_only
         self.parse()
 
     def parse(self):
         """Парсинг полученного файла."""
         try:
             self._file.seek(0, 0)
-            self._etree = etree.parse(self._file)
+            if self._header_only:
+                self._etree = self._parse_header()
+            else:
+                self._etree = etree.parse(self._file)
         except Exception as e:
             self._log.exception(e)
             raise FB2StructureException(f"The file is not a valid XML: {e}")
@@ -171,6 +180,23 @@ class FB2(EbookMetaParser):
         if "l" not in self._namespaces.keys():
             self._namespaces["l"] = FB2Namespace.XLINK
 
+    def _parse_header(self) -> etree._ElementTree:
+        """Инкрементальный парсинг файла до закрытия элемента description.
+
+        Returns:
+            etree._ElementTree: дерево, содержащее корневой элемент и элементы до
+                description включительно
+        """
+        root = None
+        for event, element in etree.iterparse(self._file, events=("start", "end")):
+            if root is None:
+                root = element
+            if event == "end" and etree.QName(element).localname == "description":
+                break
+        # Разбор прерван в середине файла, возвращаем позицию в начало
+        self._file.seek(0, 0)
+        return root.getroottree()
+
     def extract_cover_memory(self):
         return self.extract_cover()
 
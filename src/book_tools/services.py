@@ -16,12 +16,17 @@ from .format.parsers import FB2
 
 logger = logging.getLogger(__name__)
 
+FB2_ROOT = "FictionBook"
 
-def create_bookfile_service(data: BytesIO, original_filename: str) -> BookFile:
+
+def create_bookfile_service(
+    data: BytesIO, original_filename: str, header_only: bool = True
+) -> BookFile:
     """Извлечение метаданных электронной книги.
 
     Args:
         data(BytesIO): Содержимое файла электронной книги
+        header_only(bool): Разбирать книгу только до конца элемента description
 
     Returns:
         BookFile: извлеченные метаданные книги
@@ -31,21 +36,17 @@ def create_bookfile_service(data: BytesIO, original_filename: str) -> BookFile:
 
     """
     logger.info(f"Attempt to extract metadata from {original_filename}")
-    logger.debug(f"Content size: {len(data.getvalue())}")
     if zipfile.is_zipfile(data):
         logger.info(f"{original_filename} id ZIP file")
         with zipfile.ZipFile(data, "r") as z:
             if len(z.infolist()) > 1:
                 raise Exception("Incorrect fb2 zip archive!")
             fn = z.namelist()[0]
-            with z.open(fn, "r") as d:
-                content = BytesIO()
-                content.write(d.read())
-
+            with z.open(fn, "r") as content:
+                parser = FB2(content, header_only)
     else:
-        content = data
+        parser = FB2(data, header_only)
 
-    parser = FB2(content)
     book_file = BookFile(data, original_filename, Mimetype.FB2)
     book_file.mimetype = Mimetype.FB2
     book_file.__set_title__(parser.title)
@@ -63,6 +64,19 @@ def create_bookfile_service(data: BytesIO, original_filename: str) -> BookFile:
     return book_file
 
 
+def xml_root_name(content) -> str | None:
+    """Имя корневого элемента XML документа без пространства имен.
+
+    Документ читается только до открывающего тега корневого элемента.
+
+    Raises:
+        XMLSyntaxError
+    """
+    for _event, element in etree.iterparse(content, events=("start",)):
+        return etree.QName(element).localname
+    return None
+
+
 class MimetypeValidator(ABC):
     """Определяет соответствие файла определенному mimetype."""
 
@@ -83,10 +97,9 @@ class FB2MimeValidator(MimetypeValidator):
         super().__init__(Mimetype.FB2)
 
     def is_valid(self, filename, content) -> bool:
+        content.seek(0)
         with suppress(XMLSyntaxError):
-            parser = etree.XMLParser(ns_clean=True)
-            root = etree.parse(content, parser=parser).getroot()
-            return etree.QName(root).localname == "FictionBook"
+            return xml_root_name(content) == FB2_ROOT
         return False
 
 
@@ -97,22 +110,14 @@ class FB2ZipMimeValidator(MimetypeValidator):
         super().__init__(Mimetype.FB2_ZIP)
 
     def is_valid(self, filename, content) -> bool:
-        with suppress(zipfile.BadZipFile):
+        with suppress(zipfile.BadZipFile, XMLSyntaxError):
             with zipfile.ZipFile(content) as zip_file:
-                if zip_file.testzip():
-                    return False
-
-                if len(zip_file.infolist()) > 1:
+                if len(zip_file.infolist()) != 1:
                     return False
 
                 fn = zip_file.namelist()[0]
                 with zip_file.open(fn, "r") as f:
-                    content = BytesIO()
-                    content.write(f.read())
-            content.seek(0)
-            parser = etree.XMLParser(ns_clean=True)
-            root = etree.parse(content, parser=parser).getroot()
-            return etree.QName(root).localname == "FictionBook"
+                    return xml_root_name(f) == FB2_ROOT
 
         return False
 
@@ -140,8 +145,8 @@ class MobiMimeValidator(MimetypeValidator):
         super().__init__(Mimetype.MOBI)
 
     def is_valid(self, filename, content) -> bool:
-        mobiflag = content.getvalue()[60:68]
-        return mobiflag.decode() == "BOOKMOBI"
+        content.seek(60)
+        return content.read(8) == b"BOOKMOBI"
 
 
 class SuffixMimeValidator(MimetypeValidator):
@@ -166,29 +171,25 @@ class GenericMimeValidator(MimetypeValidator):
         return True
 
 
-def detect_mime_service(file: BytesIO, original_filename: str) -> str:
-    """Определение mimetype файла. Определение идет по содержимому и/или суффиксу файла.
-
-    Если нельзя определить конкретный тип, то возвращается обобщенный тип
-    application/octet-stream
-
-    Args:
-        file(BytesIO): Содержимое файла
+# Размер заголовка файла, по которому определяется тип
+MAGIC_HEADER_SIZE = 68
 
-        original_filename(str): Имя файла
+# Сигнатуры, однозначно определяющие тип файла: (смещение, сигнатура, тип).
+# Первым элементом EPUB должен быть несжатый файл mimetype.
+MAGIC_SIGNATURES = (
+    (60, b"BOOKMOBI", Mimetype.MOBI),
+    (0, b"%PDF", Mimetype.PDF),
+    (0, b"AT&TFORM", Mimetype.DJVU),
+    (30, b"mimetype" + Mimetype.EPUB.encode(), Mimetype.EPUB),
+)
+ZIP_SIGNATURE = b"PK\x03\x04"
+XML_SIGNATURE = b"<"
+XML_PREFIX_CHARS = b"\xef\xbb\xbf \t\r\n"
 
-    Returns:
-        str Установленный Mimetype файла.
 
-    """
-    logger.info(f"Detecting mimetype of {original_filename}")
-    # Перечень известных валидаторов. Должны быть описаны от конкретных к
-    # обобощенным.
-    detectors: list[MimetypeValidator] = [
-        FB2MimeValidator(),
-        FB2ZipMimeValidator(),
-        EPUBMimeValidator(),
-        MobiMimeValidator(),
+def suffix_validators() -> list[MimetypeValidator]:
+    """Валидаторы, определяющие тип только по суффиксу файла"""
+    return [
         SuffixMimeValidator(
             [
                 ".xml",
@@ -228,11 +229,72 @@ def detect_mime_service(file: BytesIO, original_filename: str) -> str:
         ),
     ]
 
+
+def magic_detectors(header: bytes) -> list[MimetypeValidator] | str:
+    """Выбор проверок по сигнатуре в заголовке файла.
+
+    Args:
+        header(bytes): первые MAGIC_HEADER_SIZE байт файла
+
+    Returns:
+        str|list[MimetypeValidator]: mimetype, если сигнатура определяет тип
+            однозначно, иначе перечень валидаторов, которые нужно проверить
+    """
+    for offset, signature, mimetype in MAGIC_SIGNATURES:
+        if header[offset : offset + len(signature)] == signature:
+            return mimetype
+
+    if header.startswith(ZIP_SIGNATURE):
+        return [FB2ZipMimeValidator(), EPUBMimeValidator(), *suffix_validators()]
+    if header.lstrip(XML_PREFIX_CHARS).startswith(XML_SIGNATURE):
+        return [FB2MimeValidator(), *suffix_validators()]
+
+    # Заголовок не распознан, выполняются все проверки
+    return [
+        FB2MimeValidator(),
+        FB2ZipMimeValidator(),
+        EPUBMimeValidator(),
+        MobiMimeValidator(),
+        *suffix_validators(),
+    ]
+
+
+def detect_mime_service(file: BytesIO, original_filename: str) -> str:
+    """Определение mimetype файла. Определение идет по содержимому и/или суффиксу файла.
+
+    Сначала один раз читается заголовок файла. Если сигнатура в нем однозначно
+    определяет тип, то содержимое больше не читается. Иначе выполняются только
+    проверки, соответствующие сигнатуре (или все, если заголовок не распознан).
+
+    Если нельзя определить конкретный тип, то возвращается обобщенный тип
+    application/octet-stream
+
+    Args:
+        file(BytesIO): Содержимое файла
+
+        original_filename(str): Имя файла
+
+    Returns:
+        str Установленный Mimetype файла.
+
+    """
+    logger.info(f"Detecting mimetype of {original_filename}")
+    file.seek(0)
+    header = file.read(MAGIC_HEADER_SIZE)
+    file.seek(0)
+    # Валидаторы должны быть описаны от конкретных к обобщенным.
+    detectors = magic_detectors(header)
+    if isinstance(detectors, str):
+        logger.info(f"{original_filename} is {detectors} by signature")
+        return detectors
+
     for v in detectors:
         logger.info(f"Check that {original_filename} is {v.mimetype}")
         if v.is_valid(original_filename, file):
             logger.info("Check successful")
+            file.seek(0)
             return v.filetype()
 
     logger.info(f"{original_filename} is {Mimetype.OCTET_STREAM}")
+    file.seek(0)
     return Mimetype.OCTET_STREAM
@@ -0,0 +1,111 @@
+"""Предварительное извлечение обложек книг в кэш обложек.
+
+Используется сканером (настройка SOPDS_SCAN_EXTRACT_COVERS) для новых книг и
+командой sopds_covers для заполнения кэша по всему каталогу.
+"""
+
+import logging
+import os
+from collections.abc import Callable, Iterable
+from concurrent.futures import Executor
+
+from opds_catalog import covers, opdsdb, scan_workers, settings
+from opds_catalog.models import Book
+from opds_catalog.utils import get_cover_cache, get_fs_book_path
+
+# Поля книги, необходимые для извлечения обложки
+COVER_FIELDS = ("id", "filesize", "filename", "format", "path", "cat_type")
+
+
+def cover_job(book: Book) -> covers.CoverJob:
+    """Задание на извлечение обложки книги"""
+    path = get_fs_book_path(book)
+    if book.cat_type == opdsdb.CAT_NORMAL:
+        path, member = os.path.join(path, book.filename), None
+    else:
+        member = book.filename
+    return covers.CoverJob(
+        book.id, book.filesize, book.filename, book.format, path, member
+    )
+
+
+class CoverExtractor:
+    """Извлечение обложек книг в кэш, при наличии пула - в процессах пула.
+
+    Книги, обложки которых уже есть в кэше, пропускаются.
+    """
+
+    def __init__(self, pool: Executor | None = None, workers: int = 0, logger=None):
+        self.cache = get_cover_cache()
+        self.pool = pool
+        self.workers = max(1, workers)
+        self.logger = logger or logging.getLogger("scanner")
+        self.pending = {}
+        self.extracted = 0
+        self.missing = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def add(self, books: Iterable[Book]) -> None:
+        """Извлечение обложек книг (книги уже должны быть записаны в БД)"""
+        if self.cache is None:
+            return
+        for book in books:
+            if self.cache.contains(book.id, book.filesize, covers.COVER):
+                self.skipped += 1
+                continue
+            job = cover_job(book)
+            if self.pool is None:
+                self.record(job, lambda job=job: self.extract(job))
+                continue
+            self.pending[job] = self.pool.submit(
+                scan_workers.extract_cover,
+                job,
+                self.cache.root,
+                self.cache.max_size,
+                settings.THUMB_SIZE,
+            )
+            # Ограничиваем число книг, ожидающих обработки
+            while len(self.pending) > self.workers * 4:
+                self.complete(1)
+
+    def extract(self, job: covers.CoverJob) -> bool:
+        return covers.cache_cover(job, self.cache, settings.THUMB_SIZE)
+
+    def record(self, job: covers.CoverJob, result: Callable[[], bool]) -> None:
+        """Учет результата извлечения обложки"""
+        try:
+            found = result()
+        except Exception as err:
+            self.logger.error(f"Can not extract cover of {job.filename}: {err}")
+            self.failed += 1
+            return
+        if found:
+            self.extracted += 1
+        else:
+            self.missing += 1
+
+    def complete(self, count: int | None = None) -> None:
+        """Ожидание завершения извлечения обложек в пуле процессов
+
+        Args:
+            count: число книг, которые нужно дождаться. Если не указано, то
+                ожидаются все переданные в пул книги.
+        """
+        wait_all = count is None
+        count = len(self.pending) if wait_all else count
+        for _i in range(count):
+            job, future = next(iter(self.pending.items()))
+            del self.pending[job]
+            self.record(job, future.result)
+        if wait_all:
+            covers.open_archive.close()
+        if wait_all and self.cache is not None and self.pool is not None:
+            # Процессы пула не отслеживают размер кэша
+            self.cache.evict()
+
+    def log_stats(self) -> None:
+        self.logger.info(f"Covers extracted : {self.extracted}")
+        self.logger.info(f"Books w/o covers : {self.missing}")
+        self.logger.info(f"Covers skipped   : {self.skipped}")
+        self.logger.info(f"Cover errors     : {self.failed}")
@@ -0,0 +1,249 @@
+"""Извлечение обложек книг и их кэш на диске.
+
+Модуль не использует Django, поэтому может выполняться в процессах-обработчиках
+сканера (см. scan_workers).
+"""
+
+import io
+import logging
+import os
+import tempfile
+import threading
+from typing import NamedTuple
+
+from PIL import Image
+
+from book_tools.format import create_bookfile
+from book_tools.format.parsers import FB2
+
+import opds_catalog.zipf as zipfile
+
+logger = logging.getLogger(__name__)
+
+COVER = "cover"
+THUMBNAIL = "thumb"
+
+# Расширения файлов кэша: изображение и отметка об отсутствии обложки
+IMAGE_SUFFIX = ".img"
+MISSING_SUFFIX = ".none"
+
+# После записи такой доли от максимального размера кэша выполняется очистка
+EVICT_FRACTION = 0.1
+# Очистка удаляет самые старые файлы, пока размер кэша не станет меньше этой доли
+EVICT_TARGET = 0.9
+
+
+def extract_cover(content, filename: str, book_format: str) -> bytes | None:
+    """Извлечение изображения обложки из содержимого книги
+
+    Args:
+        content: поток с содержимым книги
+        filename: имя файла книги
+        book_format: формат книги (Book.format)
+    """
+    if book_format == "fb2":
+        return FB2(content).extract_cover()
+    return create_bookfile(content, filename).extract_cover_memory()
+
+
+def thumbnail_variant(size: int) -> str:
+    """Вариант изображения в кэше для миниатюры заданного размера"""
+    return f"{THUMBNAIL}{size}"
+
+
+class CoverJob(NamedTuple):
+    """Книга, обложку которой нужно извлечь в кэш"""
+
+    book_id: int
+    filesize: int
+    filename: str
+    book_format: str
+    # Путь к файлу книги или к zip архиву с книгой
+    path: str
+    # Имя книги в zip архиве или None для обычного файла
+    member: str | None
+
+
+class OpenArchive:
+    """Zip архив, оставленный открытым для извлечения следующих книг из него.
+
+    Задания на извлечение метаданных и обложек идут в порядке архивов (книги
+    архива сканируются и записываются в БД подряд), поэтому достаточно держать
+    открытым последний архив: его центральный каталог разбирается один раз для
+    всех книг архива, обрабатываемых процессом, а не для каждой книги. Архив открывается заново,
+    если изменились время изменения или размер его файла.
+    """
+
+    def __init__(self):
+        self.path: str | None = None
+        self.signature: tuple[int, int] | None = None
+        self.zipfile: zipfile.ZipFile | None = None
+        self.lock = threading.Lock()
+
+    def read(self, path: str, member: str) -> bytes:
+        """Содержимое файла member из архива path"""
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            if self.zipfile is None or (self.path, self.signature) != (
+                path,
+                signature,
+            ):
+                self._close()
+                self.zipfile = zipfile.ZipFile(path, "r", allowZip64=True)
+                self.path, self.signature = path, signature
+            with self.zipfile.open(member) as book:
+                return book.read()
+
+    def close(self) -> None:
+        with self.lock:
+            self._close()
+
+    def _close(self) -> None:
+        if self.zipfile is not None:
+            self.zipfile.close()
+        self.path = self.signature = self.zipfile = None
+
+
+# Архив, из которого процесс извлекал книги последним
+open_archive = OpenArchive()
+
+
+def cache_cover(job: CoverJob, cache: "CoverCache", thumb_size: int) -> bool:
+    """Извлечение обложки и ее миниатюры в кэш
+
+    Returns:
+        bool: True, если в книге есть обложка
+    """
+    if job.member is None:
+        with open(job.path, "rb") as book:
+            image = extract_cover(book, job.filename, job.book_format)
+    else:
+        content = open_archive.read(job.path, job.member)
+        image = extract_cover(io.BytesIO(content), job.filename, job.book_format)
+
+    cache.put(job.book_id, job.filesize, COVER, image)
+    if image:
+        thumbnail = make_thumbnail(image, thumb_size)
+        cache.put(job.book_id, job.filesize, thumbnail_variant(thumb_size), thumbnail)
+    return bool(image)
+
+
+def make_thumbnail(image: bytes, size: int) -> bytes:
+    """Уменьшенная копия обложки в формате JPEG"""
+    thumb = Image.open(io.BytesIO(image)).convert("RGB")
+    thumb.thumbnail((size, size), Image.Resampling.LANCZOS)
+    tfile = io.BytesIO()
+    thumb.save(tfile, "JPEG")
+    return tfile.getvalue()
+
+
+class CoverCache:
+    """Кэш обложек и их миниатюр в каталоге на диске.
+
+    Ключ записи - идентификатор книги, размер файла книги и вариант изображения
+    (обложка или миниатюра), поэтому при замене файла книги старая запись не
+    используется. Для книг без обложки сохраняется пустая отметка, чтобы не
+    разбирать такие книги повторно.
+
+    Размер кэша ограничен: при чтении время изменения файла обновляется, а при
+    превышении размера удаляются файлы, которые дольше всего не читались.
+    """
+
+    def __init__(self, root: str, max_size: int):
+        """
+        Args:
+            root: каталог кэша
+            max_size: максимальный размер кэша в байтах
+        """
+        self.root = root
+        self.max_size = max_size
+        self._written = 0
+
+    def path(self, book_id: int, filesize: int, variant: str) -> tuple[str, str]:
+        """Пути к файлу изображения и к отметке об отсутствии обложки"""
+        base = os.path.join(
+            self.root, f"{book_id % 256:02x}", f"{book_id}-{filesize}-{variant}"
+        )
+        return base + IMAGE_SUFFIX, base + MISSING_SUFFIX
+
+    def contains(self, book_id: int, filesize: int, variant: str) -> bool:
+        """Проверка наличия записи в кэше (без ее чтения)"""
+        return any(map(os.path.exists, self.path(book_id, filesize, variant)))
+
+    def get(
+        self, book_id: int, filesize: int, variant: str
+    ) -> tuple[bool, bytes | None]:
+        """Чтение изображения из кэша
+
+        Returns:
+            tuple[bool, bytes|None]: признак наличия записи в кэше и изображение
+                (None, если у книги нет обложки)
+        """
+        image_path, missing_path = self.path(book_id, filesize, variant)
+        for path in (image_path, missing_path):
+            try:
+                with open(path, "rb") as f:
+                    image = f.read()
+                os.utime(path)
+            except FileNotFoundError:
+                continue
+            return True, image or None
+        return False, None
+
+    def put(
+        self, book_id: int, filesize: int, variant: str, image: bytes | None
+    ) -> None:
+        """Запись изображения в кэш (None - у книги нет обложки)"""
+        image_path, missing_path = self.path(book_id, filesize, variant)
+        path = image_path if image else missing_path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Запись через временный файл, чтобы параллельный запрос не прочитал
+        # недописанное изображение
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(image or b"")
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        self._written += len(image or b"")
+        if self._written >= self.max_size * EVICT_FRACTION:
+            self.evict()
+
+    def evict(self) -> int:
+        """Удаление давно не читавшихся файлов при превышении размера кэша
+
+        Returns:
+            int: количество удаленных файлов
+        """
+        self._written = 0
+        entries = []
+        total = 0
+        for dirpath, _dirs, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        if total <= self.max_size:
+            return 0
+
+        removed = 0
+        entries.sort()
+        for _mtime, size, path in entries:
+            if total <= self.max_size * EVICT_TARGET:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        logger.info(f"Cover cache {self.root}: removed {removed} files")
+        return removed
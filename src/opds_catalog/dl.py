@@ -1,37 +1,47 @@
 # -*- coding: utf-8 -*-
 import logging
-from book_tools.format.parsers import FB2
 import os
 import codecs
 
 import io
 import subprocess
+from typing import BinaryIO
 
 from django.http import (
+    FileResponse,
     HttpResponse,
     HttpResponseRedirect,
     Http404,
     HttpRequest,
     HttpResponseNotFound,
+    StreamingHttpResponse,
 )
 
+from django.views.decorators.http import condition
+
 from opds_catalog.models import Book, bookshelf
-from opds_catalog import settings, utils, opdsdb
-from opds_catalog.utils import getFileData, getFileName
+from opds_catalog import covers, settings, utils, opdsdb
+from opds_catalog.utils import (
+    getFileData,
+    getFileName,
+    open_book_file,
+    open_book_zip,
+)
 
 import zipfile
 
-from book_tools.format import create_bookfile, mime_detector
+from book_tools.format import mime_detector
 from book_tools.format.mimetype import Mimetype
 
 from constance import config
-from PIL import Image
 
 from opds_catalog.decorators import sopds_auth_validate
 
 
 logger = logging.getLogger(__name__)
 SOPDS_DEFAULT_COVER = "/static/images/sopds-ng-nocover.png"
+# Размер блока при передаче файла книги
+DOWNLOAD_BLOCK_SIZE = 64 * 1024
 
 
 @sopds_auth_validate
@@ -64,36 +74,180 @@ def Download(request, book_id, zip_flag):
     logger.debug(f"Filename: {dlfilename}")
     logger.debug(f"Content type: {content_type}")
 
-    response = HttpResponse()
+    if zip_flag == "1":
+        logger.info("Packing content to ZIP")
+        zstream = open_book_zip(book, transname)
+        if zstream is None:
+            return book_not_found(book)
+        response = StreamingHttpResponse(zstream)
+        if zstream.size is not None:
+            response["Content-Length"] = str(zstream.size)
+    else:
+        opened = open_book_file(book)
+        if opened is None:
+            return book_not_found(book)
+        response = book_file_response(request, book, *opened)
+
     response["Content-Type"] = '%s; name="%s"' % (content_type, dlfilename)
     response["Content-Disposition"] = 'attachment; filename="%s"' % (dlfilename)
     response["Content-Transfer-Encoding"] = "binary"
+    return response
 
-    s = getFileData(book)
-    if s is None:
-        # Книга не может быть прочитана из файловой системы, подробности зафиксированы в логе.
-        # TODO: Сделать нормальную обработку и вернуть нормальную страницу
-        return HttpResponseNotFound(
-            f"Book {book.id} with title '{book.title}' was not found in library files"
-        )
 
-    if zip_flag == "1":
-        logger.info("Packing content to ZIP")
-        dio = io.BytesIO()
-        with zipfile.ZipFile(dio, "w", zipfile.ZIP_DEFLATED) as zo:
-            zo.writestr(transname, s.getvalue())
+def book_not_found(book: Book) -> HttpResponseNotFound:
+    # Книга не может быть прочитана из файловой системы, подробности зафиксированы в логе.
+    # TODO: Сделать нормальную обработку и вернуть нормальную страницу
+    return HttpResponseNotFound(
+        f"Book {book.id} with title '{book.title}' was not found in library files"
+    )
 
-        response["Content-Length"] = str(dio.getbuffer().nbytes)
-        response.write(dio.getvalue())
-    else:
-        response["Content-Length"] = str(s.getbuffer().nbytes)
-        response.write(s.getvalue())
 
+class FileRange:
+    """Часть потока длиной length байт, начиная со смещения start.
+
+    Объект не предоставляет fileno(), поэтому сервер не передает его через
+    sendfile целиком.
+    """
+
+    def __init__(self, stream: BinaryIO, start: int, length: int):
+        self.stream = stream
+        self.remaining = length
+        if start:
+            stream.seek(start)
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.stream.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self) -> None:
+        self.stream.close()
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """Разбор заголовка Range (поддерживается только один диапазон)
+
+    Returns:
+        tuple[int, int]|None: первый и последний байт диапазона или None, если
+            заголовок отсутствует или не может быть обработан
+
+    Raises:
+        ValueError: диапазон находится за пределами файла
+    """
+    if not header:
+        return None
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    first, sep, last = ranges.strip().partition("-")
+    if not sep or not (first.isdigit() or last.isdigit()):
+        return None
+    if not first.isdigit():
+        # Последние last байт файла
+        if int(last) == 0:
+            raise ValueError(header)
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last.isdigit() else size - 1
+    if start >= size:
+        raise ValueError(header)
+    if start > end:
+        return None
+    return start, end
+
+
+def book_file_response(
+    request: HttpRequest, book: Book, stream: BinaryIO, size: int
+) -> HttpResponse:
+    """Ответ с файлом книги, передаваемым потоком
+
+    Обычный файл передается целиком через FileResponse (в том числе с помощью
+    sendfile, если сервер его поддерживает), книга из архива распаковывается
+    блоками. Поддерживаются запросы части файла (Range), чтобы читалки могли
+    продолжить прерванную загрузку.
+    """
+    etag = f'"{book.id}-{size}"'
+    if_range = request.headers.get("If-Range")
+    try:
+        byte_range = (
+            parse_range(request.headers.get("Range"), size)
+            if if_range is None or if_range == etag
+            else None
+        )
+    except ValueError:
+        stream.close()
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    if byte_range is not None:
+        start, end = byte_range
+        logger.info(f"Sending bytes {start}-{end} of {size}")
+        response = FileResponse(FileRange(stream, start, end - start + 1), status=206)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(end - start + 1)
+    elif isinstance(stream, io.BufferedReader):
+        response = FileResponse(stream)
+    else:
+        # Перемотка распакованного потока в конец для определения размера
+        # потребовала бы распаковки всего файла
+        response = FileResponse(FileRange(stream, 0, size))
+        response["Content-Length"] = str(size)
+
+    response.block_size = DOWNLOAD_BLOCK_SIZE
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
     return response
 
 
+def cover_variant(thumbnail: bool) -> str:
+    """Вариант изображения обложки в кэше"""
+    return covers.thumbnail_variant(settings.THUMB_SIZE) if thumbnail else covers.COVER
+
+
+def cover_book(request: HttpRequest, book_id: int) -> Book | None:
+    """Книга, обложка которой запрошена.
+
+    Результат запоминается в запросе, поэтому функции ETag и Last-Modified
+    декоратора condition и сам view Cover читают книгу из БД один раз.
+    """
+    cached = getattr(request, "_cover_book", None)
+    if cached is None or cached[0] != book_id:
+        cached = (book_id, Book.objects.filter(id=book_id).first())
+        request._cover_book = cached
+    return cached[1]
+
+
+def cover_etag(request: HttpRequest, book_id: int, thumbnail=False) -> str | None:
+    """ETag обложки: книга с тем же идентификатором и размером файла не меняется"""
+    book = cover_book(request, book_id)
+    if book is None:
+        return None
+    return f"{book_id}-{book.filesize}-{cover_variant(thumbnail)}"
+
+
+def cover_last_modified(request: HttpRequest, book_id: int, thumbnail=False):
+    book = cover_book(request, book_id)
+    return book.registerdate if book is not None else None
+
+
+def read_cover(book: Book) -> bytes | None:
+    """Извлечение обложки из файла книги
+
+    Raises:
+        Exception: файл книги не найден или не может быть разобран
+    """
+    logger.info(f"Extract cover for book in {book.format} format")
+    content = getFileData(book)
+    assert content is not None
+    return covers.extract_cover(content, book.filename, book.format)
+
+
 # Новая версия (0.42) процедуры извлечения обложек из файлов книг fb2, epub, mobi
 # @cache_page(config.SOPDS_CACHE_TIME)
+@condition(etag_func=cover_etag, last_modified_func=cover_last_modified)
 def Cover(
     request: HttpRequest, book_id: int, thumbnail=False
 ) -> HttpResponse | HttpResponseRedirect:
@@ -101,6 +255,9 @@ def Cover(
     """
     Загрузка обложки
 
+    Обложки и миниатюры сохраняются в кэше на диске (utils.get_cover_cache),
+    поэтому файл книги читается только при первом запросе обложки.
+
     Args:
         request(HttpRequest): поступивший django запрос
 
@@ -113,46 +270,44 @@ def Cover(
        HttpResponseRedirect: ссылка на стандартную обложку, если обложка не бла найдена в книге
     """
     logger.info(f"Reading book cover for book_id {book_id}")
-    book = Book.objects.get(id=book_id)
+    book = cover_book(request, book_id)
+    if book is None:
+        raise Http404(f"Book {book_id} not found")
     logger.info("Book meta loaded")
     logger.debug(f"Book title = {book.title}")
-    response = HttpResponse()
-    # full_path = get_fs_book_path(book)
+    cache = utils.get_cover_cache()
+    variant = cover_variant(thumbnail)
 
-    try:
-        logger.info(f"Extract cover for book in {book.format} format")
-        if book.format == "fb2":
-            content = getFileData(book)
-            assert content is not None
-            parser = FB2(content)
-            image = parser.extract_cover()
-        else:
-            logger.info("Extract cover from non-fb2 book")
-            book_data = create_bookfile(getFileData(book), book.filename)
-            image = book_data.extract_cover_memory()
-    except Exception as e:
-        logger.error(f"Error while extract cover from {book.title}: {e}")
-        book_data = None
-        image = None
-
-    if image:
-        logger.info("Cover extracted, creating response")
-        response["Content-Type"] = "image/jpeg"
-        if thumbnail:
-            thumb = Image.open(io.BytesIO(image)).convert("RGB")
-            thumb.thumbnail(
-                (settings.THUMB_SIZE, settings.THUMB_SIZE), Image.Resampling.LANCZOS
-            )
-            tfile = io.BytesIO()
-            thumb.save(tfile, "JPEG")
-            image = tfile.getvalue()
-        response.write(image)
+    found, image = False, None
+    if cache is not None:
+        found, image = cache.get(book.id, book.filesize, variant)
+        if not found and thumbnail:
+            found, image = cache.get(book.id, book.filesize, covers.COVER)
+            found = found and image is None
+
+    if not found:
+        try:
+            if image is None:
+                image = read_cover(book)
+                if cache is not None:
+                    cache.put(book.id, book.filesize, covers.COVER, image)
+            if image and thumbnail:
+                logger.info("Cover extracted, creating thumbnail")
+                image = covers.make_thumbnail(image, settings.THUMB_SIZE)
+                if cache is not None:
+                    cache.put(book.id, book.filesize, variant, image)
+        except Exception as e:
+            logger.error(f"Error while extract cover from {book.title}: {e}")
+            image = None
 
     if not image:
         logger.info(f"Cover for book with id {book.id} is not found")
         # Вместо обработки изображения отдаем ссылку на изображение "Нет обложки"
         return HttpResponseRedirect(SOPDS_DEFAULT_COVER)
 
+    logger.info("Cover found, creating response")
+    response = HttpResponse(image)
+    response["Content-Type"] = "image/jpeg"
     return response
 
 
@@ -276,6 +276,17 @@ class SOPDSBaseFeed(Feed):
         except Exception:
             return default
 
+    def _page_cursors(self) -> tuple[int | None, int | None]:
+        """Ключи выборки страницы по ключу (after, before) из запроса."""
+        return (
+            self._to_int(self.request.GET.get("after")) or None,
+            self._to_int(self.request.GET.get("before")) or None,
+        )
+
+    def _cursor_url(self, url: str, name: str, cursor: int | None) -> str:
+        """Добавление ключа страницы к ссылке на соседнюю страницу."""
+        return url if cursor is None else f"{url}?{name}={cursor}"
+
     def catalog_pages_parameters(
         self, paginator: dict, id
     ) -> tuple[str | None, str | None]:
@@ -285,6 +296,9 @@ class SOPDSBaseFeed(Feed):
                 "opds_catalog:cat_page",
                 kwargs={"cat_id": id, "page": paginator["previous_page_number"]},
             )
+            prev_url = self._cursor_url(
+                prev_url, "before", paginator["previous_cursor"]
+            )
         else:
             prev_url = None
 
@@ -293,6 +307,7 @@ class SOPDSBaseFeed(Feed):
                 "opds_catalog:cat_page",
                 kwargs={"cat_id": id, "page": paginator["next_page_number"]},
             )
+            next_url = self._cursor_url(next_url, "after", paginator["next_cursor"])
         else:
             next_url = None
 
@@ -321,15 +336,22 @@ class SOPDSBaseFeed(Feed):
         if obj.get("searchterms0") is not None:
             kwargs["searchterms0"] = obj["searchterms0"]
 
-        if obj["paginator"]["has_previous"]:
-            kwargs["page"] = obj["paginator"]["previous_page_number"]
-            prev_url = reverse(viewname, kwargs=kwargs)
+        paginator = obj["paginator"]
+        if paginator["has_previous"]:
+            kwargs["page"] = paginator["previous_page_number"]
+            prev_url = self._cursor_url(
+                reverse(viewname, kwargs=kwargs),
+                "before",
+                paginator.get("previous_cursor"),
+            )
         else:
             prev_url = None
 
-        if obj["paginator"]["has_next"]:
-            kwargs["page"] = obj["paginator"]["next_page_number"]
-            next_url = reverse(viewname, kwargs=kwargs)
+        if paginator["has_next"]:
+            kwargs["page"] = paginator["next_page_number"]
+            next_url = self._cursor_url(
+                reverse(viewname, kwargs=kwargs), "after", paginator.get("next_cursor")
+            )
         else:
             next_url = None
         return prev_url, next_url
@@ -557,8 +579,9 @@ class CatalogsFeed(SOPDSBaseFeed):
             if cat_id is not None
             else catalog_services.get_root()
         )
+        after, before = self._page_cursors()
         items, pager_data = catalog_services.paginated_catalog_content(
-            root_cat, page_num, config.SOPDS_MAXITEMS
+            root_cat, page_num, config.SOPDS_MAXITEMS, after, before
         )
 
         return items, root_cat, pager_data
@@ -725,8 +748,9 @@ class SearchBooksFeed(SOPDSBaseFeed):
 
         books = book_services.search_book(searchtype, st, st1, request.user)
 
+        after, before = self._page_cursors()
         items, op = book_services.paginated_book_content(
-            books, page_num, searchtype != OPDSSearchType.Doubles
+            books, page_num, searchtype == OPDSSearchType.Doubles, after, before
         )
 
         return {
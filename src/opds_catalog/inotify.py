@@ -0,0 +1,186 @@
+"""Наблюдение за изменениями файлов библиотеки через inotify.
+
+Работает только в Linux: функции inotify вызываются из libc через ctypes,
+поэтому дополнительные зависимости не нужны. Модуль не использует Django.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import time
+from collections import namedtuple
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+# События, после которых файл библиотеки нужно обработать или удалить из БД
+WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+)
+
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+logger = logging.getLogger("scanner")
+
+Event = namedtuple("Event", ["path", "mask"])
+Changes = namedtuple("Changes", ["changed", "deleted", "overflow"])
+
+
+class Inotify:
+    """Минимальная обертка над inotify_init1/inotify_add_watch/read"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._add_watch.restype = ctypes.c_int
+        self.fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.paths: dict[int, str] = {}
+
+    def add_watch(self, path: str, mask: int = WATCH_MASK) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        self.paths[wd] = path
+        return wd
+
+    def add_tree(self, root: str, mask: int = WATCH_MASK) -> list[str]:
+        """Наблюдение за каталогом и всеми его подкаталогами
+
+        Returns:
+            list[str]: файлы, найденные в каталогах при добавлении наблюдения
+        """
+        files = []
+        for full_path, dirs, names in os.walk(root, followlinks=True):
+            try:
+                self.add_watch(full_path, mask)
+            except OSError as err:
+                logger.warning(f"Can not watch directory {full_path}: {err}")
+                continue
+            files.extend(os.path.join(full_path, name) for name in names)
+        return files
+
+    def read(self, timeout: float | None = None) -> list[Event]:
+        """Чтение событий. Если за timeout секунд событий нет, то возвращается пустой список"""
+        ready, _w, _x = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+
+        data = os.read(self.fd, _READ_SIZE)
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                events.append(Event(None, mask))
+                continue
+            path = self.paths.get(wd)
+            if mask & IN_IGNORED:
+                self.paths.pop(wd, None)
+                continue
+            if path is None:
+                continue
+            if name:
+                path = os.path.join(path, os.fsdecode(name))
+            events.append(Event(path, mask))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class LibraryWatcher:
+    """Сбор изменений в каталоге библиотеки в пакеты.
+
+    Пакет отдается, когда в течение debounce секунд не было новых событий,
+    либо когда с первого события пакета прошло max_delay секунд (например,
+    при длительном копировании большого количества книг).
+    """
+
+    def __init__(self, root: str, debounce: float = 5.0, max_delay: float = 60.0):
+        self.root = root
+        self.debounce = debounce
+        self.max_delay = max(debounce, max_delay)
+        self.inotify = Inotify()
+        self._pending: dict[str, bool] = {}
+
+    def start(self) -> None:
+        self.inotify.add_tree(self.root)
+        logger.info(f"Watching {len(self.inotify.paths)} directories in {self.root}")
+
+    def close(self) -> None:
+        self.inotify.close()
+
+    def handle(self, event: Event) -> bool:
+        """Учет события в текущем пакете
+
+        Returns:
+            bool: False если очередь событий inotify переполнилась
+        """
+        if event.mask & IN_Q_OVERFLOW:
+            return False
+
+        if event.mask & IN_ISDIR and event.mask & (IN_CREATE | IN_MOVED_TO):
+            # Файлы могли появиться в новом каталоге до добавления наблюдения
+            for file in self.inotify.add_tree(event.path):
+                self._pending[file] = True
+        elif event.mask & (IN_DELETE | IN_MOVED_FROM):
+            self._pending[event.path] = False
+        elif event.mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+            self._pending[event.path] = True
+        return True
+
+    def batches(self):
+        """Генератор пакетов изменений Changes(changed, deleted, overflow)"""
+        started = None
+        while True:
+            timeout = None
+            if started is not None:
+                timeout = min(
+                    self.debounce, started + self.max_delay - time.monotonic()
+                )
+            events = self.inotify.read(max(timeout, 0) if timeout is not None else None)
+
+            overflow = False
+            for event in events:
+                if not self.handle(event):
+                    overflow = True
+            if overflow:
+                logger.warning("Inotify event queue overflow")
+                self._pending = {}
+                started = None
+                yield Changes(set(), set(), True)
+                continue
+
+            if events and started is None:
+                started = time.monotonic()
+            if started is None:
+                continue
+            if events and time.monotonic() - started < self.max_delay:
+                continue
+
+            changed = {path for path, exists in self._pending.items() if exists}
+            deleted = {path for path, exists in self._pending.items() if not exists}
+            self._pending = {}
+            started = None
+            if changed or deleted:
+                yield Changes(changed, deleted, False)
@@ -0,0 +1,163 @@
+"""Чтение INP файлов коллекций INPX.
+
+Модуль загружается в процессах-обработчиках сканера (см. scan_workers),
+поэтому он не должен импортировать Django и модели opds_catalog.
+"""
+
+import logging
+import zipfile
+from typing import NamedTuple
+
+sAuthor = "AUTHOR"
+sGenre = "GENRE"
+sTitle = "TITLE"
+sSeries = "SERIES"
+sSerNo = "SERNO"
+sFile = "FILE"
+sSize = "SIZE"
+sLibId = "LIBID"
+sDel = "DEL"
+sExt = "EXT"
+sDate = "DATE"
+sLang = "LANG"
+sInsNo = "INSNO"
+sFolder = "FOLDER"
+sLibRate = "LIBRATE"
+sKeyWords = "KEYWORDS"
+
+# Структура INP файла, если в INPX нет structure.info
+DEFAULT_FORMAT = [
+    sAuthor,
+    sGenre,
+    sTitle,
+    sSeries,
+    sSerNo,
+    sFile,
+    sSize,
+    sLibId,
+    sDel,
+    sExt,
+    sDate,
+    sLang,
+]
+
+INP_ENCODING = "utf-8"
+INP_SEPARATOR = b"\x04"
+INP_ITEMSEPARATOR = ":"
+
+logger = logging.getLogger("scanner")
+
+
+class InpRecord(NamedTuple):
+    """Запись INP файла. Содержит только поля, используемые сканером."""
+
+    authors: list[str]
+    genres: list[str]
+    title: str
+    series: list[str]
+    file: str
+    size: int
+    ext: str
+    date: str
+    lang: str
+    folder: str
+
+
+# Поля InpRecord и соответствующие им поля INP
+RECORD_FIELDS = (
+    ("authors", sAuthor),
+    ("genres", sGenre),
+    ("title", sTitle),
+    ("series", sSeries),
+    ("file", sFile),
+    ("size", sSize),
+    ("ext", sExt),
+    ("date", sDate),
+    ("lang", sLang),
+    ("folder", sFolder),
+)
+
+# Поля, содержащие списки значений
+LIST_FIELDS = (sAuthor, sGenre, sSeries)
+
+
+class InpDecoder:
+    """Разбор строк INP файла в записи InpRecord.
+
+    По структуре INP файла (structure.info) один раз определяются номера
+    столбцов, из которых строятся поля InpRecord. Из строки декодируются только
+    эти столбцы, остальные (LIBID, INSNO, KEYWORDS и т.д.) не декодируются.
+    """
+
+    __slots__ = ("columns", "del_column", "folder", "maxsplit")
+
+    def __init__(self, inpx_format: list[str], folder: str):
+        """
+        Args:
+            inpx_format: структура INP файла
+            folder: архив с книгами по умолчанию (если в структуре нет FOLDER)
+        """
+        self.columns = [
+            (inpx_format.index(key) if key in inpx_format else None, key)
+            for _field, key in RECORD_FIELDS
+        ]
+        self.del_column = inpx_format.index(sDel) if sDel in inpx_format else None
+        self.folder = folder
+        used = [idx for idx, _key in self.columns if idx is not None]
+        if self.del_column is not None:
+            used.append(self.del_column)
+        # Столбцы после последнего используемого не разделяются
+        self.maxsplit = max(used, default=0) + 1
+
+    def decode(self, line: bytes) -> InpRecord | None:
+        """Разбор строки INP файла
+
+        Returns:
+            InpRecord|None: запись или None, если книга помечена как удаленная
+        """
+        meta_list = line.split(INP_SEPARATOR, self.maxsplit)
+        count = len(meta_list)
+        if (
+            self.del_column is not None
+            and self.del_column < count
+            and meta_list[self.del_column].strip() not in (b"", b"0")
+        ):
+            return None
+
+        values = []
+        for idx, key in self.columns:
+            raw = meta_list[idx] if idx is not None and idx < count else b""
+            if key in LIST_FIELDS:
+                value = raw.decode(INP_ENCODING).split(INP_ITEMSEPARATOR)
+                values.append([item for item in value if item])
+            elif key == sSize:
+                values.append(int(raw) if raw.strip().isdigit() else 0)
+            elif key == sFolder and idx is None:
+                values.append(self.folder)
+            else:
+                values.append(raw.decode(INP_ENCODING))
+        return InpRecord._make(values)
+
+
+def read_inp(finp, inpx_format: list[str], folder: str):
+    """Генератор записей InpRecord INP файла без книг, помеченных как удаленные
+
+    Args:
+        finp: открытый INP файл
+        inpx_format: структура INP файла
+        folder: архив с книгами по умолчанию (если в структуре нет FOLDER)
+    """
+    decoder = InpDecoder(inpx_format, folder)
+    for line in finp:
+        record = decoder.decode(line)
+        if record is not None:
+            yield record
+
+
+def read_inp_records(
+    inpx_file: str, inp_file: str, inpx_format: list[str], folder: str
+) -> list[InpRecord]:
+    """Чтение всех записей INP файла из INPX (для выполнения в пуле процессов)"""
+    with zipfile.ZipFile(inpx_file, "r") as finpx:
+        with finpx.open(inp_file) as finp:
+            return list(read_inp(finp, inpx_format, folder))
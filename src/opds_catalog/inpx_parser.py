@@ -5,7 +5,13 @@ Created on 14 нояб. 2016 г.
 """
 
 # -*- coding: utf-8 -*-
-from opds_catalog.utils import get_infolist_filename
+from opds_catalog.utils import ZipNameIndex
+from opds_catalog.inp_reader import (
+    DEFAULT_FORMAT,
+    read_inp,
+    read_inp_records,
+    sFolder,
+)
 import os
 import zipfile
 from constance import config
@@ -14,23 +20,6 @@ from constance import config
 # from constance import config
 import logging
 
-sAuthor = "AUTHOR"
-sGenre = "GENRE"
-sTitle = "TITLE"
-sSeries = "SERIES"
-sSerNo = "SERNO"
-sFile = "FILE"
-sSize = "SIZE"
-sLibId = "LIBID"
-sDel = "DEL"
-sExt = "EXT"
-sDate = "DATE"
-sLang = "LANG"
-sInsNo = "INSNO"
-sFolder = "FOLDER"
-sLibRate = "LIBRATE"
-sKeyWords = "KEYWORDS"
-
 logger = logging.getLogger("scanner")
 
 
@@ -40,6 +29,8 @@ class Inpx:
         inpx_file,
         append_callback,
         inpskip_callback=lambda inpx, inp, size: 0,
+        pool=None,
+        workers=0,
     ):
         self.inpx_file = inpx_file
         self.inpx_catalog = os.path.dirname(inpx_file)
@@ -48,14 +39,38 @@ class Inpx:
         self.inpx_format = []
         self.inpx_archive = False
         self.inpx_arch_fnames = []
-        self.inpx_encoding = "utf-8"
-        self.inpx_separator = b"\x04"
-        self.inpx_itemseparator = ":"
         self.append_callback = append_callback
         self.inpskip_callback = inpskip_callback
         self.TEST_ZIP = config.SOPDS_INPX_TEST_ZIP
         self.TEST_FILES = config.SOPDS_INPX_TEST_FILES
         self.error = 0
+        # Если передан пул процессов, то INP файлы разбираются в нем, причем
+        # одновременно разбирается не более 2 * workers INP файлов
+        self.pool = pool
+        self.workers = max(1, workers)
+        # Результаты проверки наличия архивов и индексы имен файлов в них.
+        # Строки одного INP обычно ссылаются на один архив, поэтому кеш
+        # сбрасывается при переходе к следующему INP
+        self.zip_exists: dict[str, bool] = {}
+        self.zip_names: dict[str, ZipNameIndex | None] = {}
+
+    def zip_isfile(self, zip_file: str) -> bool:
+        """Проверка наличия архива с книгами"""
+        exists = self.zip_exists.get(zip_file)
+        if exists is None:
+            exists = self.zip_exists[zip_file] = os.path.isfile(zip_file)
+        return exists
+
+    def zip_index(self, zip_file: str) -> ZipNameIndex | None:
+        """Индекс имен файлов архива с книгами, None если архив не читается"""
+        if zip_file not in self.zip_names:
+            try:
+                with zipfile.ZipFile(zip_file, "r") as z:
+                    self.zip_names[zip_file] = ZipNameIndex(z.infolist())
+            except zipfile.BadZipFile as e:
+                logger.error(f"Error while read ZIP archive {zip_file}: {e}")
+                self.zip_names[zip_file] = None
+        return self.zip_names[zip_file]
 
     def parse(self):
         logger.info(f"Start parsing INPX file {self.inpx_file}")
@@ -67,25 +82,12 @@ class Inpx:
             self.inpx_structure = True
             fsds = finpx.open("structure.info")
             fsb = str(fsds.read(), "utf-8")
-            self.inpx_format = fsb.split(";")
+            self.inpx_format = [key.strip() for key in fsb.split(";")]
             fsds.close()
             self.inpx_folders = sFolder in self.inpx_format
         else:
             logger.info("Using default INP structure")
-            self.inpx_format = [
-                sAuthor,
-                sGenre,
-                sTitle,
-                sSeries,
-                sSerNo,
-                sFile,
-                sSize,
-                sLibId,
-                sDel,
-                sExt,
-                sDate,
-                sLang,
-            ]
+            self.inpx_format = list(DEFAULT_FORMAT)
 
         # здесь читаем список архивов в коллекции, если указано явно
         # эту информацию надо как-то использовать, чтобы протестировать наличие zip
@@ -93,79 +95,70 @@ class Inpx:
         #    self.inpx_archive = True
         #    self.inpx_arch_fnames = finpx.open('archives.info').readlines()
 
-        for inp_file in filelist:
+        inp_files = [
+            inp_file
+            for inp_file in filelist
+            if os.path.splitext(inp_file)[1].upper() == ".INP"
+        ]
+        # Разбор INP файлов в пуле процессов запускается с опережением
+        parsing = {}
+        for num, inp_file in enumerate(inp_files):
             (inp_name, inp_ext) = os.path.splitext(inp_file)
-
-            # Если файл не INP то пропускаем
-            if inp_ext.upper() != ".INP":
-                continue
+            if self.pool is not None:
+                for ahead in inp_files[num : num + 2 * self.workers]:
+                    if ahead not in parsing:
+                        parsing[ahead] = self.pool.submit(
+                            read_inp_records,
+                            self.inpx_file,
+                            ahead,
+                            self.inpx_format,
+                            f"{os.path.splitext(ahead)[0]}.zip",
+                        )
 
             # Пропускаем разбор INP файла, если его размер не изменился
             if self.inpskip_callback(
                 self.inpx_file, inp_file, finpx.getinfo(inp_file).file_size
             ):
                 logger.info(f"{inp_file} has been processed, skipping")
+                if inp_file in parsing:
+                    parsing.pop(inp_file).cancel()
                 continue
 
             logger.info(f"Processing {inp_file}")
-            finp = finpx.open(inp_file)
-            for line in finp:
-                logger.debug(f"Processing next line from {inp_file}")
-                meta_list = line.split(self.inpx_separator)
-                meta_data = {}
-
-                # Добавляем sFolder если он не определен
-                if not self.inpx_folders:
-                    logger.debug(f"Append folder {inp_file}.zip")
-                    meta_data[sFolder] = f"{inp_name}.zip"
-
-                for idx, key in enumerate(self.inpx_format):
-                    try:
-                        if key in [sAuthor, sGenre, sSeries]:
-                            meta_data[key] = (
-                                meta_list[idx]
-                                .decode(self.inpx_encoding)
-                                .split(self.inpx_itemseparator)
-                            )
-                            if "" in meta_data[key]:
-                                meta_data[key].remove("")
-                        else:
-                            meta_data[key] = meta_list[idx].decode(self.inpx_encoding)
-                        logger.debug(f"{key} = {meta_data[key]}")
-                    except IndexError as e:
-                        logger.error(f"Error during processing {key} field: {e}")
-                        meta_data[key] = ""
-
-                # Если книга помечена как удаленная в INP, то пропускаем вызов callback
-                if meta_data[sDel].strip() not in ["", "0"]:
-                    logger.debug(
-                        f"Book {meta_data[sTitle]} marked as deleted, skipping."
+            self.zip_exists = {}
+            self.zip_names = {}
+            if inp_file in parsing:
+                self.append_records(inp_name, parsing.pop(inp_file).result())
+            else:
+                with finpx.open(inp_file) as finp:
+                    self.append_records(
+                        inp_name,
+                        read_inp(finp, self.inpx_format, f"{inp_name}.zip"),
                     )
-                    continue
 
-                # Если решили проверять на наличие ZIP файла или книги в ZIP, а самого ZIP файла нет - то пропускаем вызов callback
-                zip_file = os.path.join(self.inpx_catalog, meta_data[sFolder])
-                logger.debug(f"Book file is {zip_file}")
-                if (self.TEST_ZIP or self.TEST_FILES) and not os.path.isfile(zip_file):
+        self.zip_exists = {}
+        self.zip_names = {}
+        finpx.close()
+
+    def append_records(self, inp_name: str, records) -> None:
+        """Проверка наличия книг из записей INP файла и передача их в append_callback"""
+        for record in records:
+            # Если решили проверять на наличие ZIP файла или книги в ZIP, а самого ZIP файла нет - то пропускаем вызов callback
+            zip_file = os.path.join(self.inpx_catalog, record.folder)
+            if (self.TEST_ZIP or self.TEST_FILES) and not self.zip_isfile(zip_file):
+                logger.warning(
+                    f"Book {record.title} file {zip_file} not found, skip book"
+                )
+                continue
+
+            # Если нужно выполнить проверку книги в ZIP, а ее там не оказалось, то пропускаем вызов callback
+            if self.TEST_FILES:
+                book_filename = f"{record.file}.{record.ext}"
+                zip_names = self.zip_index(zip_file)
+                if zip_names is None or zip_names.find(book_filename) is None:
                     logger.warning(
-                        f"Book {meta_data[sTitle]} file {zip_file} not found, skip book"
+                        f"Book {record.title} not found in file {zip_file}, skip book"
                     )
                     continue
 
-                # Если нужно выполнить проверку книги в ZIP, а ее там не оказалось, то пропускаем вызов callback
-                if self.TEST_FILES:
-                    book_filename = f"{meta_data[sFile]}.{meta_data[sExt]}"
-                    zip_filename = get_infolist_filename(
-                        zipfile.ZipFile(zip_file, "r").infolist(),
-                        book_filename,
-                    )
-                    if zip_filename is None:
-                        logger.warning(
-                            f"Book {meta_data[sTitle]} not found in file {zip_file}, skip book"
-                        )
-                        continue
-
-                self.append_callback(self.inpx_file, inp_name, meta_data)
-
-            finp.close()
-        finpx.close()
+            self.append_callback(self.inpx_file, inp_name, record)
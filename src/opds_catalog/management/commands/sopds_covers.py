@@ -0,0 +1,81 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from opds_catalog import scan_workers, settings
+from opds_catalog.cover_extractor import COVER_FIELDS, CoverExtractor
+from opds_catalog.models import Book
+from constance import config
+
+
+class Command(BaseCommand):
+    help = "Extract book covers and thumbnails to cover cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verbose",
+            action="store_true",
+            dest="verbose",
+            default=False,
+            help="Set verbosity level for cover extraction.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            dest="workers",
+            default=0,
+            help="Number of processes extracting covers.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            dest="chunk_size",
+            default=1000,
+            help="Number of books read from database at once.",
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        self.logger = logging.getLogger("scanner")
+        self.logger.setLevel(logging.DEBUG)
+        formatter = logging.Formatter("%(asctime)s %(levelname)-8s %(message)s")
+
+        handlers = []
+        if settings.LOGLEVEL != logging.NOTSET:
+            # Создаем обработчик для записи логов в файл
+            fh = logging.FileHandler(config.SOPDS_SCANNER_LOG)
+            fh.setLevel(settings.LOGLEVEL)
+            handlers.append(fh)
+
+        if options["verbose"]:
+            ch = logging.StreamHandler()
+            ch.setLevel(logging.DEBUG)
+            handlers.append(ch)
+
+        for handler in handlers:
+            handler.setFormatter(formatter)
+            self.logger.addHandler(handler)
+
+        pool = scan_workers.create_pool(workers) if workers > 1 else None
+        try:
+            extractor = CoverExtractor(pool, workers, self.logger)
+            if extractor.cache is None:
+                raise CommandError("Cover cache is disabled (SOPDS_COVER_CACHE_SIZE)")
+
+            self.stdout.write("Start cover extraction.")
+            books = Book.objects.only(*COVER_FIELDS).order_by("id")
+            extractor.add(books.iterator(chunk_size=options["chunk_size"]))
+            extractor.complete()
+            extractor.log_stats()
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+            for handler in handlers:
+                self.logger.removeHandler(handler)
+                handler.close()
+
+        self.stdout.write(
+            f"Covers extracted: {extractor.extracted}, "
+            f"books without covers: {extractor.missing}, "
+            f"already cached: {extractor.skipped}, errors: {extractor.failed}."
+        )
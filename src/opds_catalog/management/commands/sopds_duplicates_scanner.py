@@ -4,8 +4,9 @@ import logging
 
 from django.core.management.base import BaseCommand
 from django.conf import settings as main_settings
+from django.db.models import Count
 
-from opds_catalog import settings 
+from opds_catalog import opdsdb, settings
 from constance import config
 from opds_catalog.models import Book
 
@@ -46,14 +47,15 @@ class Command(BaseCommand):
                 return
         
             self.scan_is_active = True
-            found_doubles = []
-            for book in Book.objects.all():
-                self.logger.info(f"Check duplicates for book_id {book.id}")
-                if book.id not in found_doubles:
-                    for book_doubles in Book.objects.filter(title=book.title, authors__in=book.authors.all()).exclude(id=book.id).distinct().order_by('-docdate'):
-                        self.logger.info (f"Found duplicate id {book_doubles.id} for book {book.id}")
-                        found_doubles.append(book_doubles.id)
-            
-            self.scan_is_active = False
-            self.stdout.write('Complete book duplicates scan.')        
+            updated = opdsdb.update_dup_keys()
+            self.logger.info(f"Duplicate keys updated for {updated} books")
 
+            groups = Book.objects.exclude(dup_key='').values('dup_key').annotate(n=Count('id')).filter(n__gt=1).order_by()
+            groups_count = duplicates_count = 0
+            for group in groups.iterator():
+                groups_count += 1
+                duplicates_count += group['n'] - 1
+                self.logger.info(f"Found {group['n']} books with duplicate key {group['dup_key']}")
+
+            self.scan_is_active = False
+            self.stdout.write(f'Complete book duplicates scan. Groups of duplicates: {groups_count}, duplicates: {duplicates_count}.')
@@ -12,6 +12,7 @@ from django.conf import settings as main_settings
 
 from opds_catalog.models import Counter
 from opds_catalog.sopdscan import opdsScanner
+from opds_catalog.inotify import LibraryWatcher
 
 # from opds_catalog.settings import SCANNER_LOG, SCAN_SHED_DAY, SCAN_SHED_DOW, SCAN_SHED_HOUR, SCAN_SHED_MIN, LOGLEVEL, SCANNER_PID
 from opds_catalog import settings
@@ -24,7 +25,7 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument(
-            "command", help="Use [ scan | start | stop | restart ]"
+            "command", help="Use [ scan | start | stop | restart | watch ]"
         )
         parser.add_argument(
             "--verbose",
@@ -40,12 +41,28 @@ class Command(BaseCommand):
             default=False,
             help="Daemonize server",
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            dest="workers",
+            default=0,
+            help="Number of processes extracting books metadata while scanning.",
+        )
+        parser.add_argument(
+            "--debounce",
+            type=float,
+            dest="debounce",
+            default=5.0,
+            help="Seconds without file changes before processing them in watch mode.",
+        )
 
     def handle(self, *args, **options):
         self.pidfile = os.path.join(
             main_settings.BASE_DIR, config.SOPDS_SCANNER_PID
         )
         action = options["command"]
+        self.workers = options["workers"]
+        self.debounce = options["debounce"]
         self.logger = logging.getLogger("")
         self.logger.setLevel(logging.DEBUG)
         formatter = logging.Formatter(
@@ -66,7 +83,7 @@ class Command(BaseCommand):
             ch.setFormatter(formatter)
             self.logger.addHandler(ch)
 
-        if options["daemonize"] and (action in ["start", "scan"]):
+        if options["daemonize"] and (action in ["start", "scan", "watch"]):
             if sys.platform == "win32":
                 self.stdout.write("On Windows platform Daemonize not working.")
             else:
@@ -78,6 +95,8 @@ class Command(BaseCommand):
             self.stdout.write("Complete book-scan.")
         elif action == "start":
             self.start()
+        elif action == "watch":
+            self.watch()
         elif action == "stop":
             pid = open(self.pidfile, "r").read()
             self.stop(pid)
@@ -99,9 +118,9 @@ class Command(BaseCommand):
             del connections._connections.default
 
         self.logger.debug("Creating scanner object")
-        scanner = opdsScanner(logging.getLogger("scanner"))
-        with transaction.atomic():
-            scanner.scan_all()
+        scanner = opdsScanner(logging.getLogger("scanner"), self.workers)
+        # scan_all сам фиксирует результаты в БД частями
+        scanner.scan_all()
         self.logger.debug("Updating library statistics")
         Counter.objects.update_known_counters()
         self.logger.debug("Releasing lock")
@@ -183,6 +202,37 @@ class Command(BaseCommand):
         except (KeyboardInterrupt, SystemExit):
             pass
 
+    def watch(self):
+        writepid(self.pidfile)
+        self.stdout.write(
+            "Startup watching %s for changes (debounce=%s seconds)."
+            % (config.SOPDS_ROOT_LIB, self.debounce)
+        )
+        scanner = opdsScanner(logging.getLogger("scanner"))
+        watcher = LibraryWatcher(config.SOPDS_ROOT_LIB, self.debounce)
+        quit_command = "CTRL-BREAK" if sys.platform == "win32" else "CONTROL-C"
+        self.stdout.write("Quit the server with %s.\n" % quit_command)
+        try:
+            watcher.start()
+            for changes in watcher.batches():
+                if connection.connection and not connection.is_usable():
+                    del connections._connections.default
+                if changes.overflow:
+                    # Часть событий потеряна, поэтому сканируем библиотеку целиком
+                    self.scan()
+                    continue
+                self.logger.info(
+                    "Processing %s changed and %s deleted files"
+                    % (len(changes.changed), len(changes.deleted))
+                )
+                with transaction.atomic():
+                    scanner.scan_changes(changes.changed, changes.deleted)
+                Counter.objects.update_known_counters()
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        finally:
+            watcher.close()
+
     def stop(self, pid):
         try:
             os.kill(int(pid), signal.SIGTERM)
@@ -13,7 +13,8 @@ from django.contrib.auth.models import User
 from django.utils.translation import ugettext as _
 from django.utils import translation
 
-from opds_catalog.models import Book
+from opds_catalog.models import Book, bauthor
+from opds_catalog.services.book_services import book_relations, collapse_doubles
 from opds_catalog import settings, dl
 from opds_catalog.opds_paginator import Paginator as OPDS_Paginator
 from sopds_web_backend.settings import HALF_PAGES_LINKS
@@ -115,58 +116,32 @@ class Command(BaseCommand):
         if connection.connection and not connection.is_usable():
             del(connections._connections.default)
 
+        # Книги авторов отбираются подзапросом, а не соединением с авторами, чтобы
+        # не использовать distinct: collapse_doubles считает книги в группах дубликатов
         q_objects = Q()
         q_objects.add(Q(search_title__contains=query.upper()), Q.OR)
-        q_objects.add( Q(authors__search_full_name__contains=query.upper()), Q.OR)
-        books = Book.objects.filter(q_objects).order_by('search_title', '-docdate').distinct()
+        q_objects.add(Q(id__in=bauthor.objects.filter(author__search_full_name__contains=query.upper()).values('book_id')), Q.OR)
+        books = Book.objects.filter(q_objects).order_by('search_title', '-docdate')
 
         return books
 
     def BookPager(self, books, page_num, query):
+        summary_DOUBLES_HIDE = config.SOPDS_DOUBLES_HIDE
+        if summary_DOUBLES_HIDE:
+            books = collapse_doubles(books)
         books_count = books.count()
         op = OPDS_Paginator(books_count, 0, page_num, config.SOPDS_TELEBOT_MAXITEMS, HALF_PAGES_LINKS)
         items = []
 
-        prev_title = ''
-        prev_authors_set = set()
-
-        # Начаинам анализ с последнего элемента на предидущей странице, чторбы он "вытянул" с этой страницы
-        # свои дубликаты если они есть
-        summary_DOUBLES_HIDE = config.SOPDS_DOUBLES_HIDE
-        start = op.d1_first_pos if ((op.d1_first_pos == 0) or (not summary_DOUBLES_HIDE)) else op.d1_first_pos - 1
-        finish = op.d1_last_pos
-
-        for row in books[start:finish + 1]:
-            p = {'doubles': 0, 'lang_code': row.lang_code, 'filename': row.filename, 'path': row.path, \
+        rows = list(books[op.d1_first_pos:op.d1_last_pos + 1])
+        relations = book_relations(row.id for row in rows)
+        for row in rows:
+            p = {'doubles': row.double_count - 1 if summary_DOUBLES_HIDE else 0, 'lang_code': row.lang_code, 'filename': row.filename, 'path': row.path, \
                  'registerdate': row.registerdate, 'id': row.id, 'annotation': strip_tags(row.annotation), \
                  'docdate': row.docdate, 'format': row.format, 'title': row.title, 'filesize': row.filesize // 1000, \
-                 'authors': row.authors.values(), 'genres': row.genres.values(), 'series': row.series.values(),
-                 'ser_no': row.bseries_set.values('ser_no')
+                 **relations[row.id]
                  }
-            if summary_DOUBLES_HIDE:
-                title = p['title']
-                authors_set = {a['id'] for a in p['authors']}
-                if title.upper() == prev_title.upper() and authors_set == prev_authors_set:
-                    items[-1]['doubles'] += 1
-                else:
-                    items.append(p)
-                prev_title = title
-                prev_authors_set = authors_set
-            else:
-                items.append(p)
-
-        # "вытягиваем" дубликаты книг со следующей страницы и удаляем первый элемент который с предыдущей страницы и "вытягивал" дубликаты с текущей
-        if summary_DOUBLES_HIDE:
-            double_flag = True
-            while ((finish + 1) < books_count) and double_flag:
-                finish += 1
-                if books[finish].title.upper() == prev_title.upper() and {a['id'] for a in books[finish].authors.values()} == prev_authors_set:
-                    items[-1]['doubles'] += 1
-                else:
-                    double_flag = False
-
-            if op.d1_first_pos != 0:
-                items.pop(0)
+            items.append(p)
 
         response = ''
         for b in items:
@@ -76,6 +76,7 @@ class Command(BaseCommand):
 
     def clear(self):
         with transaction.atomic():
+            # Вместе с данными удаляется и позиция прерванного сканирования
             opdsdb.clear_all(self.verbose)
         if not self.nogenres:
             call_command("loaddata", "genre.json")
@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-17 22:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('opds_catalog', '0006_alter_author_id_alter_bauthor_id_alter_bgenre_id_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Fingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=512, unique=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('mtime', models.BigIntegerField(default=0)),
+                ('inode', models.BigIntegerField(default=None, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1 on 2026-10-17 23:00
+
+import hashlib
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def dup_key(title, author_ids):
+    # Копия opdsdb.book_dup_key на момент создания миграции
+    normalized = ' '.join(title.upper().split())
+    authors = ','.join(str(author_id) for author_id in sorted(set(author_ids)))
+    key = f'{normalized}\n{authors}'.encode('utf-8')
+    return hashlib.blake2b(key, digest_size=16).hexdigest()
+
+
+def fill_dup_keys(apps, schema_editor):
+    Book = apps.get_model('opds_catalog', 'Book')
+    bauthor = apps.get_model('opds_catalog', 'bauthor')
+    books = Book.objects.order_by('id').values_list('id', 'title')
+    last_id = 0
+    while True:
+        batch = list(books.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        authors = {book_id: [] for book_id, _title in batch}
+        links = bauthor.objects.filter(book_id__in=list(authors)).values_list('book_id', 'author_id')
+        for book_id, author_id in links:
+            authors[book_id].append(author_id)
+        Book.objects.bulk_update(
+            [Book(id=book_id, dup_key=dup_key(title, authors[book_id])) for book_id, title in batch],
+            ['dup_key'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('opds_catalog', '0007_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='dup_key',
+            field=models.CharField(db_index=True, default='', max_length=32),
+        ),
+        migrations.RunPython(fill_dup_keys, migrations.RunPython.noop),
+    ]
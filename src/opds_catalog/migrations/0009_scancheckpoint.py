@@ -0,0 +1,22 @@
+# Generated by Django 5.1 on 2026-10-17 23:21
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('opds_catalog', '0008_book_dup_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(default='', max_length=512)),
+                ('update_time', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -17,6 +17,7 @@ SIZE_BOOK_DOCDATE = 32
 SIZE_BOOK_LANG = 16
 SIZE_BOOK_TITLE = 512
 SIZE_BOOK_ANNOTATION = 10000
+SIZE_BOOK_DUPKEY = 32
 
 SIZE_CAT_CATNAME = 190
 SIZE_CAT_PATH = SIZE_BOOK_PATH
@@ -67,6 +68,11 @@ class Book(models.Model):
     annotation = models.CharField(max_length=SIZE_BOOK_ANNOTATION)
     lang_code = models.IntegerField(null=False, default=9, db_index=True)
     avail = models.IntegerField(null=False, default=0, db_index=True)
+    # Ключ группы дубликатов: хэш нормализованного названия и набора авторов
+    # (см. opdsdb.book_dup_key). Пустой ключ - книга еще не обработана.
+    dup_key = models.CharField(
+        max_length=SIZE_BOOK_DUPKEY, null=False, default="", db_index=True
+    )
     authors = models.ManyToManyField("Author", through="bauthor")
     genres = models.ManyToManyField("Genre", through="bgenre")
     series = models.ManyToManyField("Series", through="bseries")
@@ -85,6 +91,44 @@ class Catalog(models.Model):
     cat_size = models.BigIntegerField(null=True, default=0)
 
 
+class Fingerprint(models.Model):
+    """Отпечаток файла или каталога библиотеки на момент последнего сканирования"""
+
+    path = models.CharField(max_length=SIZE_BOOK_PATH, unique=True)
+    size = models.BigIntegerField(null=False, default=0)
+    mtime = models.BigIntegerField(null=False, default=0)
+    inode = models.BigIntegerField(null=True, default=None)
+
+
+class ScanCheckpointManager(models.Manager):
+    def get_path(self) -> str:
+        """Последний каталог, обработанный прерванным сканированием.
+
+        Пустая строка означает, что прерванного сканирования нет.
+        """
+        path = self.values_list("path", flat=True).first()
+        return path or ""
+
+    def set_path(self, path: str) -> None:
+        if path:
+            self.update_or_create(
+                pk=1, defaults={"path": path, "update_time": timezone.now()}
+            )
+        else:
+            self.all().delete()
+
+
+class ScanCheckpoint(models.Model):
+    """Позиция, с которой продолжается прерванное сканирование библиотеки.
+
+    В таблице хранится не больше одной записи.
+    """
+
+    path = models.CharField(max_length=SIZE_BOOK_PATH, null=False, default="")
+    update_time = models.DateTimeField(null=False, default=timezone.now)
+    objects = ScanCheckpointManager()
+
+
 class Author(models.Model):
     full_name = models.CharField(
         max_length=SIZE_AUTHOR_NAME, default=None, db_index=True
@@ -21,38 +21,21 @@ class Paginator:
         self.MAXITEMS = maxitems
         self.HALF_PAGES_LINK = half_pages_link
         self.page_num = page_num
+        self.previous_cursor = None
+        self.next_cursor = None
         self.calc_data()
 
     def calc_data(self):
-        d1_MAXITEMS = self.MAXITEMS
-        self.d1_first_pos = d1_MAXITEMS * (self.page_num - 1)
-        self.d1_first_pos = (
-            self.d1_first_pos
-            if self.d1_first_pos < self.d1_count
-            else (self.d1_count - 1 if self.d1_count else 0)
-        )
-        self.d1_last_pos = d1_MAXITEMS * self.page_num - 1
-        self.d1_last_pos = (
-            self.d1_last_pos
-            if self.d1_last_pos < self.d1_count
-            else (self.d1_count - 1 if self.d1_count else 0)
-        )
-
-        d2_MAXITEMS = self.MAXITEMS - self.d1_last_pos + self.d1_first_pos
-        self.d2_first_pos = d2_MAXITEMS * (self.page_num - 1)
-        self.d2_first_pos = (
-            self.d2_first_pos
-            if self.d2_first_pos < self.d2_count
-            else (self.d2_count - 1 if self.d2_count else 0)
-        )
-        self.d2_last_pos = d2_MAXITEMS * self.page_num - 1
-        self.d2_last_pos = (
-            self.d2_last_pos
-            if self.d2_last_pos < self.d2_count
-            else (self.d2_count - 1 if self.d2_count else 0)
-        )
+        # Страница содержит элементы общего списка: сначала d1, затем d2.
+        # Позиции вне списка дают пустой диапазон (d_last_pos < d_first_pos)
+        first = self.MAXITEMS * (self.page_num - 1)
+        last = first + self.MAXITEMS
+        self.d1_first_pos = min(first, self.d1_count)
+        self.d1_last_pos = min(last, self.d1_count) - 1
+        self.d2_first_pos = min(max(first - self.d1_count, 0), self.d2_count)
+        self.d2_last_pos = min(max(last - self.d1_count, 0), self.d2_count) - 1
 
-        self.num_pages = self.count // self.MAXITEMS + 1
+        self.num_pages = max(1, -(-self.count // self.MAXITEMS))
         self.firstpage = self.page_num - self.HALF_PAGES_LINK
         self.lastpage = self.page_num + self.HALF_PAGES_LINK
         if self.firstpage < 1:
@@ -74,7 +57,17 @@ class Paginator:
         self.number = self.page_num
         self.page_range = [i for i in range(self.firstpage, self.lastpage + 1)]
 
-    def get_data_dict(self) -> dict[str, int | bool]:
+    def set_cursors(self, first_id: int, last_id: int) -> None:
+        """Ключи для выборки соседних страниц по ключу (keyset).
+
+        Параметры:
+            first_id - id первой книги страницы (ключ before предыдущей страницы)
+            last_id - id последней книги страницы (ключ after следующей страницы)
+        """
+        self.previous_cursor = first_id if self.has_previous else None
+        self.next_cursor = last_id if self.has_next else None
+
+    def get_data_dict(self) -> dict[str, int | bool | None]:
         """Возвращает метаданные пейджера."""
         p = {}
         p["num_pages"] = self.num_pages
@@ -84,4 +77,6 @@ class Paginator:
         p["next_page_number"] = self.next_page_number
         p["number"] = self.number
         p["page_range"] = self.page_range
+        p["previous_cursor"] = self.previous_cursor
+        p["next_cursor"] = self.next_cursor
         return p
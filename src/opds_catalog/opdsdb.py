@@ -1,10 +1,12 @@
 # -*- coding: utf-8 -*-
+import hashlib
 import logging
 
 import os
 import re
+from collections.abc import Iterable
 
-# from django.db.models import Q
+from django.db.models import Q, QuerySet
 from django.utils.translation import gettext as _, gettext_noop as _noop
 from django.db import transaction, connection
 
@@ -12,6 +14,7 @@ from opds_catalog.models import (
     Book,
     Catalog,
     Author,
+    Fingerprint,
     Genre,
     Series,
     bseries,
@@ -29,6 +32,7 @@ from opds_catalog.models import (
     SIZE_BOOK_LANG,
     SIZE_BOOK_TITLE,
     SIZE_BOOK_ANNOTATION,
+    SIZE_BOOK_DUPKEY,
 )
 from opds_catalog.models import (
     SIZE_CAT_CATNAME,
@@ -73,6 +77,8 @@ unknown_genre = _(unknown_genre_en)
 #
 utfhigh = re.compile("[\U00010000-\U0010ffff]")
 
+scan_logger = logging.getLogger("scanner")
+
 
 def pg_optimize(verbose=False):
     """TODO: Table optimizations for Postgres"""
@@ -108,6 +114,8 @@ def clear_all(verbose=False):
     cursor.execute("delete from opds_catalog_genre")
     cursor.execute("delete from opds_catalog_series")
     cursor.execute("delete from opds_catalog_counter")
+    cursor.execute("delete from opds_catalog_fingerprint")
+    cursor.execute("delete from opds_catalog_scancheckpoint")
 
 
 def clear_genres(verbose=False):
@@ -147,11 +155,18 @@ def getlangcode(s):
     return langcode
 
 
-def avail_check_prepare():
-    """Для всех книг, кроме удаленных, устанавливается признак наличия "1" """
+def avail_check_prepare(path: str | None = None):
+    """Для всех книг, кроме удаленных, устанавливается признак наличия "1"
+
+    Если указан path, то признак устанавливается только для книг из этого
+    каталога или архива.
+    """
     # Используется только в sopdscan
     # Book.objects.filter(~Q(avail=0)).update(avail=1)
-    Book.objects.exclude(avail=0).update(avail=1)
+    books = Book.objects.exclude(avail=0)
+    if path is not None:
+        books = books.filter(path=path[:SIZE_BOOK_PATH])
+    books.update(avail=1)
 
 
 def books_del_logical():
@@ -160,15 +175,41 @@ def books_del_logical():
     return row_count
 
 
-def books_del_phisical():
+def books_del_phisical(path: str | None = None):
     # Используется только в sopdscan
-    row_count = Book.objects.filter(avail__lte=1).delete()
+    books = Book.objects.filter(avail__lte=1)
+    if path is not None:
+        books = books.filter(path=path[:SIZE_BOOK_PATH])
+    row_count = books.delete()
     # TODO: Разобратся нужно ли удалять записи в таблицах связи ManyToMany или они сами удалятся?
     # sql='delete from '+TBL_BAUTHORS+' where book_id in (select book_id from '+TBL_BOOKS+' where avail<=1)'
     # sql='delete from '+TBL_BGENRES+' where book_id in (select book_id from '+TBL_BOOKS+' where avail<=1)'
     return row_count
 
 
+def deleted_books(row_count: tuple[int, dict[str, int]]) -> int:
+    """Число удаленных книг из результата QuerySet.delete()"""
+    return row_count[1].get(Book._meta.label, 0)
+
+
+def books_del_path(path: str):
+    """Удаление из БД книг удаленного файла, архива или каталога.
+
+    Путь может указывать как на файл книги, так и на архив или каталог (после
+    удаления уже не узнать, чем он был), поэтому удаляются книги с таким именем
+    файла, а также все книги из архива или каталога с таким путем.
+    """
+    (head, tail) = os.path.split(path)
+    # Книги из корня библиотеки хранятся с путем "."
+    head = head or "."
+    row_count = Book.objects.filter(
+        Q(path=head[:SIZE_BOOK_PATH], filename=tail[:SIZE_BOOK_FILENAME])
+        | Q(path=path[:SIZE_BOOK_PATH])
+        | Q(path__startswith=os.path.join(path, ""))
+    ).delete()
+    return row_count
+
+
 def arc_skip(arcpath, arcsize):
     """
     Выясняем изменялся ли архив (ZIP или INP-файл)
@@ -256,16 +297,76 @@ def inpx_skip(arcpath, arcsize):
     return 0
 
 
+class ScanCache:
+    """Кеш справочников на время сканирования.
+
+    Хранит соответствия наименований авторов, жанров и серий их id, а также
+    путей каталогов самим каталогам. Наименования и пути хранятся в том виде,
+    в каком они записываются в БД (с усечением до размера поля).
+    """
+
+    def __init__(self):
+        self.authors: dict[str, int] = {}
+        self.genres: dict[str, int] = {}
+        self.series: dict[str, int] = {}
+        self.catalogs: dict[str, Catalog] = {}
+
+    def preload(self) -> None:
+        """Загрузка справочников из БД"""
+        for model, field, cache in (
+            (Author, "full_name", self.authors),
+            (Genre, "genre", self.genres),
+            (Series, "ser", self.series),
+        ):
+            query = model.objects.order_by("id").values_list("id", field)
+            for pk, name in query.iterator():
+                cache.setdefault(name, pk)
+
+        for catalog in Catalog.objects.order_by("id").iterator():
+            self.catalogs.setdefault(catalog.path, catalog)
+
+        scan_logger.info(
+            f"Scan cache loaded: {len(self.authors)} authors, {len(self.genres)} genres, "
+            f"{len(self.series)} series, {len(self.catalogs)} catalogs"
+        )
+
+
+_scan_cache: ScanCache | None = None
+
+
+def scan_cache_start(preload: bool = True) -> ScanCache:
+    """Включение кеша справочников на время сканирования"""
+    global _scan_cache
+    _scan_cache = ScanCache()
+    if preload:
+        _scan_cache.preload()
+    return _scan_cache
+
+
+def scan_cache_stop() -> None:
+    """Отключение кеша справочников по окончании сканирования"""
+    global _scan_cache
+    _scan_cache = None
+
+
+def get_scan_cache() -> ScanCache | None:
+    return _scan_cache
+
+
 def findcat(cat_name: str) -> Catalog | None:
     """Поиск каталога по его имени в базе данных"""
     (head, tail) = os.path.split(cat_name)
+    path = cat_name[:SIZE_CAT_PATH]
+    if _scan_cache is not None and path in _scan_cache.catalogs:
+        return _scan_cache.catalogs[path]
+
     try:
-        catalog = Catalog.objects.get(
-            cat_name=tail[:SIZE_CAT_CATNAME], path=cat_name[:SIZE_CAT_PATH]
-        )
+        catalog = Catalog.objects.get(cat_name=tail[:SIZE_CAT_CATNAME], path=path)
     except Catalog.DoesNotExist:
         catalog = None
 
+    if catalog is not None and _scan_cache is not None:
+        _scan_cache.catalogs[path] = catalog
     return catalog
 
 
@@ -274,23 +375,30 @@ def addcattree(cat_name: str, archive: int = 0, size: int = 0) -> Catalog:
     if catalog:
         return catalog
     if cat_name in ("", "."):
-        return Catalog.objects.get_or_create(
+        new_cat = Catalog.objects.get_or_create(
             parent=None, cat_name=".", path=".", cat_type=0
         )[0]
-    (head, tail) = os.path.split(cat_name)
-    parent = addcattree(head)
-    new_cat = Catalog.objects.create(
-        parent=parent,
-        cat_name=tail[:SIZE_CAT_CATNAME],
-        path=cat_name[:SIZE_CAT_PATH],
-        cat_type=archive,
-        cat_size=size,
-    )
+    else:
+        (head, tail) = os.path.split(cat_name)
+        parent = addcattree(head)
+        new_cat = Catalog.objects.create(
+            parent=parent,
+            cat_name=tail[:SIZE_CAT_CATNAME],
+            path=cat_name[:SIZE_CAT_PATH],
+            cat_type=archive,
+            cat_size=size,
+        )
 
+    if _scan_cache is not None:
+        _scan_cache.catalogs[new_cat.path] = new_cat
     return new_cat
 
 
-scan_logger = logging.getLogger("scanner")
+def update_cat_size(catalog: Catalog, size: int) -> None:
+    """Сохранение размера файла архива или INPX, соответствующего каталогу"""
+    if catalog.cat_size != size:
+        catalog.cat_size = size
+        Catalog.objects.filter(id=catalog.id).update(cat_size=size)
 
 
 def findbook(name: str, path: str, setavail=0) -> Book | None:
@@ -316,11 +424,11 @@ def findbook(name: str, path: str, setavail=0) -> Book | None:
     return book
 
 
-def addbook(
+def newbook(
     name, path, cat, exten, title, annotation, docdate, lang, size=0, archive=0
-):
-    """Добавление книги в коллекцию"""
-    book = Book.objects.create(
+) -> Book:
+    """Создание объекта книги без сохранения в БД"""
+    return Book(
         filename=name[:SIZE_BOOK_FILENAME],
         path=path[:SIZE_BOOK_PATH],
         catalog=cat,
@@ -335,6 +443,16 @@ def addbook(
         avail=2,
         lang_code=getlangcode(title),
     )
+
+
+def addbook(
+    name, path, cat, exten, title, annotation, docdate, lang, size=0, archive=0
+):
+    """Добавление книги в коллекцию"""
+    book = newbook(
+        name, path, cat, exten, title, annotation, docdate, lang, size, archive
+    )
+    book.save()
     return book
 
 
@@ -347,31 +465,111 @@ def findauthor(full_name):
     return author
 
 
+def author_defaults(full_name: str) -> dict:
+    return {
+        "search_full_name": full_name.upper()[:SIZE_AUTHOR_NAME],
+        "lang_code": getlangcode(full_name),
+    }
+
+
 def addauthor(full_name):
+    # Во время сканирования для найденного в кеше автора возвращается объект,
+    # в котором заполнены только id и full_name
+    name = full_name[:SIZE_AUTHOR_NAME]
+    if _scan_cache is not None and name in _scan_cache.authors:
+        return Author(id=_scan_cache.authors[name], full_name=name)
+
     author, created = Author.objects.get_or_create(
-        full_name=full_name[:SIZE_AUTHOR_NAME],
-        defaults={
-            "search_full_name": full_name.upper()[:SIZE_AUTHOR_NAME],
-            "lang_code": getlangcode(full_name),
-        },
+        full_name=name,
+        defaults=author_defaults(full_name),
     )
+    if _scan_cache is not None:
+        _scan_cache.authors[name] = author.id
     return author
 
 
 def addbauthor(book, author):
     ba = bauthor(book=book, author=author)
     ba.save()
+    # Ключ дубликатов книги зависит от всех ее авторов, поэтому он вычисляется
+    # после записи связей вызовом update_dup_keys
+
+
+def book_dup_key(title: str, author_ids: Iterable[int]) -> str:
+    """Ключ группы дубликатов книги.
+
+    Дубликатами считаются книги с одинаковым названием (без учета регистра и
+    лишних пробелов) и одинаковым набором авторов.
+    """
+    normalized = " ".join(title.upper().split())
+    authors = ",".join(str(author_id) for author_id in sorted(set(author_ids)))
+    key = f"{normalized}\n{authors}".encode("utf-8")
+    return hashlib.blake2b(key, digest_size=SIZE_BOOK_DUPKEY // 2).hexdigest()
+
+
+def update_dup_keys(
+    books: QuerySet | None = None, batch_size: int | None = None
+) -> int:
+    """Пересчет ключей дубликатов книг по их названиям и авторам в БД
+
+    Книги обрабатываются пакетами по возрастанию id, поэтому в памяти
+    находится не больше batch_size книг.
+
+    Args:
+        books: книги, для которых пересчитываются ключи (по умолчанию - все)
+        batch_size: число книг в пакете (по умолчанию MAX_IN_PARAMS)
+
+    Returns:
+        int: число книг, ключ которых изменился
+    """
+    books = Book.objects.all() if books is None else books
+    batch_size = batch_size or MAX_IN_PARAMS
+    rows = books.order_by("id").values_list("id", "title", "dup_key")
+    updated = 0
+    last_id = None
+    while True:
+        batch = rows if last_id is None else rows.filter(id__gt=last_id)
+        chunk = list(batch[:batch_size])
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+
+        authors: dict[int, list[int]] = {book_id: [] for book_id, _t, _k in chunk}
+        links = bauthor.objects.filter(book_id__in=list(authors)).values_list(
+            "book_id", "author_id"
+        )
+        for book_id, author_id in links:
+            authors[book_id].append(author_id)
+
+        changed = []
+        for book_id, title, dup_key in chunk:
+            key = book_dup_key(title, authors[book_id])
+            if key != dup_key:
+                changed.append(Book(id=book_id, dup_key=key))
+        Book.objects.bulk_update(changed, ["dup_key"])
+        updated += len(changed)
+    return updated
+
+
+def genre_defaults(genre: str) -> dict:
+    return {
+        "section": unknown_genre,
+        "subsection": genre[:SIZE_GENRE_SUBSECTION],
+    }
 
 
 def addgenre(genre):
     # TODO: функция addgenre используется только в sopdscan
+    name = genre[:SIZE_GENRE]
+    if _scan_cache is not None and name in _scan_cache.genres:
+        return Genre(id=_scan_cache.genres[name], genre=name)
+
     genre, created = Genre.objects.get_or_create(
-        genre=genre[:SIZE_GENRE],
-        defaults={
-            "section": unknown_genre,
-            "subsection": genre[:SIZE_GENRE_SUBSECTION],
-        },
+        genre=name,
+        defaults=genre_defaults(genre),
     )
+    if _scan_cache is not None:
+        _scan_cache.genres[name] = genre.id
     return genre
 
 
@@ -381,15 +579,25 @@ def addbgenre(book, genre):
     bg.save()
 
 
+def series_defaults(ser: str) -> dict:
+    return {
+        "search_ser": ser.upper()[:SIZE_SERIES],
+        "lang_code": getlangcode(ser),
+    }
+
+
 def addseries(ser):
     # TODO: addseries используется только в sopdscan
+    name = ser[:SIZE_SERIES]
+    if _scan_cache is not None and name in _scan_cache.series:
+        return Series(id=_scan_cache.series[name], ser=name)
+
     series, created = Series.objects.get_or_create(
-        ser=ser[:SIZE_SERIES],
-        defaults={
-            "search_ser": ser.upper()[:SIZE_SERIES],
-            "lang_code": getlangcode(ser),
-        },
+        ser=name,
+        defaults=series_defaults(ser),
     )
+    if _scan_cache is not None:
+        _scan_cache.series[name] = series.id
     return series
 
 
@@ -399,6 +607,325 @@ def addbseries(book, ser, ser_no):
     bs.save()
 
 
+# Максимальное число параметров в одном запросе вида IN (...). Ограничение
+# связано с SQLite, который не принимает более 999 переменных в запросе.
+MAX_IN_PARAMS = 500
+
+
+def chunked(items: list, size: int = MAX_IN_PARAMS):
+    """Разбиение списка на части не более size элементов"""
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def resolve_names(model, field: str, names, cache: dict[str, int], defaults) -> None:
+    """Заполнение словаря наименование -> id для записей справочника.
+
+    Отсутствующие в cache наименования ищутся в БД, а не найденные в БД
+    создаются одним запросом bulk_create.
+
+    Args:
+        model: модель справочника (Author, Genre, Series)
+        field(str): поле модели, в котором хранится наименование
+        names: наименования, усеченные до размера поля
+        cache(dict[str, int]): словарь наименование -> id, дополняется найденными записями
+        defaults: функция, возвращающая значения остальных полей новой записи
+    """
+    missing = [n for n in set(names) if n not in cache]
+    for attempt in range(2):
+        for chunk in chunked(missing):
+            query = model.objects.filter(**{f"{field}__in": chunk})
+            for pk, name in query.values_list("id", field):
+                cache.setdefault(name, pk)
+        missing = [n for n in missing if n not in cache]
+        if not missing or attempt:
+            break
+        model.objects.bulk_create([model(**{field: n}, **defaults(n)) for n in missing])
+
+
+class AvailabilityMarker:
+    """Пакетная проверка наличия книг в БД и установка признака avail=2.
+
+    Для каждого пути (каталога или архива) одним запросом загружаются имена
+    файлов уже известных книг. Найденные при сканировании книги накапливаются
+    и помечаются доступными одним UPDATE ... WHERE id IN (...) на каждые
+    batch_size книг, а также при смене пути.
+    """
+
+    def __init__(self, batch_size: int = 1):
+        self.batch_size = max(1, batch_size)
+        self._path: str | None = None
+        self._known: dict[str, int] = {}
+        self._seen: list[int] = []
+
+    def exists(self, name: str, path: str) -> bool:
+        """Проверка наличия книги в БД с отложенной установкой avail=2"""
+        path = path[:SIZE_BOOK_PATH]
+        if path != self._path:
+            self.flush()
+            self._path = path
+            self._known = dict(
+                Book.objects.filter(path=path).values_list("filename", "id")
+            )
+            scan_logger.debug(f"{len(self._known)} known books in {path}")
+
+        book_id = self._known.get(name[:SIZE_BOOK_FILENAME])
+        if book_id is None:
+            return False
+
+        self._seen.append(book_id)
+        if len(self._seen) >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self) -> int:
+        """Установка avail=2 для найденных книг.
+
+        Returns:
+            int: число обновленных записей
+        """
+        row_count = 0
+        for chunk in chunked(self._seen):
+            row_count += Book.objects.filter(id__in=chunk).update(avail=2)
+        self._seen = []
+        return row_count
+
+
+def books_mark_avail(paths: list[str]) -> int:
+    """Установка avail=2 для всех книг из указанных каталогов и архивов
+
+    Returns:
+        int: число обновленных записей
+    """
+    row_count = 0
+    for chunk in chunked([path[:SIZE_BOOK_PATH] for path in paths]):
+        row_count += Book.objects.filter(path__in=chunk).update(avail=2)
+    return row_count
+
+
+class FingerprintIndex:
+    """Отпечатки файлов и каталогов библиотеки.
+
+    Отпечаток - кортеж (размер, время изменения в наносекундах, inode), по
+    которому сканер определяет, что файл или каталог не менялся с прошлого
+    сканирования. Отпечатки загружаются из БД одним запросом, а новые и
+    измененные записываются в БД при вызове flush. По окончании сканирования
+    отпечатки путей, которые при нем не встретились, удаляются.
+    """
+
+    def __init__(self):
+        self._known: dict[str, tuple[int, int, int | None]] = {}
+        self._changed: dict[str, tuple[int, int, int | None]] = {}
+        self._seen: set[str] = set()
+
+    def preload(self) -> None:
+        """Загрузка отпечатков из БД"""
+        query = Fingerprint.objects.values_list("path", "size", "mtime", "inode")
+        for path, size, mtime, inode in query.iterator():
+            self._known[path] = (size, mtime, inode)
+        scan_logger.info(f"Fingerprints loaded: {len(self._known)}")
+
+    def check(self, path: str, fingerprint: tuple) -> bool | None:
+        """Сравнение отпечатка с сохраненным при прошлом сканировании
+
+        Returns:
+            bool|None: True если отпечаток не изменился, False если изменился,
+                None если отпечаток для пути неизвестен
+        """
+        path = path[:SIZE_BOOK_PATH]
+        self._seen.add(path)
+        known = self._known.get(path)
+        if known is None:
+            return None
+
+        size, mtime, inode = fingerprint
+        # inode сравнивается, только если он известен (на некоторых ФС его нет)
+        if inode is not None and known[2] is not None and inode != known[2]:
+            return False
+        return (size, mtime) == known[:2]
+
+    def keep(self, path: str) -> None:
+        """Сохранение отпечатка непроверенного пути (например, архива в пропущенном каталоге)"""
+        self._seen.add(path[:SIZE_BOOK_PATH])
+
+    def store(self, path: str, fingerprint: tuple) -> None:
+        """Запоминание отпечатка обработанного файла или каталога"""
+        path = path[:SIZE_BOOK_PATH]
+        self._seen.add(path)
+        if self._known.get(path) != fingerprint:
+            self._changed[path] = fingerprint
+
+    def flush(self, remove_stale: bool = False) -> int:
+        """Запись новых и измененных отпечатков в БД
+
+        Args:
+            remove_stale: удалить отпечатки путей, которые не встретились с
+                прошлого удаления (вызывается по окончании сканирования)
+
+        Returns:
+            int: число записанных отпечатков
+        """
+        Fingerprint.objects.bulk_create(
+            [
+                Fingerprint(path=path, size=size, mtime=mtime, inode=inode)
+                for path, (size, mtime, inode) in self._changed.items()
+            ],
+            batch_size=MAX_IN_PARAMS,
+            update_conflicts=True,
+            unique_fields=["path"],
+            update_fields=["size", "mtime", "inode"],
+        )
+        row_count = len(self._changed)
+        self._known.update(self._changed)
+        self._changed = {}
+        if remove_stale:
+            stale = [path for path in self._known if path not in self._seen]
+            for chunk in chunked(stale):
+                Fingerprint.objects.filter(path__in=chunk).delete()
+            for path in stale:
+                del self._known[path]
+            self._seen = set()
+        return row_count
+
+
+class BookWriter:
+    """Пакетная запись книг в БД.
+
+    Книги вместе со ссылками на авторов, жанры и серии накапливаются в буфере
+    и записываются через bulk_create каждые batch_size книг. Авторы, жанры и
+    серии разрешаются через словари наименование -> id. Если включен кеш
+    сканирования, то используются его словари, иначе словари живут столько же,
+    сколько объект BookWriter.
+    """
+
+    def __init__(self, batch_size: int = 1, on_flush=None):
+        """
+        Args:
+            batch_size: число книг, записываемых в БД одним пакетом
+            on_flush: функция, вызываемая со списком книг после их записи в БД
+        """
+        self.batch_size = max(1, batch_size)
+        self.on_flush = on_flush
+        cache = _scan_cache or ScanCache()
+        self.authors: dict[str, int] = cache.authors
+        self.genres: dict[str, int] = cache.genres
+        self.series: dict[str, int] = cache.series
+        self._books: list[Book] = []
+        self._links: list[tuple[list[str], list[str], list[tuple[str, int]]]] = []
+        self._pending: set[tuple[str, str]] = set()
+
+    def __len__(self) -> int:
+        return len(self._books)
+
+    def is_pending(self, name: str, path: str) -> bool:
+        """Проверка, что книга уже находится в буфере и ожидает записи"""
+        return (name[:SIZE_BOOK_FILENAME], path[:SIZE_BOOK_PATH]) in self._pending
+
+    def add(
+        self,
+        name,
+        path,
+        cat,
+        exten,
+        title,
+        annotation,
+        docdate,
+        lang,
+        size=0,
+        archive=0,
+        authors=(),
+        genres=(),
+        series=(),
+    ) -> None:
+        """Добавление книги в буфер.
+
+        Args:
+            authors: имена авторов книги
+            genres: жанры книги
+            series: пары (название серии, номер книги в серии)
+        """
+        book = newbook(
+            name, path, cat, exten, title, annotation, docdate, lang, size, archive
+        )
+        self._books.append(book)
+        self._links.append(
+            (
+                [a[:SIZE_AUTHOR_NAME] for a in authors],
+                [g[:SIZE_GENRE] for g in genres],
+                [(s[:SIZE_SERIES], n) for s, n in series],
+            )
+        )
+        self._pending.add((book.filename, book.path))
+        if len(self._books) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> int:
+        """Запись накопленных книг в БД.
+
+        Returns:
+            int: число записанных книг
+        """
+        if not self._books:
+            return 0
+
+        resolve_names(
+            Author,
+            "full_name",
+            [a for links in self._links for a in links[0]],
+            self.authors,
+            author_defaults,
+        )
+        resolve_names(
+            Genre,
+            "genre",
+            [g for links in self._links for g in links[1]],
+            self.genres,
+            genre_defaults,
+        )
+        resolve_names(
+            Series,
+            "ser",
+            [s for links in self._links for s, _n in links[2]],
+            self.series,
+            series_defaults,
+        )
+
+        for book, (authors, _genres, _series) in zip(self._books, self._links):
+            book.dup_key = book_dup_key(book.title, (self.authors[a] for a in authors))
+
+        # Для связей нужны id книг, а получить их из bulk_create можно не во всех СУБД
+        if connection.features.can_return_rows_from_bulk_insert:
+            Book.objects.bulk_create(self._books)
+        else:
+            for book in self._books:
+                book.save()
+
+        bauthors, bgenres, bseries_list = [], [], []
+        for book, (authors, genres, series) in zip(self._books, self._links):
+            bauthors.extend(
+                bauthor(book_id=book.pk, author_id=self.authors[a]) for a in authors
+            )
+            bgenres.extend(
+                bgenre(book_id=book.pk, genre_id=self.genres[g]) for g in genres
+            )
+            bseries_list.extend(
+                bseries(book_id=book.pk, ser_id=self.series[s], ser_no=n)
+                for s, n in series
+            )
+        bauthor.objects.bulk_create(bauthors)
+        bgenre.objects.bulk_create(bgenres)
+        bseries.objects.bulk_create(bseries_list)
+
+        count = len(self._books)
+        scan_logger.info(f"{count} books flushed to database")
+        if self.on_flush is not None:
+            self.on_flush(self._books)
+        self._books = []
+        self._links = []
+        self._pending = set()
+        return count
+
+
 def set_autocommit(autocommit):
     # TODO: функция set_autocommit не используется
     transaction.set_autocommit(autocommit)
@@ -0,0 +1,76 @@
+"""Извлечение метаданных книг в пуле процессов сканера.
+
+Модуль загружается в процессах-обработчиках, которые запускаются методом
+spawn, поэтому он не должен импортировать Django и модели opds_catalog.
+Обработчики только читают файлы книг, запись в БД выполняет процесс сканера.
+"""
+
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from book_tools.format import create_bookfile
+from book_tools.format.bookfile import BookFile
+
+from opds_catalog import covers
+
+
+def create_pool(workers: int) -> ProcessPoolExecutor:
+    """Создание пула процессов для извлечения метаданных.
+
+    Используется метод запуска spawn: при fork дочерние процессы унаследовали
+    бы открытое соединение с БД.
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def detach_bookfile(book_data: BookFile) -> BookFile:
+    """Копия метаданных книги без содержимого файла для передачи между процессами"""
+    result = BookFile(None, book_data.original_filename, book_data.mimetype)
+    result.title = book_data.title
+    result.description = book_data.description
+    result.authors = book_data.authors
+    result.tags = book_data.tags
+    result.series_info = book_data.series_info
+    result.language_code = book_data.language_code
+    result.docdate = book_data.docdate
+    return result
+
+
+def parse_book(
+    path: str, member: str | None, original_filename: str, verify: bool = False
+) -> BookFile:
+    """Извлечение метаданных книги.
+
+    Args:
+        path(str): путь к файлу книги или к zip архиву с книгой
+        member(str|None): имя книги в zip архиве или None для обычного файла
+        original_filename(str): имя файла книги
+        verify(bool): проверить целостность zip архивов книг
+
+    Returns:
+        BookFile: метаданные книги без содержимого файла
+    """
+    if member is None:
+        return detach_bookfile(create_bookfile(path, original_filename, verify))
+
+    # Архив остается открытым для следующих книг из него (см. covers.OpenArchive)
+    content = covers.open_archive.read(path, member)
+    return detach_bookfile(
+        create_bookfile(io.BytesIO(content), original_filename, verify)
+    )
+
+
+def extract_cover(
+    job: covers.CoverJob, cache_root: str, cache_size: int, thumb_size: int
+) -> bool:
+    """Извлечение обложки книги в кэш обложек
+
+    Returns:
+        bool: True, если в книге есть обложка
+    """
+    return covers.cache_cover(
+        job, covers.CoverCache(cache_root, cache_size), thumb_size
+    )
@@ -2,16 +2,49 @@
 
 from django.db.models.query import RawQuerySet
 
+from collections.abc import Iterable
 from dataclasses import dataclass
 from typing import Any
 
 from constance import config
-from django.db.models import Q, QuerySet
+from django.db.models import (
+    Case,
+    Count,
+    Exists,
+    F,
+    OuterRef,
+    Q,
+    QuerySet,
+    Subquery,
+    When,
+    Window,
+)
+from django.db.models.functions import Coalesce, RowNumber
 from django.utils.html import strip_tags
 from django.utils.translation import gettext as _
 
-from opds_catalog.models import Book, Author
+from opds_catalog.models import Book, Author, bauthor, bgenre, bseries
 from opds_catalog.opds_paginator import Paginator as OPDS_Paginator
+from opds_catalog.services.counter_services import cached_count
+
+
+# Число идентификаторов книг в одном запросе IN: SQLite ограничивает число
+# параметров запроса
+IN_QUERY_CHUNK = 500
+
+# Порядок книг, для которого страницы выбираются по ключу (keyset, см.
+# book_page): поля ключа и направление сортировки по каждому из них. Последнее
+# поле уникально, поэтому порядок книг строгий
+KEYSET_ORDER = ("search_title", "-docdate", "id")
+KEYSET_FIELDS = tuple(field.lstrip("-") for field in KEYSET_ORDER)
+
+# Связи книги: ключ элемента страницы, промежуточная модель, ее поле связи и
+# поля самой промежуточной модели, выдаваемые под своими ключами
+BOOK_RELATIONS = (
+    ("authors", bauthor, "author", ()),
+    ("genres", bgenre, "genre", ()),
+    ("series", bseries, "ser", ("ser_no",)),
+)
 
 
 @dataclass
@@ -75,13 +108,18 @@ def find_by_bookshelf(filter) -> Q:
 def find_book_doubles(book_id: int) -> QuerySet[Book, Book]:
     """Поиск дубликатов книги."""
     mbook = Book.objects.get(id=book_id)
-    return Book.objects.filter(
-        title__iexact=mbook.title, authors__in=mbook.authors.all()
-    ).exclude(id=book_id)
+    if mbook.dup_key:
+        return Book.objects.filter(dup_key=mbook.dup_key).exclude(id=book_id)
+    # Ключ еще не вычислен (см. opdsdb.update_dup_keys)
+    return (
+        Book.objects.filter(title__iexact=mbook.title, authors__in=mbook.authors.all())
+        .exclude(id=book_id)
+        .distinct()
+    )
 
 
 def _order_by(type: str) -> list[str]:
-    order_by: list[str] = ["search_title", "-docdate"]
+    order_by: list[str] = list(KEYSET_ORDER)
 
     if type == OPDSSearchType.ByUser:
         order_by = [
@@ -126,30 +164,259 @@ def search_book(
     return Book.objects.filter(filter).order_by(*order_by)
 
 
+def book_relations(book_ids: Iterable[int]) -> dict[int, dict[str, list[dict]]]:
+    """Авторы, жанры, серии и номера в сериях книг страницы.
+
+    Связи всех книг загружаются запросами IN по идентификаторам книг (частями
+    по IN_QUERY_CHUNK), а не отдельными запросами для каждой книги, поэтому
+    число запросов не зависит от размера страницы. Элементы списков имеют тот
+    же вид, что и результат values() для связанных моделей.
+
+    Returns:
+        dict: для каждой книги словарь со списками authors, genres, series и
+            ser_no
+    """
+    book_ids = list(book_ids)
+    result = {
+        book_id: {"authors": [], "genres": [], "series": [], "ser_no": []}
+        for book_id in book_ids
+    }
+    for start in range(0, len(book_ids), IN_QUERY_CHUNK):
+        chunk = book_ids[start : start + IN_QUERY_CHUNK]
+        for key, through, field, extra in BOOK_RELATIONS:
+            model = through._meta.get_field(field).related_model
+            names = [f.attname for f in model._meta.concrete_fields]
+            rows = (
+                through.objects.filter(book_id__in=chunk)
+                .order_by("id")
+                .values("book_id", *extra, *(f"{field}__{name}" for name in names))
+            )
+            for row in rows:
+                relations = result[row["book_id"]]
+                relations[key].append({name: row[f"{field}__{name}"] for name in names})
+                for name in extra:
+                    relations[name].append({name: row[name]})
+    return result
+
+
+def collapse_doubles(books: QuerySet[Book, Book]) -> QuerySet[Book, Book]:
+    """Сворачивание дубликатов книг в запросе.
+
+    Дубликатами считаются книги с одинаковым ключом dup_key (название и набор
+    авторов, см. opdsdb.book_dup_key); книги без ключа дубликатов не имеют. Из
+    каждой группы дубликатов в запросе остается первая в порядке сортировки
+    books книга, аннотированная полем double_count - числом книг в группе.
+    Группы вычисляются оконными функциями в том же запросе, поэтому страница
+    выбирается одним запросом с LIMIT/OFFSET.
+    """
+    order_by = [*books.query.order_by, "id"]
+    partition_by = [F("dup_key"), Case(When(dup_key="", then=F("id")))]
+    return books.annotate(
+        double_rank=Window(RowNumber(), partition_by=partition_by, order_by=order_by),
+        double_count=Window(Count("id"), partition_by=partition_by),
+    ).filter(double_rank=1)
+
+
+def keyset_ordered(books: QuerySet[Book, Book]) -> bool:
+    """Проверка, что книги отсортированы в порядке KEYSET_ORDER"""
+    order_by = tuple(books.query.order_by)
+    return order_by in (KEYSET_ORDER, KEYSET_ORDER[:-1])
+
+
+def keyset_q(key: dict, before: bool = False) -> Q:
+    """Условие выборки книг, следующих после ключа key (или перед ним).
+
+    Args:
+        key: значения полей KEYSET_FIELDS (значения или OuterRef)
+        before: выбирать книги, предшествующие ключу в порядке KEYSET_ORDER
+    """
+    q = Q()
+    equal = {}
+    for order in KEYSET_ORDER:
+        field = order.lstrip("-")
+        # Для полей с обратной сортировкой сравнение меняется на противоположное
+        lookup = "lt" if before != order.startswith("-") else "gt"
+        q |= Q(**equal, **{f"{field}__{lookup}": key[field]})
+        equal[field] = key[field]
+    return q
+
+
+def skip_doubles(books: QuerySet[Book, Book]) -> QuerySet[Book, Book]:
+    """Сворачивание дубликатов книг, отсортированных в порядке KEYSET_ORDER.
+
+    Результат совпадает с collapse_doubles, но группы дубликатов проверяются
+    условием NOT EXISTS по индексу dup_key, а не оконными функциями. Поэтому к
+    запросу можно добавить условие keyset_q: оконные функции вычислялись бы
+    только по книгам после ключа.
+    """
+    doubles = books.order_by().filter(dup_key=OuterRef("dup_key")).exclude(dup_key="")
+    key = {field: OuterRef(field) for field in KEYSET_FIELDS}
+    double_count = doubles.values("dup_key").annotate(n=Count("id", distinct=True))
+    return books.filter(~Exists(doubles.filter(keyset_q(key, before=True)))).annotate(
+        double_count=Coalesce(Subquery(double_count.values("n")), 1)
+    )
+
+
+def keyset_rows(
+    books: QuerySet[Book, Book], book_id: int, before: bool, size: int
+) -> list[Book] | None:
+    """Книги страницы, следующей после (или перед) книгой book_id.
+
+    Returns:
+        list[Book]|None: книги страницы или None, если книги book_id уже нет
+    """
+    key = Book.objects.filter(id=book_id).values(*KEYSET_FIELDS).first()
+    if key is None:
+        return None
+    books = books.filter(keyset_q(key, before))
+    if not before:
+        return list(books.order_by(*KEYSET_ORDER)[:size])
+    reverse_order = [
+        order[1:] if order.startswith("-") else f"-{order}" for order in KEYSET_ORDER
+    ]
+    rows = list(books.order_by(*reverse_order)[:size])
+    rows.reverse()
+    return rows
+
+
+def select_page(
+    books: QuerySet,
+    first: int,
+    size: int,
+    after: int | None = None,
+    before: int | None = None,
+) -> tuple[list, bool]:
+    """Выборка size книг страницы, начинающейся с позиции first.
+
+    Если задан ключ after или before (книги должны быть отсортированы в
+    порядке KEYSET_ORDER) и книга ключа есть, книги выбираются по ключу,
+    иначе со смещением first.
+
+    Returns:
+        tuple[list[Book], bool]: книги и признак выборки перед ключом before
+    """
+    if after:
+        rows = keyset_rows(books, after, False, size)
+        if rows is not None:
+            return rows, False
+    elif before:
+        rows = keyset_rows(books, before, True, size)
+        if rows is not None:
+            return rows, True
+    return list(books[first : first + size]), False
+
+
+def page_without_count(
+    books: QuerySet,
+    first: int,
+    size: int,
+    after: int | None = None,
+    before: int | None = None,
+) -> tuple[list, int]:
+    """Выборка книг страницы без подсчета числа книг запроса.
+
+    Выбирается на одну книгу больше, чем помещается на страницу: по ней
+    определяется, есть ли следующая страница (см. select_page). Без ключей
+    after и before подходит для запроса любых записей (авторов, серий).
+
+    Returns:
+        tuple[list[Book], int]: книги страницы и оценка снизу числа книг
+            запроса, которая больше first + size, если за страницей есть книги
+    """
+    rows, backward = select_page(books, first, size + 1, after, before)
+    if backward:
+        # Лишняя книга - перед страницей, а за страницей следует книга ключа
+        return rows[max(len(rows) - size, 0) :], first + size + 1
+    return rows[:size], first + len(rows)
+
+
+def displayed_count(books: QuerySet, known: int, end: int, cache: bool = True) -> int:
+    """Число книг запроса для вывода номеров страниц.
+
+    Args:
+        known: оценка снизу числа книг из page_without_count
+        end: позиция после последней книги страницы
+        cache: использовать число книг из кэша (см. cached_count). Запросы,
+            зависящие от пользователя (книжная полка), не кэшируются
+
+    Returns:
+        int: число книг. Если за страницей книг нет, то оно известно точно и
+            запрос не выполняется. Число из кэша может устареть, поэтому оно
+            не бывает меньше known
+    """
+    if known <= end:
+        return known
+    return max(cached_count(books) if cache else books.count(), known)
+
+
+def book_page(
+    books: QuerySet[Book, Book],
+    page_num: int,
+    hide_doubles: bool,
+    after: int | None = None,
+    before: int | None = None,
+    half_pages_link: int = 3,
+    count: bool = False,
+    cache_count: bool = True,
+) -> tuple[list[Book], OPDS_Paginator]:
+    """Выборка страницы книг.
+
+    Если книги отсортированы в порядке KEYSET_ORDER и задан ключ after (id
+    последней книги предыдущей страницы) или before (id первой книги следующей
+    страницы), то страница выбирается условием на поля ключа без OFFSET, и
+    время выборки не зависит от номера страницы. Иначе, а также если книги
+    ключа уже нет, страница выбирается по номеру page_num. Ключи для ссылок на
+    соседние страницы сохраняются в пейджере (Paginator.set_cursors).
+
+    Книги страницы и наличие следующей страницы всегда определяются выборкой
+    на одну книгу больше (см. page_without_count). Число книг запроса нужно
+    только для номеров страниц: оно подсчитывается, если count (см.
+    displayed_count, cache_count), иначе число страниц в пейджере - оценка
+    снизу.
+
+    Если hide_doubles, то книги страницы - группы дубликатов, аннотированные
+    числом книг в группе double_count.
+    """
+    keyset = keyset_ordered(books)
+    if keyset:
+        books = books.order_by(*KEYSET_ORDER)
+    else:
+        after = before = None
+    if hide_doubles:
+        books = skip_doubles(books) if keyset else collapse_doubles(books)
+
+    maxitems = config.SOPDS_MAXITEMS
+    first = maxitems * (page_num - 1)
+    rows, books_count = page_without_count(books, first, maxitems, after, before)
+    if count:
+        books_count = displayed_count(books, books_count, first + maxitems, cache_count)
+    op = OPDS_Paginator(books_count, 0, page_num, maxitems, half_pages_link)
+    if keyset and rows:
+        op.set_cursors(rows[0].id, rows[-1].id)  # ty: ignore[unresolved-attribute]
+    return rows, op
+
+
 def paginated_book_content(
-    books: QuerySet[Book, Book], page_num: int, search_doubles: bool = False
+    books: QuerySet[Book, Book],
+    page_num: int,
+    search_doubles: bool = False,
+    after: int | None = None,
+    before: int | None = None,
 ):
-    """Постраничный вывод списка книг."""
-    books_count = books.count()
-    op = OPDS_Paginator(books_count, 0, page_num, config.SOPDS_MAXITEMS)
-    items = []
-
-    prev_title = ""
-    prev_authors_set = set()
+    """Постраничный вывод списка книг.
 
-    # Начинаем анализ с последнего элемента на предидущей странице, чторбы он "вытянул"
-    # с этой страницы свои дубликаты если они есть
+    Если включено скрытие дубликатов (SOPDS_DOUBLES_HIDE), страница содержит
+    группы дубликатов (см. collapse_doubles), а поле doubles элемента - число
+    скрытых дубликатов книги. Ключи after и before - см. book_page.
+    """
     summary_DOUBLES_HIDE = config.SOPDS_DOUBLES_HIDE and not search_doubles
-    start = (
-        op.d1_first_pos
-        if ((op.d1_first_pos == 0) or (not summary_DOUBLES_HIDE))
-        else op.d1_first_pos - 1
-    )
-    finish = op.d1_last_pos
+    rows, op = book_page(books, page_num, summary_DOUBLES_HIDE, after, before)
+    items = []
 
-    for row in books[start : finish + 1]:
+    relations = book_relations(row.id for row in rows)  # ty: ignore[unresolved-attribute]
+    for row in rows:
         p = {
-            "doubles": 0,
+            "doubles": row.double_count - 1 if summary_DOUBLES_HIDE else 0,  # ty: ignore[unresolved-attribute]
             "lang_code": row.lang_code,
             "filename": row.filename,
             "path": row.path,
@@ -160,40 +427,9 @@ def paginated_book_content(
             "format": row.format,
             "title": row.title,
             "filesize": row.filesize // 1000,
-            "authors": row.authors.values(),
-            "genres": row.genres.values(),
-            "series": row.series.values(),
-            "ser_no": row.bseries_set.values("ser_no"),  # ty: ignore[unresolved-attribute]
+            **relations[row.id],  # ty: ignore[unresolved-attribute]
         }
-        if summary_DOUBLES_HIDE:
-            title: str = p["title"]
-            authors_set: set[int] = {a["id"] for a in p["authors"]}
-            if title.upper() == prev_title.upper() and authors_set == prev_authors_set:
-                items[-1]["doubles"] += 1
-            else:
-                items.append(p)
-            prev_title = title
-            prev_authors_set = authors_set
-        else:
-            items.append(p)
-
-    # "вытягиваем" дубликаты книг со следующей страницы и удаляем первый элемент
-    # который с предыдущей страницы и "вытягивал" дубликаты с текущей
-    if summary_DOUBLES_HIDE:
-        double_flag = True
-        while ((finish + 1) < books_count) and double_flag:
-            finish += 1
-            if (
-                books[finish].title.upper() == prev_title.upper()
-                and {a["id"] for a in books[finish].authors.values()}
-                == prev_authors_set
-            ):
-                items[-1]["doubles"] += 1
-            else:
-                double_flag = False
-
-        if op.d1_first_pos != 0:
-            items.pop(0)
+        items.append(p)
 
     return items, op
 
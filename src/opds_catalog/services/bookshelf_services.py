@@ -1,5 +1,7 @@
 """Сервисы для работы с книжной полкой пользователя."""
 
+from collections.abc import Iterable
+
 from opds_catalog.models import Book, bookshelf
 from django.contrib.auth.models import User
 
@@ -19,3 +21,25 @@ def get_bookshelf_books_count(user: User) -> int:
 def add_book_to_bookshelf(user: User, book: Book) -> None:
     """Добавляет книгу на книжную полку пользователя, если такой книги еще нет."""
     bookshelf.objects.get_or_create(user=user, book=book)
+
+
+def get_readtimes(user: User, book_ids: Iterable[int]) -> dict[int, list[dict]]:
+    """Даты прочтения книг страницы пользователем (одним запросом).
+
+    :param user: Пользователь, книжная полка которого просматривается.
+    :type user: User
+    :param book_ids: Идентификаторы книг.
+    :type book_ids: Iterable[int]
+
+    :returns: Для каждой книги список словарей {'readtime': ...}, как у
+        values('readtime'); пустой список, если книги нет на полке.
+    :rtype: dict[int, list[dict]]
+    """
+    book_ids = list(book_ids)
+    result: dict[int, list[dict]] = {book_id: [] for book_id in book_ids}
+    rows = bookshelf.objects.filter(user=user, book_id__in=book_ids).values(
+        "book_id", "readtime"
+    )
+    for row in rows:
+        result[row["book_id"]].append({"readtime": row["readtime"]})
+    return result
@@ -4,6 +4,11 @@ from django.db.models import QuerySet
 from django.utils.html import strip_tags
 
 from opds_catalog.models import Book, Catalog
+from opds_catalog.services.book_services import (
+    KEYSET_ORDER,
+    book_relations,
+    page_without_count,
+)
 from opds_catalog.opds_paginator import Paginator as OPDS_Paginator
 import logging
 
@@ -74,17 +79,35 @@ def get_books_count(root: Catalog) -> int:
 
 
 def paginated_catalog_content(
-    cat: Catalog, current_page: int, pager_max_items: int
+    cat: Catalog,
+    current_page: int,
+    pager_max_items: int,
+    after: int | None = None,
+    before: int | None = None,
 ) -> tuple[list, dict]:
-    """Предоставляет содержимое каталога в виде одной страницы."""
+    """Предоставляет содержимое каталога в виде одной страницы.
+
+    Книги страницы выбираются по ключу after или before (id последней книги
+    предыдущей или первой книги следующей страницы, см.
+    book_services.book_page), если он задан, иначе по номеру страницы. Число
+    книг каталога не подсчитывается: наличие следующей страницы определяется
+    по лишней выбранной книге (см. book_services.page_without_count).
+    """
     catalogs_list = get_catalogs_query(cat).order_by("cat_name")
     catalogs_count = catalogs_list.count()
-    # prefetch_related on sqlite on items >999 therow error "too many SQL variables"
-    books_list = get_books_query(cat).order_by("search_title")
-    books_count = books_list.count()
+    # Связи книг страницы загружаются в book_relations: prefetch_related
+    # на sqlite при числе книг >999 выдает ошибку "too many SQL variables"
+    books_list = get_books_query(cat).order_by(*KEYSET_ORDER)
+
+    # Книги следуют в списке после подкаталогов
+    first = max(pager_max_items * (current_page - 1) - catalogs_count, 0)
+    size = max(pager_max_items * current_page - catalogs_count, 0) - first
+    rows, books_count = page_without_count(books_list, first, size, after, before)
 
     # Получаем результирующий список
     op = OPDS_Paginator(catalogs_count, books_count, current_page, pager_max_items)
+    if rows:
+        op.set_cursors(rows[0].id, rows[-1].id)  # ty: ignore [unresolved-attribute]
     items = []
 
     for row in catalogs_list[op.d1_first_pos : op.d1_last_pos + 1]:
@@ -98,7 +121,8 @@ def paginated_catalog_content(
         }
         items.append(p)
 
-    for row in books_list[op.d2_first_pos : op.d2_last_pos + 1]:
+    relations = book_relations(row.id for row in rows)  # ty: ignore [unresolved-attribute]
+    for row in rows:
         p = {
             "is_catalog": 0,
             "lang_code": row.lang_code,
@@ -111,10 +135,7 @@ def paginated_catalog_content(
             "format": row.format,
             "title": row.title,
             "filesize": row.filesize // 1000,
-            "authors": row.authors.values(),
-            "genres": row.genres.values(),
-            "series": row.series.values(),
-            "ser_no": row.bseries_set.values("ser_no"),  # ty: ignore [unresolved-attribute]
+            **relations[row.id],  # ty: ignore [unresolved-attribute]
             "prefix": "b",
         }
         items.append(p)
@@ -1,5 +1,11 @@
 """Сервисы для работы со статистическими счетчиками."""
 
+import hashlib
+
+from constance import config
+from django.core.cache import cache
+from django.db.models import QuerySet
+
 from opds_catalog.models import (
     Counter,
     counter_allcatalogs,
@@ -45,3 +51,26 @@ def get_genres_count() -> int:
 def get_series_count() -> int:
     """Возвращает количество серий."""
     return get_counter(counter_allseries)
+
+
+def cached_count(query: QuerySet) -> int:
+    """Возвращает число записей запроса, запомненное в кэше.
+
+    Число записей запоминается на время кэширования страниц
+    (SOPDS_CACHE_TIME), поэтому повторный показ страниц того же поиска не
+    выполняет COUNT(*) заново. Используется только там, где общее число
+    записей выводится пользователю.
+
+    :param query: Запрос, число записей которого требуется
+    :type query: QuerySet
+
+    :returns: число записей запроса
+    :rtype: int
+    """
+    sql, params = query.order_by().query.sql_with_params()
+    key = "sopds:count:%s" % hashlib.md5(f"{sql}{params!r}".encode()).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = query.count()
+        cache.set(key, count, config.SOPDS_CACHE_TIME)
+    return count
@@ -28,6 +28,8 @@ SUBTITLE = getattr(
 )
 ICON = getattr(settings, "SOPDS_ICON", "/static/images/favicon.ico")
 THUMB_SIZE = 300
+# Число zip архивов библиотеки, которые держит открытыми каждый процесс сервера
+ZIP_CACHE_SIZE = getattr(settings, "SOPDS_ZIP_CACHE_SIZE", 32)
 
 loglevel = getattr(settings, "SOPDS_LOGLEVEL", "info")
 if loglevel.lower() in loglevels:
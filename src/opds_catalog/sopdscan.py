@@ -5,24 +5,60 @@ import time
 import datetime
 import logging
 import re
+import sys
 
 from book_tools.format import create_bookfile
 from book_tools.format.util import strip_symbols
 
-# from django.db import transaction
+from django.db import transaction
 from django.utils.translation import gettext as _
 
 from opds_catalog import fb2parse, opdsdb
-from opds_catalog import inpx_parser
+from opds_catalog import inp_reader, inpx_parser, scan_workers
+from opds_catalog.cover_extractor import CoverExtractor
+from opds_catalog.models import ScanCheckpoint
 import opds_catalog.zipf as zipfile
 
 from constance import config
 
 
+def stat_fingerprint(stat: os.stat_result) -> tuple[int, int, int | None]:
+    """Отпечаток файла (размер, время изменения, inode) для opdsdb.FingerprintIndex"""
+    return (stat.st_size, stat.st_mtime_ns, stat.st_ino or None)
+
+
+def walk_key(rel_dir: str) -> tuple[str, ...] | None:
+    """Ключ, упорядочивающий каталоги так же, как их обходит os.walk с сортировкой
+
+    Returns:
+        tuple|None: компоненты пути каталога или None для пустого пути
+    """
+    if not rel_dir:
+        return None
+    if rel_dir == os.curdir:
+        return ()
+    return tuple(rel_dir.split(os.sep))
+
+
 class opdsScanner:
-    def __init__(self, logger=None):
+    def __init__(self, logger=None, workers: int = 0):
         self.fb2parser = None
         self.init_parser()
+        # Если workers > 1, то метаданные книг извлекаются в пуле процессов,
+        # а запись в БД выполняет только текущий процесс
+        self.workers = workers
+        self.pool = None
+        self.parsing = {}
+        # Отпечатки файлов и каталогов используются только в scan_all
+        self.fingerprints = None
+        # Транзакция текущей части сканирования (только в scan_all)
+        self.chunk = None
+        self.checkpoint = ""
+        # Вне scan_all книги записываются в БД сразу после обработки
+        self.writer = opdsdb.BookWriter()
+        self.books = opdsdb.AvailabilityMarker()
+        # Извлечение обложек новых книг (SOPDS_SCAN_EXTRACT_COVERS)
+        self.covers = None
 
         if logger:
             self.logger = logger
@@ -41,6 +77,7 @@ class opdsScanner:
         self.books_deleted = 0
         self.arch_scanned = 0
         self.arch_skipped = 0
+        self.dirs_skipped = 0
         self.bad_archives = 0
         self.bad_books = 0
         self.books_in_archives = 0
@@ -79,6 +116,7 @@ class opdsScanner:
         self.logger.info("Books in archives: " + str(self.books_in_archives))
         self.logger.info("Archives scanned : " + str(self.arch_scanned))
         self.logger.info("Archives skipped : " + str(self.arch_skipped))
+        self.logger.info("Dirs skipped     : " + str(self.dirs_skipped))
         self.logger.info("Bad archives     : " + str(self.bad_archives))
 
         t = self.t2 - self.t1
@@ -96,49 +134,221 @@ class opdsScanner:
         )
 
     def scan_all(self):
-        """Запуск сканирования библиотеки"""
+        """Запуск сканирования библиотеки.
+
+        Результаты сканирования фиксируются в БД частями (см. commit_chunk).
+        После каждой фиксации в ScanCheckpoint сохраняется последний
+        полностью обработанный каталог, поэтому прерванное сканирование при
+        следующем запуске продолжается с места остановки: признак avail=1 книгам
+        повторно не устанавливается, а уже обработанные каталоги пропускаются.
+        """
         self.init_stats()
         self.log_options()
         self.inp_cat = None
         self.zip_file = None
         self.rel_path = None
 
-        opdsdb.avail_check_prepare()
-        self.logger.debug(f"ZipScan: {config.SOPDS_ZIPSCAN}")
-        for full_path, dirs, files in os.walk(config.SOPDS_ROOT_LIB, followlinks=True):
-            # Если разрешена обработка inpx, то при нахождении inpx обрабатываем его и прекращаем обработку текущего каталога
-            if config.SOPDS_INPX_ENABLE:
-                inpx_files = [
-                    inpx for inpx in files if re.match(".*(.inpx|.INPX)$", inpx)
-                ]
-                # Пропускаем обработку файлов в текущем каталоге, если найдены inpx
-                if inpx_files:
-                    for inpx_file in inpx_files:
-                        file = os.path.join(full_path, inpx_file)
-                        self.processinpx(inpx_file, full_path, file)
-                    continue
-
-            for name in files:
-                file = os.path.join(full_path, name)
-                (n, e) = os.path.splitext(name)
-                if e.lower() == ".zip":
-                    if config.SOPDS_ZIPSCAN:
-                        self.logger.info(f"Process zip file {file}")
-                        self.processzip(name, full_path, file)
-                else:
-                    self.logger.info("Process regular file {file}")
-                    file_size = os.path.getsize(file)
-                    self.processfile(name, full_path, file, None, 0, file_size)
+        self.checkpoint = ScanCheckpoint.objects.get_path()
+        resume_from = walk_key(self.checkpoint)
 
-        # if config.SOPDS_DELETE_LOGICAL:
-        #    self.books_deleted=opdsdb.books_del_logical()
-        # else:
-        #    self.books_deleted=opdsdb.books_del_phisical()
+        # Справочники кешируются в памяти только на время сканирования
+        opdsdb.scan_cache_start()
+        if self.workers > 1:
+            self.logger.info(
+                f"Start metadata extraction pool of {self.workers} workers"
+            )
+            self.pool = scan_workers.create_pool(self.workers)
+        if config.SOPDS_SCAN_SKIP_UNCHANGED:
+            self.fingerprints = opdsdb.FingerprintIndex()
+            self.fingerprints.preload()
+        self.begin_chunk()
+        try:
+            if resume_from is None:
+                opdsdb.avail_check_prepare()
+            else:
+                self.logger.info(
+                    f"Resume interrupted scan after directory {self.checkpoint}"
+                )
+            self.writer = opdsdb.BookWriter(
+                config.SOPDS_SCAN_BATCH_SIZE, self.start_covers()
+            )
+            self.books = opdsdb.AvailabilityMarker(config.SOPDS_SCAN_BATCH_SIZE)
+            self.logger.debug(f"ZipScan: {config.SOPDS_ZIPSCAN}")
+            for full_path, dirs, files in os.walk(
+                config.SOPDS_ROOT_LIB, followlinks=True
+            ):
+                # Каталоги обходятся в одном и том же порядке, чтобы можно было
+                # продолжить прерванное сканирование
+                dirs.sort()
+                files.sort()
+                rel_dir = os.path.relpath(full_path, config.SOPDS_ROOT_LIB)
+                if resume_from is not None and walk_key(rel_dir) <= resume_from:
+                    self.logger.info(f"Skip directory {rel_dir}. Already scanned.")
+                    continue
 
-        self.books_deleted = opdsdb.books_del_phisical()
+                self.process_dir(full_path, files)
+                self.chunk_done(rel_dir)
+
+            self.complete_parsing()
+            self.writer.flush()
+            self.books.flush()
+            self.complete_covers()
+            if self.fingerprints is not None:
+                # После продолжения прерванного сканирования неизвестно, какие
+                # пути встречались до прерывания, поэтому отпечатки не удаляются
+                self.fingerprints.flush(remove_stale=resume_from is None)
+
+            # if config.SOPDS_DELETE_LOGICAL:
+            #    self.books_deleted=opdsdb.books_del_logical()
+            # else:
+            #    self.books_deleted=opdsdb.books_del_phisical()
+
+            self.books_deleted = opdsdb.books_del_phisical()
+            ScanCheckpoint.objects.set_path("")
+        except BaseException:
+            self.end_chunk(*sys.exc_info())
+            raise
+        else:
+            self.end_chunk()
+        finally:
+            self.fingerprints = None
+            opdsdb.scan_cache_stop()
+            if self.pool is not None:
+                self.pool.shutdown(cancel_futures=True)
+                self.pool = None
+                self.parsing = {}
 
         self.log_stats()
 
+    def process_dir(self, full_path: str, files: list[str]) -> None:
+        """Обработка файлов каталога библиотеки (без подкаталогов)"""
+        # Если разрешена обработка inpx, то при нахождении inpx обрабатываем его и прекращаем обработку текущего каталога
+        if config.SOPDS_INPX_ENABLE:
+            inpx_files = [inpx for inpx in files if re.match(".*(.inpx|.INPX)$", inpx)]
+            # Пропускаем обработку файлов в текущем каталоге, если найдены inpx
+            if inpx_files:
+                for inpx_file in inpx_files:
+                    file = os.path.join(full_path, inpx_file)
+                    self.processinpx(inpx_file, full_path, file)
+                return
+
+        dir_fingerprint = None
+        if self.fingerprints is not None:
+            dir_fingerprint = self.check_dir(full_path, files)
+            if dir_fingerprint is None:
+                return
+
+        for name in files:
+            file = os.path.join(full_path, name)
+            (n, e) = os.path.splitext(name)
+            if e.lower() == ".zip":
+                if config.SOPDS_ZIPSCAN:
+                    self.logger.info(f"Process zip file {file}")
+                    self.processzip(name, full_path, file)
+                    self.chunk_done()
+            else:
+                self.logger.info("Process regular file {file}")
+                file_size = os.path.getsize(file)
+                self.processfile(name, full_path, file, None, 0, file_size)
+
+        # Отпечаток каталога запоминается только после обработки всех его файлов
+        if dir_fingerprint is not None:
+            self.fingerprints.store(*dir_fingerprint)
+
+    def begin_chunk(self) -> None:
+        """Начало транзакции очередной части сканирования"""
+        self.chunk = transaction.atomic()
+        self.chunk.__enter__()
+        self.chunk_start = self.books_added + self.books_skipped
+
+    def end_chunk(self, exc_type=None, exc_value=None, traceback=None) -> None:
+        """Фиксация (или откат при исключении) транзакции текущей части"""
+        chunk, self.chunk = self.chunk, None
+        chunk.__exit__(exc_type, exc_value, traceback)
+
+    def chunk_done(self, checkpoint: str | None = None) -> None:
+        """Отметка завершения обработки архива, INP файла или каталога.
+
+        Если с начала текущей части обработано не менее SOPDS_SCAN_CHUNK_SIZE
+        книг, то часть фиксируется в БД.
+
+        Args:
+            checkpoint: полностью обработанный каталог, с которого можно
+                продолжить прерванное сканирование
+        """
+        # Вне scan_all изменения фиксирует вызывающий код
+        if self.chunk is None:
+            return
+        if checkpoint is not None:
+            self.checkpoint = checkpoint
+        processed = self.books_added + self.books_skipped - self.chunk_start
+        if processed >= config.SOPDS_SCAN_CHUNK_SIZE:
+            self.commit_chunk()
+
+    def commit_chunk(self) -> None:
+        """Запись накопленных данных и фиксация текущей части сканирования"""
+        self.complete_parsing()
+        self.writer.flush()
+        self.books.flush()
+        if self.fingerprints is not None:
+            self.fingerprints.flush()
+        ScanCheckpoint.objects.set_path(self.checkpoint)
+        self.end_chunk()
+        self.logger.info(f"Scan progress committed at directory {self.checkpoint}")
+        self.begin_chunk()
+
+    def check_dir(self, full_path: str, files: list[str]) -> tuple | None:
+        """Пропуск каталога, не изменившегося с прошлого сканирования.
+
+        Отпечаток каталога составляется из его собственного времени изменения
+        и отпечатков файлов, которые обрабатывает сканер (книги и, если
+        разрешено, zip архивы). Поэтому изменение SOPDS_BOOK_EXTENSIONS или
+        SOPDS_ZIPSCAN, добавляющее в обработку новые файлы, тоже приводит к
+        повторной обработке каталога. Подкаталоги проверяются отдельно.
+
+        Если каталог не изменился, то все его книги и книги из его архивов
+        помечаются доступными (avail=2).
+
+        Returns:
+            tuple|None: путь и новый отпечаток каталога, который нужно сохранить
+                после обработки его файлов, или None, если каталог не изменился
+                и его обработку можно пропустить
+        """
+        rel_dir = os.path.relpath(full_path, config.SOPDS_ROOT_LIB)
+        extensions = config.SOPDS_BOOK_EXTENSIONS.split()
+        dir_stat = os.stat(full_path)
+        size = 0
+        mtime = dir_stat.st_mtime_ns
+        archives = []
+        for name in files:
+            (n, e) = os.path.splitext(name)
+            e = e.lower()
+            if e == ".zip" and config.SOPDS_ZIPSCAN:
+                archives.append(
+                    os.path.relpath(
+                        os.path.join(full_path, name), config.SOPDS_ROOT_LIB
+                    )
+                )
+            elif e not in extensions:
+                continue
+            file_fingerprint = stat_fingerprint(os.stat(os.path.join(full_path, name)))
+            size += file_fingerprint[0]
+            mtime = max(mtime, file_fingerprint[1])
+
+        fingerprint = (size, mtime, dir_stat.st_ino or None)
+        if self.fingerprints.check(rel_dir, fingerprint):
+            # Отпечатки архивов каталога тоже должны остаться в БД
+            for archive in archives:
+                self.fingerprints.keep(archive)
+            self.books.flush()
+            opdsdb.books_mark_avail([rel_dir, *archives])
+            self.dirs_skipped += 1
+            self.arch_skipped += len(archives)
+            self.logger.info(f"Skip directory {rel_dir}. Not changed since last scan.")
+            return None
+
+        return (rel_dir, fingerprint)
+
     def inpskip_callback(self, inpx, inp_file, inp_size) -> int:
         """Проверка необходимости обработки найденного inxp файла
         :inpx: найденный файл
@@ -147,6 +357,8 @@ class opdsScanner:
 
         :returns: 0 если файл требуется обработать, 1 если обработка не требуется
         """
+        # Предыдущий INP файл обработан полностью
+        self.chunk_done()
         self.rel_path = os.path.relpath(
             os.path.join(inpx, inp_file), config.SOPDS_ROOT_LIB
         )
@@ -165,49 +377,31 @@ class opdsScanner:
 
         return result
 
-    def inpx_callback(self, inpx, inp, meta_data):
-        self.logger.info(f"Append book {meta_data[inpx_parser.sTitle]} to database")
-        name = "%s.%s" % (
-            meta_data[inpx_parser.sFile],
-            meta_data[inpx_parser.sExt],
-        )
-
-        lang = meta_data[inpx_parser.sLang].strip(strip_symbols)
-        title = meta_data[inpx_parser.sTitle].strip(strip_symbols)
-        annotation = ""
-        docdate = meta_data[inpx_parser.sDate].strip(strip_symbols)
-
-        rel_path_current = os.path.join(self.rel_path, meta_data[inpx_parser.sFolder])
-        self.logger.debug(f"Library book path is {rel_path_current}")
-        if opdsdb.findbook(name, rel_path_current, 1) is None:
+    def inpx_callback(self, inpx, inp, record: inp_reader.InpRecord):
+        name = f"{record.file}.{record.ext}"
+        rel_path_current = os.path.join(self.rel_path, record.folder)
+        if self.writer.is_pending(name, rel_path_current):
+            self.logger.info(f"Book {name} is already queued, skipping")
+        elif not self.books.exists(name, rel_path_current):
             self.logger.info(f"Book {name} is new, store to database")
             cat = opdsdb.addcattree(rel_path_current, opdsdb.CAT_INP)
-            book = opdsdb.addbook(
+            self.writer.add(
                 name,
                 rel_path_current,
                 cat,
-                meta_data[inpx_parser.sExt],
-                title,
-                annotation,
-                docdate,
-                lang,
-                meta_data[inpx_parser.sSize],
+                record.ext,
+                record.title.strip(strip_symbols),
+                "",
+                record.date.strip(strip_symbols),
+                record.lang.strip(strip_symbols),
+                record.size,
                 opdsdb.CAT_INP,
+                authors=[a.replace(",", " ") for a in record.authors],
+                genres=[g.lower().strip(strip_symbols) for g in record.genres],
+                series=[(s.strip(), 0) for s in record.series],
             )
             self.books_added += 1
             self.books_in_archives += 1
-            self.logger.debug("Book " + rel_path_current + "/" + name + " Added ok.")
-
-            for a in meta_data[inpx_parser.sAuthor]:
-                author = opdsdb.addauthor(a.replace(",", " "))
-                opdsdb.addbauthor(book, author)
-
-            for g in meta_data[inpx_parser.sGenre]:
-                opdsdb.addbgenre(book, opdsdb.addgenre(g.lower().strip(strip_symbols)))
-
-            for s in meta_data[inpx_parser.sSeries]:
-                ser = opdsdb.addseries(s.strip())
-                opdsdb.addbseries(book, ser, 0)
 
     def processinpx(self, name, full_path, file):
         self.logger.info(f"Start processing INPX file {name}")
@@ -219,22 +413,107 @@ class opdsScanner:
             self.logger.info(f"INPX file {file} is not changed. Skipping")
         else:
             self.logger.info(f"Create catalog for INPX file {file}")
-            opdsdb.addcattree(rel_file, opdsdb.CAT_INPX, inpx_size)
-            inpx = inpx_parser.Inpx(file, self.inpx_callback, self.inpskip_callback)
+            # Размер INPX сохраняется только после его полной обработки, чтобы
+            # прерванная обработка не считалась завершенной при продолжении
+            cat = opdsdb.addcattree(rel_file, opdsdb.CAT_INPX, 0)
+            inpx = inpx_parser.Inpx(
+                file,
+                self.inpx_callback,
+                self.inpskip_callback,
+                pool=self.pool,
+                workers=self.workers,
+            )
             # FIXME: Неизвестные атрибуты inpx_parser
             inpx.INPX_TEST_ZIP = config.SOPDS_INPX_TEST_ZIP
             inpx.INPX_TEST_FILES = config.SOPDS_INPX_TEST_FILES
             inpx.parse()
+            opdsdb.update_cat_size(cat, inpx_size)
+
+    def scan_changes(self, changed: set[str], deleted: set[str]) -> None:
+        """Обработка изменений в файлах библиотеки (режим наблюдения).
+
+        Args:
+            changed: полные пути новых и измененных файлов
+            deleted: полные пути удаленных файлов, архивов и каталогов
+        """
+        self.init_stats()
+        # Справочники не загружаются целиком, а кешируются по мере обращения
+        opdsdb.scan_cache_start(preload=False)
+        try:
+            self.writer = opdsdb.BookWriter(
+                config.SOPDS_SCAN_BATCH_SIZE, self.start_covers()
+            )
+            self.books = opdsdb.AvailabilityMarker(config.SOPDS_SCAN_BATCH_SIZE)
+            for file in sorted(deleted):
+                rel_file = os.path.relpath(file, config.SOPDS_ROOT_LIB)
+                self.logger.info(f"Remove books of deleted path {rel_file}")
+                self.books_deleted += opdsdb.deleted_books(
+                    opdsdb.books_del_path(rel_file)
+                )
+
+            for file in sorted(changed):
+                if not os.path.isfile(file):
+                    continue
+                full_path, name = os.path.split(file)
+                (n, e) = os.path.splitext(name)
+                e = e.lower()
+                if config.SOPDS_INPX_ENABLE:
+                    if e == ".inpx":
+                        self.processinpx(name, full_path, file)
+                        continue
+                    # Файлы каталогов с inpx обрабатываются только через inpx
+                    if any(f.lower().endswith(".inpx") for f in os.listdir(full_path)):
+                        continue
+                if e == ".zip":
+                    if config.SOPDS_ZIPSCAN:
+                        self.logger.info(f"Process changed zip file {file}")
+                        self.rescanzip(name, full_path, file)
+                else:
+                    self.logger.info(f"Process changed regular file {file}")
+                    file_size = os.path.getsize(file)
+                    self.processfile(name, full_path, file, None, 0, file_size)
+
+            self.writer.flush()
+            self.books.flush()
+            self.complete_covers()
+        finally:
+            opdsdb.scan_cache_stop()
+
+        self.log_stats()
+
+    def rescanzip(self, name, full_path, file) -> None:
+        """Повторная обработка измененного архива с удалением исчезнувших из него книг"""
+        rel_file = os.path.relpath(file, config.SOPDS_ROOT_LIB)
+        opdsdb.avail_check_prepare(rel_file)
+        self.processzip(name, full_path, file, force=True)
+        self.writer.flush()
+        self.books.flush()
+        self.books_deleted += opdsdb.deleted_books(opdsdb.books_del_phisical(rel_file))
 
-    def processzip(self, name, full_path, file):
+    def processzip(self, name, full_path, file, force=False):
         self.logger.info(f"Start processing zipfile {name}")
         self.logger.debug(f"File directory: {full_path}")
         self.logger.debug(f"Full file path: {file}")
         rel_file = os.path.relpath(file, config.SOPDS_ROOT_LIB)
-        zsize = os.path.getsize(file)
-        if opdsdb.arc_skip(rel_file, zsize):
+        zip_fingerprint = stat_fingerprint(os.stat(file))
+        zsize = zip_fingerprint[0]
+        unchanged = None
+        # При force архив обрабатывается, даже если он выглядит неизмененным
+        if force:
+            unchanged = False
+        elif self.fingerprints is not None:
+            unchanged = self.fingerprints.check(rel_file, zip_fingerprint)
+        if unchanged:
+            self.books.flush()
+            opdsdb.books_mark_avail([rel_file])
+            self.arch_skipped += 1
+            self.logger.info(f"Skip ZIP archive {rel_file}. Not changed.")
+        # Если отпечаток архива неизвестен, то он сравнивается по размеру
+        elif unchanged is None and opdsdb.arc_skip(rel_file, zsize):
             self.arch_skipped += 1
             self.logger.info(f"Skip ZIP archive {rel_file}. Already scanned.")
+            if self.fingerprints is not None:
+                self.fingerprints.store(rel_file, zip_fingerprint)
         else:
             # TODO:Обработка файлов в ФС должна быть описана в одном месте
             self.logger.info(f"Process ZIP archive {rel_file}")
@@ -246,11 +525,13 @@ class opdsScanner:
                 for n in filelist:
                     try:
                         file_size = z.getinfo(n).file_size
-                        bookfile = z.open(n)
+                        # Процесс-обработчик пула сам читает книгу из архива
+                        bookfile = z.open(n) if self.pool is None else None
                         self.processfile(
                             n, file, bookfile, cat, opdsdb.CAT_ZIP, file_size
                         )
-                        bookfile.close()
+                        if bookfile is not None:
+                            bookfile.close()
                     except zipfile.BadZipFile as e:
                         self.logger.warning(
                             f"Error processing  book file '{n}' in ZIP file '{file}': {e}"
@@ -258,6 +539,8 @@ class opdsScanner:
                         zip_process_error = 1
                 z.close()
                 self.arch_scanned += 1
+                if self.fingerprints is not None:
+                    self.fingerprints.store(rel_file, zip_fingerprint)
             except zipfile.BadZipFile as e:
                 self.logger.error(
                     f"Error while read ZIP archive. File {file} corrupt: {e}"
@@ -277,104 +560,39 @@ class opdsScanner:
             rel_path = os.path.relpath(full_path, config.SOPDS_ROOT_LIB)
             self.logger.debug(f"Attempt to add book {rel_path}/{name}")
             try:
-                if opdsdb.findbook(name, rel_path, 1) is None:
+                if (
+                    self.writer.is_pending(name, rel_path)
+                    or (name, rel_path) in self.parsing
+                ):
+                    self.books_skipped += 1
+                    self.logger.info(f"Book {rel_path}/{name} already queued.")
+                elif not self.books.exists(name, rel_path):
                     self.logger.info(f"Book {name} is new")
                     if archive == 0:
                         self.logger.info(f"Add new catalog {rel_path}")
                         cat = opdsdb.addcattree(rel_path, archive)
 
+                    if self.pool is not None:
+                        # Для книги из архива в процесс-обработчик передается путь
+                        # к архиву и имя книги в нем (file не открывается)
+                        source = (full_path, name) if archive else (file, None)
+                        self.submit(source, name, rel_path, cat, archive, file_size)
+                        return
+
                     try:
                         self.logger.info(f"Extracting book metadata from {name}")
-                        book_data = create_bookfile(file, name)
+                        book_data = create_bookfile(
+                            file, name, config.SOPDS_SCAN_VERIFY_ARCHIVES
+                        )
                     except Exception as err:
-                        book_data = None
                         self.logger.error(
                             f"{rel_path} - {name} book parse error, skipping. Error was: {err}"
                         )
                         self.bad_books += 1
-
-                    # TODO: объект BookData должен сам выполнять валидацию своих полей при создании
-                    if book_data:
-                        lang = (
-                            book_data.language_code.strip(strip_symbols)
-                            if book_data.language_code
-                            else ""
+                    else:
+                        self.store_book(
+                            name, rel_path, cat, archive, file_size, book_data
                         )
-                        title = (
-                            book_data.title.strip(strip_symbols)
-                            if book_data.title
-                            else n
-                        )
-                        annotation = (
-                            book_data.description if book_data.description else ""
-                        )
-                        annotation = (
-                            annotation.strip(strip_symbols)
-                            if isinstance(annotation, str)
-                            else annotation.decode("utf8").strip(strip_symbols)
-                        )
-                        docdate = book_data.docdate if book_data.docdate else ""
-
-                        self.logger.info(f"Store book '{name}' metainfo in database")
-                        book = opdsdb.addbook(
-                            name,
-                            rel_path,
-                            cat,
-                            e[1:],
-                            title,
-                            annotation,
-                            docdate,
-                            lang,
-                            file_size,
-                            archive,
-                        )
-                        self.books_added += 1
-
-                        if archive != 0:
-                            self.books_in_archives += 1
-                        self.logger.info(
-                            f"Book {rel_path}/{name}  metadata successfully writed to database."
-                        )
-
-                        self.logger.info(
-                            f"Store authors metadata for {name} in database"
-                        )
-                        for a in book_data.authors:
-                            author_name = a.get("name", _("Unknown author")).strip(
-                                strip_symbols
-                            )
-                            # Если в имени автора нет запятой, то фамилию переносим из конца в начало
-                            # FIXME: информация об авторе не должна трансформироваться
-                            if author_name and author_name.find(",") < 0:
-                                author_names = author_name.split()
-                                author_name = " ".join(
-                                    [
-                                        author_names[-1],
-                                        " ".join(author_names[:-1]),
-                                    ]
-                                )
-                            self.logger.debug(f"Author: {author_name}")
-                            author = opdsdb.addauthor(author_name)
-                            self.logger.debug(f"Link {book} to {author}")
-                            opdsdb.addbauthor(book, author)
-                        self.logger.info("Authors metadata stored succesfully")
-
-                        self.logger.info(
-                            f"Store genres metadata for {name} in database"
-                        )
-                        for genre in book_data.tags:
-                            opdsdb.addbgenre(
-                                book,
-                                opdsdb.addgenre(genre.lower().strip(strip_symbols)),
-                            )
-                        self.logger.info("Genres metadata stored successfully")
-
-                        # FIXME: series_info определяется только по наличию названия серии, номер в серии устанавливается в 0 если не указан
-                        if book_data.series_info:
-                            ser = opdsdb.addseries(book_data.series_info["title"])
-                            ser_no = book_data.series_info["index"] or "0"
-                            ser_no = int(ser_no) if ser_no.isdigit() else 0
-                            opdsdb.addbseries(book, ser, ser_no)
                 else:
                     self.books_skipped += 1
                     self.logger.info(f"Book {rel_path}/{name} already in database.")
@@ -383,3 +601,133 @@ class opdsScanner:
                     f"{rel_path} - {name} book UnicodeEncodeError error, skipping. Error was: {err}"
                 )
                 self.bad_books += 1
+
+    def start_covers(self):
+        """Подготовка извлечения обложек новых книг
+
+        Returns:
+            функция для BookWriter, передающая записанные книги на извлечение
+            обложек, или None, если извлечение обложек при сканировании отключено
+        """
+        self.covers = None
+        if not config.SOPDS_SCAN_EXTRACT_COVERS:
+            return None
+        self.covers = CoverExtractor(self.pool, self.workers, self.logger)
+        return self.covers.add
+
+    def complete_covers(self) -> None:
+        """Ожидание извлечения обложек новых книг"""
+        if self.covers is None:
+            return
+        self.covers.complete()
+        self.covers.log_stats()
+        self.covers = None
+
+    def submit(self, source, name, rel_path, cat, archive, file_size) -> None:
+        """Передача книги на извлечение метаданных в пул процессов"""
+        self.logger.info(f"Send {name} to metadata extraction pool")
+        path, member = source
+        future = self.pool.submit(
+            scan_workers.parse_book,
+            path,
+            member,
+            name,
+            config.SOPDS_SCAN_VERIFY_ARCHIVES,
+        )
+        self.parsing[(name, rel_path)] = (future, cat, archive, file_size)
+        # Ограничиваем число книг, ожидающих обработки, чтобы не расходовать память
+        while len(self.parsing) > self.workers * 4:
+            self.complete_parsing(1)
+
+    def complete_parsing(self, count: int | None = None) -> None:
+        """Запись в БД метаданных книг, обработанных пулом процессов.
+
+        Книги обрабатываются в порядке передачи в пул.
+
+        Args:
+            count: число книг, которые нужно дождаться. Если не указано, то
+                ожидаются все переданные в пул книги.
+        """
+        count = len(self.parsing) if count is None else count
+        for _i in range(count):
+            (name, rel_path), (future, cat, archive, file_size) = next(
+                iter(self.parsing.items())
+            )
+            del self.parsing[(name, rel_path)]
+            try:
+                book_data = future.result()
+            except Exception as err:
+                self.logger.error(
+                    f"{rel_path} - {name} book parse error, skipping. Error was: {err}"
+                )
+                self.bad_books += 1
+            else:
+                self.store_book(name, rel_path, cat, archive, file_size, book_data)
+
+    def store_book(self, name, rel_path, cat, archive, file_size, book_data) -> None:
+        """Передача извлеченных метаданных книги в BookWriter"""
+        (n, e) = os.path.splitext(name)
+        # TODO: объект BookData должен сам выполнять валидацию своих полей при создании
+        lang = (
+            book_data.language_code.strip(strip_symbols)
+            if book_data.language_code
+            else ""
+        )
+        title = book_data.title.strip(strip_symbols) if book_data.title else n
+        annotation = book_data.description if book_data.description else ""
+        annotation = (
+            annotation.strip(strip_symbols)
+            if isinstance(annotation, str)
+            else annotation.decode("utf8").strip(strip_symbols)
+        )
+        docdate = book_data.docdate if book_data.docdate else ""
+
+        self.logger.info(f"Collect authors metadata for {name}")
+        authors = []
+        for a in book_data.authors:
+            author_name = a.get("name", _("Unknown author")).strip(strip_symbols)
+            # Если в имени автора нет запятой, то фамилию переносим из конца в начало
+            # FIXME: информация об авторе не должна трансформироваться
+            if author_name and author_name.find(",") < 0:
+                author_names = author_name.split()
+                author_name = " ".join(
+                    [
+                        author_names[-1],
+                        " ".join(author_names[:-1]),
+                    ]
+                )
+            self.logger.debug(f"Author: {author_name}")
+            authors.append(author_name)
+
+        genres = [genre.lower().strip(strip_symbols) for genre in book_data.tags]
+
+        # FIXME: series_info определяется только по наличию названия серии, номер в серии устанавливается в 0 если не указан
+        series = []
+        if book_data.series_info:
+            ser_no = book_data.series_info["index"] or "0"
+            ser_no = int(ser_no) if ser_no.isdigit() else 0
+            series.append((book_data.series_info["title"], ser_no))
+
+        self.logger.info(f"Store book '{name}' metainfo in database")
+        self.writer.add(
+            name,
+            rel_path,
+            cat,
+            e[1:],
+            title,
+            annotation,
+            docdate,
+            lang,
+            file_size,
+            archive,
+            authors=authors,
+            genres=genres,
+            series=series,
+        )
+        self.books_added += 1
+
+        if archive != 0:
+            self.books_in_archives += 1
+        self.logger.info(
+            f"Book {rel_path}/{name} metadata queued for writing to database."
+        )
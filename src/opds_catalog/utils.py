@@ -8,10 +8,16 @@ from django.conf import settings
 import logging
 import os
 from opds_catalog import opdsdb
+from opds_catalog.covers import CoverCache
+from opds_catalog.settings import ZIP_CACHE_SIZE
+from opds_catalog.zipstream import ZipStream, can_copy
 from opds_catalog.models import Book
 from opds_catalog import utils
 from constance import config
+from collections import OrderedDict
 from io import BytesIO
+import threading
+from typing import BinaryIO
 import chardet
 import zipfile
 from zipfile import ZipInfo
@@ -130,36 +136,33 @@ def decode_string(string: str) -> str:
     return string.encode("cp437").decode(encoding)
 
 
-def read_from_zipped_file(zip_path: str, filename: str) -> BytesIO | None:
-    """Читает содержимое файла filename из zip файла в файловой системе"""
-    logger.info(f"Reading content of file {filename} from ZIP {zip_path}")
+def open_zipped_file(zip_path: str, filename: str) -> tuple[BinaryIO, int] | None:
+    """Открывает файл filename из zip файла для чтения потоком
+
+    Returns:
+        tuple[BinaryIO, int]|None: поток распакованного содержимого файла и его
+            размер. Поток держит архив открытым до своего закрытия.
+    """
+    logger.info(f"Opening file {filename} from ZIP {zip_path}")
     if not os.path.isfile(zip_path):
         logger.error(f"File {zip_path} not found!")
         return None
 
-    try:
-        with open(zip_path, "rb") as zip:
-            with zipfile.ZipFile(zip, "r", allowZip64=True) as zc:
-                # issue 2 - если в архиве имя файла в некорректной кодировке,
-                # то такой файл не получается извлечь из архива.
-                candidate = get_infolist_filename(zc.infolist(), filename)
-                if candidate is None:
-                    logger.error(
-                        f"Cannot find file {filename} in ZIP archive {zip_path}"
-                    )
-                    return None
-
-                with zc.open(candidate, "r") as book:
-                    content = BytesIO(book.read())
-                    content.seek(0)
-                    logger.debug(
-                        f"Readed {len(content.getvalue())} bytes from {zip_path}"
-                    )
-                    return content
-    except KeyError as e:
-        logger.error(f"Can not read file {filename} from ZIP archive {zip_path}: {e}")
+    return zip_cache.open(zip_path, filename)
+
+
+def read_from_zipped_file(zip_path: str, filename: str) -> BytesIO | None:
+    """Читает содержимое файла filename из zip файла в файловой системе"""
+    logger.info(f"Reading content of file {filename} from ZIP {zip_path}")
+    opened = open_zipped_file(zip_path, filename)
+    if opened is None:
         return None
 
+    with opened[0] as book:
+        content = BytesIO(book.read())
+    logger.debug(f"Readed {len(content.getvalue())} bytes from {zip_path}")
+    return content
+
 
 def getFileData(book: Book) -> BytesIO | None:
     """Поиск и считывание файла книги из ФС"""
@@ -176,14 +179,80 @@ def getFileData(book: Book) -> BytesIO | None:
         return read_from_zipped_file(full_path, book.filename)
 
 
+def open_book_file(book: Book) -> tuple[BinaryIO, int] | None:
+    """Открывает файл книги для чтения потоком без загрузки в память
+
+    Returns:
+        tuple[BinaryIO, int]|None: поток с содержимым книги и его размер или
+            None, если файл книги не найден
+    """
+    full_path = get_fs_book_path(book)
+    if book.cat_type == opdsdb.CAT_NORMAL:
+        file_path = os.path.join(full_path, book.filename)
+        logger.info(f"Opening file {file_path} as regular file")
+        if not os.path.isfile(file_path):
+            logger.error(f"File {file_path} is not a regular file!")
+            return None
+        stream = open(file_path, "rb")
+        return stream, os.fstat(stream.fileno()).st_size
+
+    elif book.cat_type in [opdsdb.CAT_ZIP, opdsdb.CAT_INP]:
+        return open_zipped_file(full_path, book.filename)
+
+
+_cover_cache: CoverCache | None = None
+
+
+def get_cover_cache() -> CoverCache | None:
+    """Кэш обложек процесса или None, если кэш отключен в настройках"""
+    global _cover_cache
+    max_size = config.SOPDS_COVER_CACHE_SIZE * 1024 * 1024
+    if max_size <= 0:
+        return None
+    root = config.SOPDS_COVER_CACHE_DIR
+    if (
+        _cover_cache is None
+        or _cover_cache.root != root
+        or _cover_cache.max_size != max_size
+    ):
+        _cover_cache = CoverCache(root, max_size)
+    return _cover_cache
+
+
+def open_book_zip(book: Book, arcname: str) -> ZipStream | None:
+    """Zip архив с файлом книги, формируемый по мере чтения
+
+    Если книга сжата методом deflate в архиве библиотеки, ее сжатое содержимое
+    копируется без перепаковки.
+
+    Returns:
+        ZipStream|None: архив или None, если файл книги не найден
+    """
+    if book.cat_type in [opdsdb.CAT_ZIP, opdsdb.CAT_INP]:
+        zip_path = get_fs_book_path(book)
+        if not os.path.isfile(zip_path):
+            logger.error(f"File {zip_path} not found!")
+            return None
+        info = zip_cache.find(zip_path, book.filename)
+        if info is None:
+            return None
+        if can_copy(info):
+            return ZipStream(arcname, open(zip_path, "rb"), info)
+
+    opened = open_book_file(book)
+    if opened is None:
+        return None
+    return ZipStream(arcname, opened[0])
+
+
 def getFileDataZip(book: Book) -> BytesIO:
     """Читает файл из ФС и упаковывает его в zip"""
     transname = getFileName(book)
-    fo = getFileData(book)
     dio = BytesIO()
-    if fo is not None:
-        with zipfile.ZipFile(dio, "w", zipfile.ZIP_DEFLATED) as zo:
-            zo.writestr(transname, fo.read())
+    zstream = open_book_zip(book, transname)
+    if zstream is not None:
+        for chunk in zstream:
+            dio.write(chunk)
         dio.seek(0)
     return dio
 
@@ -253,6 +322,108 @@ def getFileDataMobi(book):
     return getFileDataConv(book, "mobi")
 
 
+class ZipNameIndex:
+    """Индекс имен файлов ZIP архива для многократного поиска в нем.
+
+    Работает так же, как get_infolist_filename, но список имен строится один
+    раз, а определение кодировки выполняется только при первом поиске имени,
+    отсутствующего в архиве в исходном виде, и только для имен с не-ASCII
+    символами.
+    """
+
+    def __init__(self, infolist: list[ZipInfo]):
+        self.fnames = [x.filename for x in infolist]
+        self.names = set(self.fnames)
+        self.decoded: dict[str, str] | None = None
+
+    def find(self, filename: str) -> str | None:
+        """Поиск имени файла, см. get_infolist_filename"""
+        if filename in self.names:
+            return filename
+
+        if self.decoded is None:
+            self.decoded = {}
+            for candidate in self.fnames:
+                if not candidate.isascii():
+                    self.decoded.setdefault(decode_string(candidate), candidate)
+        return self.decoded.get(filename)
+
+
+class CachedZip:
+    """Открытый zip архив библиотеки с индексом имен файлов"""
+
+    def __init__(self, zip_path: str, signature: tuple[int, int]):
+        self.signature = signature
+        self.zipfile = zipfile.ZipFile(zip_path, "r", allowZip64=True)
+        self.index = ZipNameIndex(self.zipfile.infolist())
+
+    def find(self, filename: str) -> ZipInfo | None:
+        name = self.index.find(filename)
+        return None if name is None else self.zipfile.getinfo(name)
+
+
+class ZipCache:
+    """LRU кэш открытых zip архивов библиотеки.
+
+    Центральный каталог архива разбирается только при первом обращении к нему,
+    после чего поиск книги в архиве выполняется по индексу имен. Запись кэша
+    заменяется, если изменились время изменения или размер файла архива.
+
+    ZipFile допускает одновременное чтение разных файлов архива, поэтому
+    открытые архивы используются всеми потоками процесса.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.archives: OrderedDict[str, CachedZip] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _get(self, zip_path: str) -> CachedZip:
+        """Открытый архив из кэша (вызывается при захваченной блокировке)"""
+        stat = os.stat(zip_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        archive = self.archives.pop(zip_path, None)
+        if archive is not None and archive.signature != signature:
+            logger.info(f"ZIP archive {zip_path} has been changed")
+            archive.zipfile.close()
+            archive = None
+        if archive is None:
+            archive = CachedZip(zip_path, signature)
+        self.archives[zip_path] = archive
+        while len(self.archives) > self.max_size:
+            _path, evicted = self.archives.popitem(last=False)
+            # Уже открытые файлы архива остаются доступными для чтения
+            evicted.zipfile.close()
+        return archive
+
+    def find(self, zip_path: str, filename: str) -> ZipInfo | None:
+        """Описание файла filename в архиве или None, если файла нет в архиве"""
+        with self.lock:
+            info = self._get(zip_path).find(filename)
+        if info is None:
+            logger.error(f"Cannot find file {filename} in ZIP archive {zip_path}")
+        return info
+
+    def open(self, zip_path: str, filename: str) -> tuple[BinaryIO, int] | None:
+        """Открывает файл filename из архива, см. open_zipped_file"""
+        with self.lock:
+            archive = self._get(zip_path)
+            info = archive.find(filename)
+            if info is not None:
+                return archive.zipfile.open(info, "r"), info.file_size
+        logger.error(f"Cannot find file {filename} in ZIP archive {zip_path}")
+        return None
+
+    def clear(self) -> None:
+        with self.lock:
+            for archive in self.archives.values():
+                archive.zipfile.close()
+            self.archives.clear()
+
+
+zip_cache = ZipCache(ZIP_CACHE_SIZE)
+
+
 def get_infolist_filename(infolist: list[ZipInfo], filename: str) -> str | None:
     """Поиск имени файла в ZIP архиве.
 
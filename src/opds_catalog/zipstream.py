@@ -0,0 +1,224 @@
+"""Формирование zip архива с одним файлом по мере передачи ответа.
+
+Архив не собирается в памяти: локальный заголовок, сжатые блоки, дескриптор
+данных и центральный каталог выдаются итератором ZipStream. Если книга уже
+сжата методом deflate в архиве библиотеки, ее сжатое содержимое копируется без
+перепаковки.
+
+Модуль не использует Django.
+"""
+
+import os
+import struct
+import time
+import zlib
+from collections.abc import Iterator
+from typing import BinaryIO
+from zipfile import ZIP_DEFLATED, BadZipFile, LargeZipFile, ZipInfo
+
+LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+LOCAL_HEADER_SIGNATURE = b"PK\003\004"
+DATA_DESCRIPTOR = struct.Struct("<4s3L")
+DATA_DESCRIPTOR_SIGNATURE = b"PK\007\010"
+CENTRAL_DIRECTORY = struct.Struct("<4s4B4HL2L5H2L")
+CENTRAL_DIRECTORY_SIGNATURE = b"PK\001\002"
+END_RECORD = struct.Struct("<4s4H2LH")
+END_RECORD_SIGNATURE = b"PK\005\006"
+
+# Версия формата zip, необходимая для распаковки (deflate)
+ZIP_VERSION = 20
+ZIP_SYSTEM_UNIX = 3
+# Атрибуты файла в архиве: обычный файл с правами 0644
+EXTERNAL_ATTR = 0o100644 << 16
+
+FLAG_ENCRYPTED = 0x01
+# Биты 1 и 2 - параметры сжатия deflate, копируются из исходного архива
+FLAG_DEFLATE_OPTIONS = 0x06
+# CRC и размеры записаны в дескрипторе данных после сжатого содержимого
+FLAG_DATA_DESCRIPTOR = 0x08
+FLAG_UTF8 = 0x800
+
+# Без расширений ZIP64 размеры ограничены 4 ГБ
+MAX_SIZE = 0xFFFFFFFF
+
+CHUNK_SIZE = 64 * 1024
+
+
+def dos_datetime(date_time: tuple) -> tuple[int, int]:
+    """Время и дата в формате MS-DOS, используемом в zip архивах"""
+    if date_time[0] < 1980:
+        date_time = (1980, 1, 1, 0, 0, 0)
+    year, month, day, hour, minute, second = date_time[:6]
+    return (
+        (hour << 11) | (minute << 5) | (second // 2),
+        ((year - 1980) << 9) | (month << 5) | day,
+    )
+
+
+def can_copy(info: ZipInfo) -> bool:
+    """Можно ли скопировать сжатое содержимое файла архива без перепаковки"""
+    return info.compress_type == ZIP_DEFLATED and not info.flag_bits & FLAG_ENCRYPTED
+
+
+class ZipStream:
+    """Zip архив с одним файлом, выдаваемый блоками при итерации.
+
+    Источник закрывается после выдачи архива или вызовом close(), поэтому объект
+    можно передавать в StreamingHttpResponse.
+    """
+
+    def __init__(
+        self,
+        arcname: str,
+        source: BinaryIO,
+        info: ZipInfo | None = None,
+        level: int = zlib.Z_DEFAULT_COMPRESSION,
+        chunk_size: int = CHUNK_SIZE,
+    ):
+        """
+        Args:
+            arcname: имя файла в архиве
+            source: поток с содержимым файла или, если указан info, файл
+                архива, содержащий сжатый файл
+            info: описание сжатого файла в архиве source, содержимое которого
+                копируется без перепаковки (см. can_copy)
+            level: степень сжатия содержимого source
+            chunk_size: размер блока чтения source
+        """
+        self.name = arcname.encode("utf-8")
+        self.flags = 0 if arcname.isascii() else FLAG_UTF8
+        self.source = source
+        self.info = info
+        self.level = level
+        self.chunk_size = chunk_size
+        self.time, self.date = dos_datetime(
+            info.date_time if info is not None else time.localtime()
+        )
+
+    @property
+    def size(self) -> int | None:
+        """Размер архива, если он известен до формирования (при копировании)"""
+        if self.info is None:
+            return None
+        return (
+            LOCAL_HEADER.size
+            + CENTRAL_DIRECTORY.size
+            + END_RECORD.size
+            + 2 * len(self.name)
+            + self.info.compress_size
+        )
+
+    def __iter__(self) -> Iterator[bytes]:
+        with self.source:
+            if self.info is None:
+                yield from self._deflate()
+            else:
+                yield from self._copy()
+
+    def close(self) -> None:
+        self.source.close()
+
+    def _copy(self) -> Iterator[bytes]:
+        info = self.info
+        if max(info.compress_size, info.file_size, info.header_offset) > MAX_SIZE:
+            raise LargeZipFile(f"{info.filename} requires ZIP64 extensions")
+        self.source.seek(info.header_offset)
+        header = LOCAL_HEADER.unpack(self.source.read(LOCAL_HEADER.size))
+        if header[0] != LOCAL_HEADER_SIGNATURE:
+            raise BadZipFile("Bad magic number for file header")
+        # Пропускаем имя файла и дополнительные поля исходного архива
+        self.source.seek(header[-2] + header[-1], os.SEEK_CUR)
+
+        flags = self.flags | (info.flag_bits & FLAG_DEFLATE_OPTIONS)
+        yield self._local_header(flags, info.CRC, info.compress_size, info.file_size)
+        remaining = info.compress_size
+        while remaining:
+            chunk = self.source.read(min(self.chunk_size, remaining))
+            if not chunk:
+                raise BadZipFile(f"Truncated file {info.filename}")
+            remaining -= len(chunk)
+            yield chunk
+        yield self._central_directory(
+            flags, info.CRC, info.compress_size, info.file_size
+        )
+
+    def _deflate(self) -> Iterator[bytes]:
+        flags = self.flags | FLAG_DATA_DESCRIPTOR
+        yield self._local_header(flags, 0, 0, 0)
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        crc = compress_size = file_size = 0
+        while chunk := self.source.read(self.chunk_size):
+            crc = zlib.crc32(chunk, crc)
+            file_size += len(chunk)
+            data = compressor.compress(chunk)
+            if data:
+                compress_size += len(data)
+                yield data
+        data = compressor.flush()
+        compress_size += len(data)
+        yield data
+
+        if max(compress_size, file_size) > MAX_SIZE:
+            raise LargeZipFile("File size requires ZIP64 extensions")
+        yield DATA_DESCRIPTOR.pack(
+            DATA_DESCRIPTOR_SIGNATURE, crc, compress_size, file_size
+        )
+        yield self._central_directory(
+            flags, crc, compress_size, file_size, DATA_DESCRIPTOR.size
+        )
+
+    def _local_header(
+        self, flags: int, crc: int, compress_size: int, file_size: int
+    ) -> bytes:
+        header = LOCAL_HEADER.pack(
+            LOCAL_HEADER_SIGNATURE,
+            ZIP_VERSION,
+            0,
+            flags,
+            ZIP_DEFLATED,
+            self.time,
+            self.date,
+            crc,
+            compress_size,
+            file_size,
+            len(self.name),
+            0,
+        )
+        return header + self.name
+
+    def _central_directory(
+        self,
+        flags: int,
+        crc: int,
+        compress_size: int,
+        file_size: int,
+        descriptor_size: int = 0,
+    ) -> bytes:
+        """Центральный каталог и запись конца архива"""
+        entry = (
+            CENTRAL_DIRECTORY.pack(
+                CENTRAL_DIRECTORY_SIGNATURE,
+                ZIP_VERSION,
+                ZIP_SYSTEM_UNIX,
+                ZIP_VERSION,
+                0,
+                flags,
+                ZIP_DEFLATED,
+                self.time,
+                self.date,
+                crc,
+                compress_size,
+                file_size,
+                len(self.name),
+                0,
+                0,
+                0,
+                0,
+                EXTERNAL_ATTR,
+                0,
+            )
+            + self.name
+        )
+        offset = LOCAL_HEADER.size + len(self.name) + compress_size + descriptor_size
+        end = END_RECORD.pack(END_RECORD_SIGNATURE, 0, 0, 1, 1, len(entry), offset, 0)
+        return entry + end
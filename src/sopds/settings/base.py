@@ -318,6 +318,29 @@ CONSTANCE_CONFIG = OrderedDict(
             ),
         ),
         ("SOPDS_DELETE_LOGICAL", (False, _("Logical deleting unavialable files"))),
+        (
+            "SOPDS_SCAN_BATCH_SIZE",
+            (500, _("Number of books written to database by one batch while scanning")),
+        ),
+        (
+            "SOPDS_SCAN_CHUNK_SIZE",
+            (5000, _("Number of books committed to database by one scan transaction")),
+        ),
+        (
+            "SOPDS_SCAN_SKIP_UNCHANGED",
+            (
+                True,
+                _("Skip directories and ZIP archives unchanged since previous scan"),
+            ),
+        ),
+        (
+            "SOPDS_SCAN_EXTRACT_COVERS",
+            (False, _("Extract covers of new books to cover cache while scanning")),
+        ),
+        (
+            "SOPDS_SCAN_VERIFY_ARCHIVES",
+            (False, _("Verify checksums of EPUB and FB2+ZIP books while scanning")),
+        ),
         (
             "SOPDS_SCAN_SHED_MIN",
             ("0", _("sheduled minutes for sopds_scanner (cron syntax)")),
@@ -336,6 +359,14 @@ CONSTANCE_CONFIG = OrderedDict(
         ),
         ("SOPDS_FB2TOEPUB", ("", _("Path to FB2-EPUB converter program"))),
         ("SOPDS_FB2TOMOBI", ("", _("Path to FB2-MOBI converter program"))),
+        (
+            "SOPDS_COVER_CACHE_DIR",
+            (os.path.join(BASE_DIR, "tmp", "covers"), _("Cover cache directory")),
+        ),
+        (
+            "SOPDS_COVER_CACHE_SIZE",
+            (256, _("Cover cache size in MB (0 - cache is disabled)")),
+        ),
         (
             "SOPDS_TEMP_DIR",
             (os.path.join(BASE_DIR, "tmp"), _("Path to temporary files directory")),
@@ -398,6 +429,8 @@ CONSTANCE_CONFIG_FIELDSETS = {
         "SOPDS_ALPHABET_MENU",
         "SOPDS_DOUBLES_HIDE",
         "SOPDS_COVER_SHOW",
+        "SOPDS_COVER_CACHE_DIR",
+        "SOPDS_COVER_CACHE_SIZE",
         "SOPDS_SPLITITEMS",
         "SOPDS_MAXITEMS",
         "SOPDS_TITLE_AS_FILENAME",
@@ -412,6 +445,11 @@ CONSTANCE_CONFIG_FIELDSETS = {
         "SOPDS_INPX_TEST_ZIP",
         "SOPDS_INPX_TEST_FILES",
         "SOPDS_DELETE_LOGICAL",
+        "SOPDS_SCAN_BATCH_SIZE",
+        "SOPDS_SCAN_CHUNK_SIZE",
+        "SOPDS_SCAN_SKIP_UNCHANGED",
+        "SOPDS_SCAN_VERIFY_ARCHIVES",
+        "SOPDS_SCAN_EXTRACT_COVERS",
     ),
     "4. Scanner Shedule": (
         "SOPDS_SCAN_SHED_MIN",
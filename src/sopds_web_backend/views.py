@@ -1,6 +1,6 @@
 from django.shortcuts import render, redirect
 from django.template.context_processors import csrf
-from django.db.models import Count, Min, Prefetch
+from django.db.models import Count, Min
 from django.utils.translation import gettext as _
 from django.contrib.auth import authenticate, login, logout, REDIRECT_FIELD_NAME
 from django.contrib.auth.decorators import user_passes_test
@@ -20,6 +20,15 @@ from opds_catalog.models import (
 
 from constance import config
 from opds_catalog.opds_paginator import Paginator as OPDS_Paginator
+from opds_catalog.services.book_services import (
+    KEYSET_ORDER,
+    book_page,
+    book_relations,
+    displayed_count,
+    find_book_doubles,
+    page_without_count,
+)
+from opds_catalog.services.bookshelf_services import get_readtimes
 from opds_catalog.utils import get_lang_name
 
 from sopds_web_backend.settings import HALF_PAGES_LINKS
@@ -36,6 +45,14 @@ def sopds_login(function=None, redirect_field_name=REDIRECT_FIELD_NAME, url=None
     return actual_decorator
 
 
+def page_cursor(value: str | None) -> int | None:
+    """Ключ выборки страницы книг (id книги, см. book_page) из запроса"""
+    try:
+        return int(value) or None
+    except (TypeError, ValueError):
+        return None
+
+
 # Create your views here.
 @vary_on_headers("HTTP_ACCEPT_LANGUAGE")
 @sopds_login(url="web:login")
@@ -143,12 +160,7 @@ def SearchBooksView(request):
             # try:
             book_id = int(searchterms)
             mbook = Book.objects.get(id=book_id)
-            books = (
-                Book.objects.filter(title=mbook.title, authors__in=mbook.authors.all())
-                .exclude(id=book_id)
-                .distinct()
-                .order_by("-docdate")
-            )
+            books = find_book_doubles(book_id).order_by("-docdate")
             args["breadcrumbs"] = [_("Books"), _("Doubles for book"), mbook.title]
             args["searchobject"] = "title"
 
@@ -176,33 +188,26 @@ def SearchBooksView(request):
         # print(books.query)
 
         # Фильтруем дубликаты и формируем выдачу затребованной страницы
-        books = books.prefetch_related(
-            Prefetch("authors", to_attr="c_authors"),
-            Prefetch("series", to_attr="c_series"),
-            Prefetch("genres", to_attr="c_genres"),
-        )
-        books_count = books.count()
-        op = OPDS_Paginator(
-            books_count, 0, page_num, config.SOPDS_MAXITEMS, HALF_PAGES_LINKS
-        )
-        items = []
-
-        prev_title = ""
-        prev_authors_set = set()
-
-        # Начаинам анализ с последнего элемента на предидущей странице, чторбы он "вытянул" с этой страницы
-        # свои дубликаты если они есть
         summary_DOUBLES_HIDE = config.SOPDS_DOUBLES_HIDE and (searchtype != "d")
-        start = (
-            op.d1_first_pos
-            if ((op.d1_first_pos == 0) or (not summary_DOUBLES_HIDE))
-            else op.d1_first_pos - 1
+        rows, op = book_page(
+            books,
+            page_num,
+            summary_DOUBLES_HIDE,
+            page_cursor(request.GET.get("after")),
+            page_cursor(request.GET.get("before")),
+            HALF_PAGES_LINKS,
+            count=True,
+            # Книжная полка своя у каждого пользователя
+            cache_count=searchtype != "u",
         )
-        finish = op.d1_last_pos
+        items = []
 
-        for row in books[start : finish + 1]:
+        book_ids = [row.id for row in rows]
+        relations = book_relations(book_ids)
+        readtimes = get_readtimes(request.user, book_ids) if SOPDS_AUTH else None
+        for row in rows:
             p = {
-                "doubles": 0,
+                "doubles": row.double_count - 1 if summary_DOUBLES_HIDE else 0,
                 "lang_code": row.lang_code,
                 "filename": row.filename,
                 "path": row.path,
@@ -214,48 +219,10 @@ def SearchBooksView(request):
                 "title": row.title,
                 "lang": get_lang_name(row.lang),
                 "filesize": row.filesize,
-                "authors": row.c_authors,
-                "genres": row.c_genres,
-                "series": row.c_series,
-                "ser_no": row.bseries_set.values("ser_no"),
-                #'readtime':row.bookshelf_set.filter(user=request.user).values('readtime') if config.SOPDS_AUTH else None
-                "readtime": row.bookshelf_set.filter(user=request.user).values(
-                    "readtime"
-                )
-                if SOPDS_AUTH
-                else None,
+                **relations[row.id],
+                "readtime": readtimes[row.id] if SOPDS_AUTH else None,
             }
-            if summary_DOUBLES_HIDE:
-                title: str = p["title"]
-                authors_set = {a.id for a in p["authors"]}
-                if (
-                    title.upper() == prev_title.upper()
-                    and authors_set == prev_authors_set
-                ):
-                    items[-1]["doubles"] += 1
-                else:
-                    items.append(p)
-                prev_title = title
-                prev_authors_set = authors_set
-            else:
-                items.append(p)
-
-        # "вытягиваем" дубликаты книг со следующей страницы и удаляем первый элемент который с предыдущей страницы и "вытягивал" дубликаты с текущей
-        if summary_DOUBLES_HIDE:
-            double_flag = True
-            while ((finish + 1) < books_count) and double_flag:
-                finish += 1
-                if (
-                    books[finish].title.upper() == prev_title.upper()
-                    and {a["id"] for a in books[finish].authors.values()}
-                    == prev_authors_set
-                ):
-                    items[-1]["doubles"] += 1
-                else:
-                    double_flag = False
-
-            if op.d1_first_pos != 0:
-                items.pop(0)
+            items.append(p)
 
         args["paginator"] = op.get_data_dict()
         args["searchterms"] = searchterms
@@ -300,12 +267,13 @@ def SearchSeriesView(request):
         )
 
         # Создаем результирующее множество
-        series_count = series.count()
-        op = OPDS_Paginator(
-            series_count, 0, page_num, config.SOPDS_MAXITEMS, HALF_PAGES_LINKS
-        )
+        maxitems = config.SOPDS_MAXITEMS
+        first = maxitems * (page_num - 1)
+        rows, series_count = page_without_count(series, first, maxitems)
+        series_count = displayed_count(series, series_count, first + maxitems)
+        op = OPDS_Paginator(series_count, 0, page_num, maxitems, HALF_PAGES_LINKS)
         items = []
-        for row in series[op.d1_first_pos : op.d1_last_pos + 1]:
+        for row in rows:
             # p = {'id':row.id, 'ser':row.ser, 'lang_code': row.lang_code, 'book_count': Book.objects.filter(series=row).count()}
             p = {
                 "id": row.id,
@@ -356,13 +324,14 @@ def SearchAuthorsView(request):
             ).order_by("search_full_name")
 
         # Создаем результирующее множество
-        authors_count = authors.count()
-        op = OPDS_Paginator(
-            authors_count, 0, page_num, config.SOPDS_MAXITEMS, HALF_PAGES_LINKS
-        )
+        maxitems = config.SOPDS_MAXITEMS
+        first = maxitems * (page_num - 1)
+        rows, authors_count = page_without_count(authors, first, maxitems)
+        authors_count = displayed_count(authors, authors_count, first + maxitems)
+        op = OPDS_Paginator(authors_count, 0, page_num, maxitems, HALF_PAGES_LINKS)
         items = []
 
-        for row in authors[op.d1_first_pos : op.d1_last_pos + 1]:
+        for row in rows:
             p = {
                 "id": row.id,
                 "full_name": row.full_name,
@@ -406,14 +375,21 @@ def CatalogsView(request):
 
     catalogs_list = Catalog.objects.filter(parent=cat).order_by("cat_name")
     catalogs_count = catalogs_list.count()
-    # prefetch_related on sqlite on items >999 therow error "too many SQL variables"
-    # books_list = Book.objects.filter(catalog=cat).prefetch_related('authors','genres','series').order_by("title")
-    books_list = Book.objects.filter(catalog=cat).order_by("search_title")
-    books_count = books_list.count()
+    # Связи книг страницы загружаются в book_relations: prefetch_related
+    # на sqlite при числе книг >999 выдает ошибку "too many SQL variables"
+    books_list = Book.objects.filter(catalog=cat).order_by(*KEYSET_ORDER)
+
+    # Книги следуют в списке после подкаталогов. Книги страницы выбираются
+    # всегда, а число книг нужно только для номеров страниц
+    maxitems = config.SOPDS_MAXITEMS
+    first = max(maxitems * (page_num - 1) - catalogs_count, 0)
+    size = max(maxitems * page_num - catalogs_count, 0) - first
+    rows, books_count = page_without_count(books_list, first, size)
+    books_count = displayed_count(books_list, books_count, first + size)
 
     # Получаем результирующий список
     op = OPDS_Paginator(
-        catalogs_count, books_count, page_num, config.SOPDS_MAXITEMS, HALF_PAGES_LINKS
+        catalogs_count, books_count, page_num, maxitems, HALF_PAGES_LINKS
     )
     items = []
 
@@ -427,7 +403,10 @@ def CatalogsView(request):
         }
         items.append(p)
 
-    for row in books_list[op.d2_first_pos : op.d2_last_pos + 1]:
+    book_ids = [row.id for row in rows]
+    relations = book_relations(book_ids)
+    readtimes = get_readtimes(request.user, book_ids) if config.SOPDS_AUTH else None
+    for row in rows:
         p = {
             "is_catalog": 0,
             "lang_code": row.lang_code,
@@ -441,14 +420,8 @@ def CatalogsView(request):
             "title": row.title,
             "lang": row.lang,
             "filesize": row.filesize,
-            "authors": row.authors.values(),
-            "genres": row.genres.values(),
-            "series": row.series.values(),
-            "ser_no": row.bseries_set.values("ser_no"),
-            #'readtime': row.bookshelf_set.filter(user=request.user).values('readtime') if config.SOPDS_AUTH else None
-            "readtime": row.bookshelf_set.filter(user=request.user).values("readtime")
-            if config.SOPDS_AUTH
-            else None,
+            **relations[row.id],
+            "readtime": readtimes[row.id] if config.SOPDS_AUTH else None,
         }
         items.append(p)
 
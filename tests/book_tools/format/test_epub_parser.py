@@ -3,6 +3,8 @@ from book_tools.format.parsers import EbookMetaParser, EpubParser
 # from tests.conftest import epub_book_from_fs
 import pytest
 import os
+import zipfile
+from io import BytesIO
 
 from book_tools.format.epub import EPub, EPub_new
 from tests.opds_catalog.helpers import read_file_as_iobytes
@@ -21,6 +23,21 @@ def test_epub_parser(test_rootlib, book) -> None:
     assert book_actual == book_new
 
 
+def test_epub_verify(test_rootlib) -> None:
+    """Контрольные суммы архива проверяются только в режиме verify"""
+    source = read_file_as_iobytes(os.path.join(test_rootlib, "mirer.epub"))
+    damaged = BytesIO()
+    with zipfile.ZipFile(source) as src, zipfile.ZipFile(damaged, "w") as dst:
+        for info in src.infolist():
+            dst.writestr(info, src.read(info))
+        dst.writestr("extra.bin", b"a" * 100, compress_type=zipfile.ZIP_STORED)
+    damaged = BytesIO(damaged.getvalue().replace(b"a" * 100, b"b" + b"a" * 99))
+
+    assert EPub(damaged, "Test Book").title == EPub(source, "Test Book").title
+    with pytest.raises(EPub.StructureException):
+        EPub(damaged, "Test Book", verify=True)
+
+
 @pytest.fixture(scope="module")
 def parsed_epub(epub_parser) -> EbookMetaParser:
     epub_parser.parse()
@@ -83,6 +83,14 @@ def test_fb2_new_parser(virtual_fb2_book) -> None:
     assert _are_equals_data(book_actual, book_new)
 
 
+def test_fb2_header_only_parser(fb2_book_from_fs) -> None:
+    """Разбор только заголовка книги дает те же метаданные, что и полный разбор"""
+    book_actual = FB2(fb2_book_from_fs, "Test Book")
+    book_header = FB2_new(fb2_book_from_fs, header_only=True)
+    assert _are_equals_data(book_actual, book_header)
+    assert book_header.extract_cover() is None
+
+
 def _are_equals_data(bookfile: BookFile, parser: EbookMetaParser) -> bool:
     # Парсер возвращает перечень авторов в виде списка кортежей, а в описателе
     # книги список авторов хранится в словаре, поэтому делаем преобразование
@@ -121,6 +129,11 @@ def test_benchmark_fb2_new_parser(benchmark, virtual_fb2_book):
     benchmark(FB2_new, virtual_fb2_book)
 
 
+@pytest.mark.benchmark
+def test_benchmark_fb2_header_only_parser(benchmark, virtual_fb2_book):
+    benchmark(FB2_new, virtual_fb2_book, True)
+
+
 @pytest.mark.benchmark
 def test_benchmark_fb2_parser(benchmark, virtual_fb2_book):
     benchmark(FB2, virtual_fb2_book, "benchmark")
@@ -1,7 +1,8 @@
 import pytest
 import os
 
-from book_tools.format.mobi import Mobipocket, Mobipocket_new
+from book_tools.format.mobi import MobiHeader, Mobipocket, Mobipocket_new
+from book_tools.pymobi.mobi import BookMobi
 
 from tests.opds_catalog.helpers import read_file_as_iobytes
 
@@ -17,3 +18,14 @@ def test_mobi_parser(test_rootlib, book) -> None:
     book_actual = Mobipocket(file, "Test Book")
     book_new = Mobipocket_new(file, "Test Book").parse_book_data(file, "Test Book")
     assert book_actual == book_new
+
+
+def test_mobi_header(test_rootlib) -> None:
+    """Метаданные и обложка читаются из заголовков так же, как pymobi"""
+    file = read_file_as_iobytes(os.path.join(test_rootlib, "robin_cook.mobi"))
+    header = MobiHeader(file)
+    assert header.title == "Vector"
+    assert header.authors == ["Robin Cook"]
+    assert header.asin == "c701874c-fb79-4d28-8fa4-fbcdb45fd7c1"
+    assert header.encryption == "no encryption"
+    assert header.read_cover() == BookMobi(file).unpackMobiCover()
@@ -10,6 +10,7 @@ from book_tools.services import (
     EPUBMimeValidator,
     MobiMimeValidator,
     detect_mime_service,
+    MAGIC_HEADER_SIZE,
 )
 
 from book_tools.format.fb2 import (
@@ -100,3 +101,45 @@ def test_mobi_mimevalidator(mobi_book_from_fs) -> None:
 def test_detect_mime_service(book, expected, request) -> None:
     actual = detect_mime_service(request.getfixturevalue(book), "test_book")
     assert actual == expected
+
+
+class CountingStream(BytesIO):
+    """Поток, подсчитывающий количество прочитанных байт"""
+
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def test_detect_mime_service_reads_prefix() -> None:
+    """Для определения типа большого файла не нужно читать его целиком"""
+    book = CountingStream(b"%PDF-1.4\n" + b"\0" * 4 * 1024 * 1024)
+    assert detect_mime_service(book, "test_book.pdf") == Mimetype.PDF
+    assert book.bytes_read <= MAGIC_HEADER_SIZE
+    assert book.tell() == 0
+
+
+def test_mobi_mimevalidator_reads_prefix(mobi_book_from_fs) -> None:
+    book = CountingStream(mobi_book_from_fs.getvalue())
+    assert MobiMimeValidator().is_valid("test.mobi", book)
+    assert book.bytes_read == 8
+
+
+@pytest.mark.parametrize(
+    "header, fname, expected",
+    [
+        (b"\0" * 60 + b"BOOKMOBI", "test.pdb", Mimetype.MOBI),
+        (b"%PDF-1.7\n", "test.bin", Mimetype.PDF),
+        (b"AT&TFORM\0\0", "test.djvu", Mimetype.DJVU),
+        (b"<?xml version='1.0'?><html/>", "test.xml", Mimetype.XML),
+        (b"PK\x03\x04 not a zip", "test.zip", Mimetype.ZIP),
+        (b"Plain text", "test.txt", Mimetype.TEXT),
+    ],
+)
+def test_detect_mime_service_signatures(header, fname, expected) -> None:
+    assert detect_mime_service(BytesIO(header), fname) == expected
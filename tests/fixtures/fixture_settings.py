@@ -11,6 +11,14 @@ def fake_sopds_root_lib(override_config, test_rootlib):
         yield
 
 
+@pytest.fixture
+def cover_cache_dir(override_config, tmp_path) -> str:
+    """Параметр конфигурации 'Каталог кэша обложек' для тестов"""
+    cache_dir = str(tmp_path / "covers")
+    with override_config(SOPDS_COVER_CACHE_DIR=cache_dir):
+        yield cache_dir
+
+
 @pytest.fixture(scope="session")
 def test_rootlib() -> str:
     """Корневая директория библиотеки для тестов"""
@@ -0,0 +1,280 @@
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from opds_catalog import opdsdb
+from opds_catalog.models import Author, Book, Catalog, Series, bauthor, bseries
+from opds_catalog.services.book_services import (
+    book_page,
+    book_relations,
+    find_book_doubles,
+    paginated_book_content,
+)
+from opds_catalog.services.catalog_services import paginated_catalog_content
+from opds_catalog.services.counter_services import cached_count
+
+
+def expected_relations(book: Book) -> dict:
+    return {
+        "authors": list(book.authors.values()),
+        "genres": list(book.genres.values()),
+        "series": list(book.series.values()),
+        "ser_no": list(book.bseries_set.values("ser_no")),
+    }
+
+
+@pytest.mark.usefixtures("load_db_data")
+@pytest.mark.django_db
+def test_book_relations() -> None:
+    """Связи книг страницы совпадают с values() связанных моделей"""
+    series = Series.objects.create(ser="Series", search_ser="SERIES")
+    bseries.objects.create(book_id=6, ser=series, ser_no=3)
+
+    books = list(Book.objects.order_by("id"))
+    actual = book_relations(book.id for book in books)
+    assert actual == {book.id: expected_relations(book) for book in books}
+    assert actual[6]["ser_no"] == [{"ser_no": 3}]
+
+
+@pytest.mark.usefixtures("load_db_data")
+@pytest.mark.django_db
+@pytest.mark.override_config(SOPDS_DOUBLES_HIDE=False)
+def test_paginated_content_queries(override_config) -> None:
+    """Число запросов для страницы не зависит от числа книг на ней"""
+    catalog = Book.objects.get(id=6).catalog
+    book_queries, catalog_queries = [], []
+    for max_items in (1, 3):
+        with override_config(SOPDS_MAXITEMS=max_items):
+            with CaptureQueriesContext(connection) as queries:
+                items, _op = paginated_book_content(Book.objects.order_by("id"), 1)
+            assert len(items) == max_items
+            book_queries.append(len(queries))
+
+        with CaptureQueriesContext(connection) as queries:
+            items, _data = paginated_catalog_content(catalog, 1, max_items)
+        assert len(items) == max_items
+        catalog_queries.append(len(queries))
+
+    assert book_queries[0] == book_queries[1]
+    assert catalog_queries[0] == catalog_queries[1]
+
+
+def create_books(catalog: Catalog, titles_authors) -> list[Book]:
+    books = []
+    for i, (title, authors) in enumerate(titles_authors):
+        book = Book.objects.create(
+            filename=f"{i}.fb2",
+            title=title,
+            search_title=title.upper(),
+            docdate=f"2020-01-{10 + i}",
+            catalog=catalog,
+        )
+        for author in authors:
+            bauthor.objects.create(book=book, author=author)
+        books.append(book)
+    opdsdb.update_dup_keys()
+    return books
+
+
+@pytest.mark.django_db
+@pytest.mark.override_config(SOPDS_DOUBLES_HIDE=True)
+def test_paginated_content_doubles(override_config) -> None:
+    """Дубликаты (название и набор авторов) сворачиваются в одну книгу"""
+    catalog = Catalog.objects.create(cat_name="catalog", path=".")
+    a1, a2, a3, a5, a6, a7 = (
+        Author.objects.create(full_name=f"A{i}", search_full_name=f"A{i}")
+        for i in range(6)
+    )
+    books = create_books(
+        catalog,
+        [
+            ("Alpha", [a1, a2]),
+            ("alpha", [a2, a1]),
+            ("Alpha", [a1]),
+            ("Beta", []),
+            ("Beta", []),
+            ("Gamma", [a5, a6, a7]),
+            ("Gamma", [a1, a2, a3]),
+            ("Gamma", [a1, a2, a3]),
+        ],
+    )
+    query = Book.objects.order_by("search_title", "-docdate")
+
+    with override_config(SOPDS_MAXITEMS=2):
+        page1, op = paginated_book_content(query, 1)
+        assert op.has_next
+        page2, _op = paginated_book_content(query, 2)
+        page3, op = paginated_book_content(query, 3)
+        assert not op.has_next
+    actual = [(item["id"], item["doubles"]) for item in page1 + page2 + page3]
+    # Из группы остается последняя по дате книга
+    assert actual == [
+        (books[2].id, 0),
+        (books[1].id, 1),
+        (books[4].id, 1),
+        (books[7].id, 1),
+        (books[5].id, 0),
+    ]
+
+    items, _op = paginated_book_content(query, 1, search_doubles=True)
+    assert [item["doubles"] for item in items] == [0] * len(books)
+
+    # Книги без ключа дубликатов не сворачиваются
+    Book.objects.filter(id__in=[books[3].id, books[4].id]).update(dup_key="")
+    with override_config(SOPDS_MAXITEMS=10):
+        items, _op = paginated_book_content(query, 1)
+    assert len(items) == 6
+
+
+@pytest.mark.django_db
+def test_find_book_doubles() -> None:
+    catalog = Catalog.objects.create(cat_name="catalog", path=".")
+    a1, a2 = (
+        Author.objects.create(full_name=f"A{i}", search_full_name=f"A{i}")
+        for i in range(2)
+    )
+    books = create_books(
+        catalog,
+        [
+            ("Alpha  Book", [a1, a2]),
+            ("alpha book", [a2, a1]),
+            ("Alpha Book", [a1]),
+            ("Beta", [a1, a2]),
+        ],
+    )
+    assert list(find_book_doubles(books[0].id)) == [books[1]]
+    assert list(find_book_doubles(books[2].id)) == []
+
+    # Без ключа книги сравниваются по названию и общим авторам
+    Book.objects.filter(id=books[1].id).update(dup_key="", title="Alpha Book")
+    assert list(find_book_doubles(books[1].id)) == [books[2]]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("hide_doubles", [False, True])
+def test_keyset_pages(override_config, hide_doubles) -> None:
+    """Страницы, выбранные по ключу, совпадают со страницами по номеру"""
+    catalog = Catalog.objects.create(cat_name="catalog", path=".")
+    a1, a2 = (
+        Author.objects.create(full_name=f"A{i}", search_full_name=f"A{i}")
+        for i in range(2)
+    )
+    create_books(
+        catalog,
+        [
+            ("Alpha", [a1]),
+            ("Alpha", [a1]),
+            ("Alpha", [a2]),
+            ("Beta", [a1]),
+            ("Beta", [a1]),
+            ("Gamma", []),
+            ("Delta", [a2]),
+        ],
+    )
+    # Книги с одинаковыми названием и датой упорядочиваются по id
+    Book.objects.filter(search_title="ALPHA").update(docdate="2020-01-01")
+    query = Book.objects.order_by("search_title", "-docdate")
+
+    with override_config(SOPDS_DOUBLES_HIDE=hide_doubles, SOPDS_MAXITEMS=2):
+        pages = []
+        page_num = 1
+        while True:
+            items, op = paginated_book_content(query, page_num)
+            pages.append(items)
+            if not op.has_next:
+                break
+            page_num += 1
+
+        after = None
+        for page_num, expected in enumerate(pages, 1):
+            with CaptureQueriesContext(connection) as queries:
+                items, op = paginated_book_content(query, page_num, after=after)
+            assert items == expected
+            assert not any("OFFSET" in q["sql"] for q in queries.captured_queries)
+            after = op.next_cursor
+        assert after is None
+
+        before = op.previous_cursor
+        for page_num in range(len(pages) - 1, 0, -1):
+            items, op = paginated_book_content(query, page_num, before=before)
+            assert items == pages[page_num - 1]
+            before = op.previous_cursor
+        assert before is None
+
+        # Если книги ключа нет, страница выбирается по номеру
+        items, op = paginated_book_content(query, 2, after=0)
+        assert items == pages[1]
+        items, op = paginated_book_content(query, 2, after=100000)
+        assert items == pages[1]
+
+
+@pytest.mark.usefixtures("load_db_data")
+@pytest.mark.django_db
+@pytest.mark.parametrize("hide_doubles", [False, True])
+def test_pages_without_count(override_config, hide_doubles) -> None:
+    """Наличие следующей страницы определяется без COUNT(*)"""
+    catalog = Book.objects.get(id=6).catalog
+    with override_config(SOPDS_DOUBLES_HIDE=hide_doubles, SOPDS_MAXITEMS=2):
+        with CaptureQueriesContext(connection) as queries:
+            items, op = paginated_book_content(Book.objects.order_by("id"), 1)
+            assert [item["id"] for item in items] == [5, 6]
+            assert op.has_next
+            items, op = paginated_book_content(Book.objects.order_by("id"), 2)
+            assert [item["id"] for item in items] == [7, 8]
+            assert not op.has_next
+
+            items, data = paginated_catalog_content(catalog, 1, 2)
+            assert len(items) == 2
+            assert data["has_next"]
+            items, data = paginated_catalog_content(catalog, 2, 2)
+            assert len(items) == 1
+            assert not data["has_next"]
+    # Подсчитывается только число подкаталогов
+    counts = [q["sql"] for q in queries.captured_queries if "__count" in q["sql"]]
+    assert counts
+    assert not any('FROM "opds_catalog_book"' in sql for sql in counts)
+
+
+@pytest.mark.usefixtures("load_db_data")
+@pytest.mark.django_db
+@pytest.mark.override_config(SOPDS_CACHE_TIME=60)
+def test_cached_count(override_config) -> None:
+    cache.clear()
+    books = Book.objects.filter(catalog_id=4)
+    assert cached_count(books) == 3
+    with CaptureQueriesContext(connection) as queries:
+        assert cached_count(books.order_by("search_title")) == 3
+    assert not any("__count" in q["sql"] for q in queries.captured_queries)
+    assert cached_count(Book.objects.filter(catalog_id=3)) == 1
+
+
+@pytest.mark.usefixtures("load_db_data")
+@pytest.mark.django_db
+@pytest.mark.override_config(SOPDS_CACHE_TIME=60, SOPDS_MAXITEMS=1)
+def test_book_page_stale_count(override_config) -> None:
+    """Устаревшее число книг в кэше не скрывает книги страниц"""
+    cache.clear()
+    query = Book.objects.filter(catalog_id=4).order_by("search_title", "-docdate")
+    rows, op = book_page(query, 1, False, count=True)
+    assert op.num_pages == 3
+
+    catalog = Catalog.objects.get(id=4)
+    create_books(catalog, [("Zeta", []), ("Zeta 2", [])])
+    rows, op = book_page(query, 3, False, count=True)
+    assert len(rows) == 1
+    assert op.has_next
+    assert op.num_pages == 4
+    rows, op = book_page(query, 5, False, count=True)
+    assert len(rows) == 1
+    assert not op.has_next
+    assert op.num_pages == 5
+    pages = [book_page(query, page, False, count=True)[0] for page in range(1, 6)]
+    assert sorted(row.id for rows in pages for row in rows) == sorted(
+        query.values_list("id", flat=True)
+    )
+
+    # Книжная полка не кэшируется
+    with CaptureQueriesContext(connection) as queries:
+        book_page(query, 1, False, count=True, cache_count=False)
+    assert any("__count" in q["sql"] for q in queries.captured_queries)
@@ -0,0 +1,83 @@
+import os
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from opds_catalog import covers, opdsdb
+from opds_catalog.covers import COVER, THUMBNAIL, CoverCache, CoverJob
+from opds_catalog.models import Book
+from opds_catalog.sopdscan import opdsScanner
+from opds_catalog.utils import get_cover_cache
+
+
+def test_cover_cache(tmp_path) -> None:
+    cache = CoverCache(str(tmp_path), 1024 * 1024)
+    assert cache.get(1, 100, COVER) == (False, None)
+
+    cache.put(1, 100, COVER, b"image")
+    cache.put(2, 100, COVER, None)
+    assert cache.get(1, 100, COVER) == (True, b"image")
+    assert cache.get(2, 100, COVER) == (True, None)
+    # Размер файла книги изменился - запись кэша не используется
+    assert cache.get(1, 200, COVER) == (False, None)
+    assert cache.get(1, 100, THUMBNAIL) == (False, None)
+
+
+def test_cover_cache_evict(tmp_path) -> None:
+    cache = CoverCache(str(tmp_path), 1024 * 1024)
+    for book_id in range(5):
+        image_path, _ = cache.path(book_id, 1, COVER)
+        cache.put(book_id, 1, COVER, b"x" * 300)
+        os.utime(image_path, (book_id, book_id))
+    # Чтение обновляет время использования записи
+    cache.get(0, 1, COVER)
+
+    cache.max_size = 1000
+    assert cache.evict() == 2
+    found = [book_id for book_id in range(5) if cache.get(book_id, 1, COVER)[0]]
+    assert found == [0, 3, 4]
+
+
+def test_cache_cover_reuses_archive(tmp_path, monkeypatch) -> None:
+    """Архив открывается один раз для всех книг из него"""
+    opened = []
+    zip_file = covers.zipfile.ZipFile
+
+    def counting_zip_file(path, *args, **kwargs):
+        opened.append(path)
+        return zip_file(path, *args, **kwargs)
+
+    monkeypatch.setattr(covers.zipfile, "ZipFile", counting_zip_file)
+    path = os.path.join(os.path.dirname(__file__), "data", "books.zip")
+    cache = CoverCache(str(tmp_path), 1024 * 1024)
+    names = ["539603.fb2", "539485.fb2", "539273.fb2"]
+    try:
+        for book_id, name in enumerate(names, 1):
+            job = CoverJob(book_id, 1, name, "fb2", path, name)
+            covers.cache_cover(job, cache, 100)
+    finally:
+        covers.open_archive.close()
+
+    assert opened == [path]
+    for book_id in range(1, len(names) + 1):
+        assert cache.contains(book_id, 1, COVER)
+
+
+@pytest.mark.django_db
+def test_sopds_covers_command(
+    fake_sopds_root_lib, cover_cache_dir, override_config, tmp_path
+) -> None:
+    """Команда sopds_covers извлекает обложки всех книг каталога"""
+    opdsdb.clear_all()
+    opdsScanner().scan_all()
+    with override_config(SOPDS_SCANNER_LOG=str(tmp_path / "scanner.log")):
+        out = StringIO()
+        call_command("sopds_covers", stdout=out)
+        cache = get_cover_cache()
+        for book in Book.objects.all():
+            assert cache.contains(book.id, book.filesize, COVER)
+
+        out = StringIO()
+        call_command("sopds_covers", stdout=out)
+        assert f"already cached: {Book.objects.count()}" in out.getvalue()
@@ -1,13 +1,16 @@
 # -*- coding: utf-8 -*-
 
 import base64
+import io
 import os
 import zipfile
 from pathlib import Path
 
 import pytest
 from constance import config
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from opds_catalog.utils import (
@@ -59,10 +62,92 @@ class TestDownloads(object):
         assert response["Content-Length"] == "495373"
 
     @pytest.mark.override_config(SOPDS_AUTH=False)
-    def test_download_zip(self, client):
+    def test_download_zip(self, client, test_rootlib):
+        expected = read_file_as_iobytes(os.path.join(test_rootlib, "262001.fb2"))
         response = client.get(reverse("opds:download", args=(5, 1)))
         assert response.status_code == 200
-        assert response["Content-Length"] == "219508"
+        assert not response.has_header("Content-Length")
+        content = io.BytesIO(b"".join(response.streaming_content))
+        with zipfile.ZipFile(content) as zf:
+            assert zf.testzip() is None
+            assert zf.namelist() == ["The_Sanctuary_Sparrow.fb2"]
+            assert zf.read("The_Sanctuary_Sparrow.fb2") == expected.getvalue()
+
+    @pytest.mark.override_config(SOPDS_AUTH=False)
+    def test_download_zip_zipped_book(self, client, test_rootlib):
+        """Сжатая книга из архива библиотеки копируется без перепаковки"""
+        expected = read_book_from_zip_file(
+            os.path.join(test_rootlib, "books.zip"), "539273.fb2"
+        )
+        response = client.get(reverse("opds:download", args=(8, 1)))
+        assert response.status_code == 200
+        content = b"".join(response.streaming_content)
+        assert response["Content-Length"] == str(len(content))
+        with zipfile.ZipFile(io.BytesIO(content)) as zf:
+            assert zf.testzip() is None
+            (name,) = zf.namelist()
+            assert zf.read(name) == expected.getvalue()
+
+    @pytest.mark.override_config(SOPDS_AUTH=False)
+    def test_download_zipped_book(self, client, test_rootlib):
+        expected = read_book_from_zip_file(
+            os.path.join(test_rootlib, "books.zip"), "539273.fb2"
+        )
+        response = client.get(reverse("opds:download", args=(8, 0)))
+        assert response.status_code == 200
+        assert response["Accept-Ranges"] == "bytes"
+        assert response["Content-Length"] == str(len(expected.getvalue()))
+        assert b"".join(response.streaming_content) == expected.getvalue()
+
+    @pytest.mark.override_config(SOPDS_AUTH=False)
+    @pytest.mark.parametrize(
+        "book_id, byte_range, expected_range",
+        [
+            (5, "bytes=100-199", (100, 199)),
+            (5, "bytes=495000-", (495000, 495372)),
+            (5, "bytes=-73", (495300, 495372)),
+            (8, "bytes=1000-2999", (1000, 2999)),
+        ],
+    )
+    def test_download_range(
+        self, client, test_rootlib, book_id, byte_range, expected_range
+    ):
+        book = Book.objects.get(id=book_id)
+        if book_id == 5:
+            expected = read_file_as_iobytes(os.path.join(test_rootlib, book.filename))
+        else:
+            expected = read_book_from_zip_file(
+                os.path.join(test_rootlib, book.path), book.filename
+            )
+        start, end = expected_range
+        size = len(expected.getvalue())
+
+        response = client.get(
+            reverse("opds:download", args=(book_id, 0)), HTTP_RANGE=byte_range
+        )
+        assert response.status_code == 206
+        assert response["Content-Range"] == f"bytes {start}-{end}/{size}"
+        assert response["Content-Length"] == str(end - start + 1)
+        content = b"".join(response.streaming_content)
+        assert content == expected.getvalue()[start : end + 1]
+
+    @pytest.mark.override_config(SOPDS_AUTH=False)
+    def test_download_range_not_satisfiable(self, client):
+        response = client.get(
+            reverse("opds:download", args=(5, 0)), HTTP_RANGE="bytes=495373-"
+        )
+        assert response.status_code == 416
+        assert response["Content-Range"] == "bytes */495373"
+
+    @pytest.mark.override_config(SOPDS_AUTH=False)
+    def test_download_if_range(self, client):
+        url = reverse("opds:download", args=(5, 0))
+        etag = client.get(url)["ETag"]
+        response = client.get(url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=etag)
+        assert response.status_code == 206
+        response = client.get(url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"0-0"')
+        assert response.status_code == 200
+        assert response["Content-Length"] == "495373"
 
     @pytest.mark.override_config(SOPDS_AUTH=False)
     def test_download_unexisted_book(self, client, unexisted_book) -> None:
@@ -285,7 +370,12 @@ class TestGetFileDataConv(object):
 @pytest.mark.django_db
 @pytest.mark.parametrize("use_sax", [(True), (False)])
 def test_get_book_cover(
-    fake_sopds_root_lib, create_regular_book, client, override_config, use_sax
+    fake_sopds_root_lib,
+    cover_cache_dir,
+    create_regular_book,
+    client,
+    override_config,
+    use_sax,
 ) -> None:
     book: Book = create_regular_book
     assert book is not None
@@ -297,6 +387,66 @@ def test_get_book_cover(
         assert actual["Content-Length"] == "56360"
 
 
+@pytest.mark.django_db
+def test_get_book_cover_cached(
+    fake_sopds_root_lib, cover_cache_dir, create_regular_book, client, override_config
+) -> None:
+    """Повторные запросы обложки и миниатюры не читают файл книги"""
+    book: Book = create_regular_book
+    cover = client.get(reverse("opds:cover", args=(book.id,)))
+    thumb = client.get(reverse("opds:thumb", args=(book.id,)))
+    assert cover.status_code == 200
+    assert thumb.status_code == 200
+    assert cover["ETag"] != thumb["ETag"]
+
+    with override_config(SOPDS_ROOT_LIB="/nonexistent"):
+        actual = client.get(reverse("opds:thumb", args=(book.id,)))
+        assert actual.status_code == 200
+        assert actual.content == thumb.content
+
+        actual = client.get(
+            reverse("opds:cover", args=(book.id,)), HTTP_IF_NONE_MATCH=cover["ETag"]
+        )
+        assert actual.status_code == 304
+
+        # Книга читается из БД один раз для ETag, Last-Modified и самого view
+        with CaptureQueriesContext(connection) as queries:
+            actual = client.get(reverse("opds:cover", args=(book.id,)))
+        assert actual.status_code == 200
+        book_queries = [
+            query
+            for query in queries.captured_queries
+            if 'FROM "opds_catalog_book"' in query["sql"]
+        ]
+        assert len(book_queries) == 1
+
+    assert client.get(reverse("opds:cover", args=(book.id + 1000,))).status_code == 404
+
+
+@pytest.mark.django_db
+def test_get_book_cover_missing(
+    tmp_path, cover_cache_dir, create_regular_book, client, override_config
+) -> None:
+    """Отсутствие обложки запоминается в кэше"""
+    (tmp_path / "book.pdf").write_bytes(b"%PDF-1.4\n")
+    book = Book.objects.create(
+        filename="book.pdf",
+        search_title="BOOK",
+        cat_type=0,
+        path=".",
+        format="pdf",
+        filesize=9,
+        catalog=create_regular_book.catalog,
+    )
+    url = reverse("opds:cover", args=(book.id,))
+    with override_config(SOPDS_ROOT_LIB=str(tmp_path)):
+        assert client.get(url).status_code == 302
+    (tmp_path / "book.pdf").unlink()
+    with override_config(SOPDS_ROOT_LIB=str(tmp_path)):
+        assert client.get(url).status_code == 302
+    assert len(os.listdir(cover_cache_dir)) == 1
+
+
 @pytest.mark.django_db
 def test_wrong_encoded_fb2_zip(test_rootlib) -> None:
     """Тест чтения файла из ZIP архива с кодировкой, отличной от latin1(cp437)"""
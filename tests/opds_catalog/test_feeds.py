@@ -236,6 +236,39 @@ def test_feed_structure(url, client, load_db_data, override_config, opds_1_2) ->
     assert helpers.opds_link_profile_kind(feed)
 
 
+@pytest.mark.django_db
+def test_feed_keyset_links(client, load_db_data, override_config) -> None:
+    """Ссылки на соседние страницы фида содержат ключ страницы"""
+
+    def get_page(url):
+        response = client.get(url)
+        assert response.status_code == HTTP_OK
+        feed = etree.parse(BytesIO(response.content))
+        links = {link.get("rel"): link.get("href") for link in feed.findall("{*}link")}
+        ids = [entry.findtext("{*}id") for entry in feed.findall("{*}entry")]
+        return links, ids
+
+    with override_config(SOPDS_AUTH=False, SOPDS_MAXITEMS=1):
+        url = reverse("opds_catalog:cat_tree", kwargs={"cat_id": 4})
+        pages = [get_page(url)]
+        for _page in range(2):
+            pages.append(get_page(pages[-1][0]["next"]))
+
+        assert [ids for _links, ids in pages] == [["b8"], ["b7"], ["b6"]]
+        assert pages[0][0]["next"].endswith("/2/?after=8")
+        assert pages[2][0]["prev"].endswith("/2/?before=6")
+        assert get_page(pages[2][0]["prev"])[1] == ["b7"]
+
+        url = reverse(
+            "opds_catalog:searchbooks", kwargs={"searchtype": "m", "searchterms": "а"}
+        )
+        links, ids = get_page(url)
+        assert "?after=" in links["next"]
+        next_links, next_ids = get_page(links["next"])
+        assert next_ids != ids
+        assert get_page(next_links["prev"])[1] == ids
+
+
 def _validate_opds_feed(feed, schema) -> bool:
     validator = etree.RelaxNG(schema)
     result = validator.validate(feed)
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+from opds_catalog.inotify import LibraryWatcher
+
+
+@pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="inotify is Linux only"
+)
+def test_library_watcher_batches(tmp_path) -> None:
+    """Изменения файлов собираются в пакет после паузы в событиях"""
+    watcher = LibraryWatcher(str(tmp_path), debounce=0.2, max_delay=2)
+    watcher.start()
+    try:
+        (tmp_path / "deleted.fb2").write_text("x")
+        (tmp_path / "sub").mkdir()
+        (tmp_path / "sub" / "books.zip").write_text("x")
+        os.remove(tmp_path / "deleted.fb2")
+
+        changes = next(watcher.batches())
+    finally:
+        watcher.close()
+
+    assert not changes.overflow
+    assert changes.changed == {str(tmp_path / "sub" / "books.zip")}
+    assert changes.deleted == {str(tmp_path / "deleted.fb2")}
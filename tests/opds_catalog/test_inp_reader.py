@@ -0,0 +1,46 @@
+from opds_catalog.inp_reader import DEFAULT_FORMAT, InpDecoder, InpRecord
+
+
+def test_inp_decoder_default_format() -> None:
+    """Разбор строки INP со структурой по умолчанию"""
+    line = "\x04".join(
+        [
+            "Толстой,Лев,Николаевич:",
+            "prose_classic:",
+            "Война и мир",
+            "",
+            "0",
+            "12345",
+            "1024",
+            "12345",
+            "0",
+            "fb2",
+            "2010-01-01",
+            "ru\r\n",
+        ]
+    ).encode("utf-8")
+    record = InpDecoder(DEFAULT_FORMAT, "fb2-1.zip").decode(line)
+    assert record == InpRecord(
+        authors=["Толстой,Лев,Николаевич"],
+        genres=["prose_classic"],
+        title="Война и мир",
+        series=[],
+        file="12345",
+        size=1024,
+        ext="fb2",
+        date="2010-01-01",
+        lang="ru\r\n",
+        folder="fb2-1.zip",
+    )
+
+
+def test_inp_decoder_structure() -> None:
+    """Разбор строки INP со структурой из structure.info"""
+    decoder = InpDecoder(["TITLE", "FILE", "EXT", "DEL", "FOLDER", "KEYWORDS"], "")
+    record = decoder.decode(b"Title\x04f1\x04epub\x04\x04archive.zip\x04a,b\r\n")
+    assert record.title == "Title"
+    assert record.folder == "archive.zip"
+    assert record.authors == []
+    assert record.size == 0
+    # Книга, помеченная как удаленная, пропускается
+    assert decoder.decode(b"Title\x04f1\x04epub\x041\x04archive.zip\x04\r\n") is None
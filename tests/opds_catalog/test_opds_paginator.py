@@ -0,0 +1,66 @@
+import pytest
+
+from opds_catalog.opds_paginator import Paginator
+
+
+def positions(op: Paginator) -> tuple[range, range]:
+    return (
+        range(op.d1_first_pos, op.d1_last_pos + 1),
+        range(op.d2_first_pos, op.d2_last_pos + 1),
+    )
+
+
+@pytest.mark.parametrize(
+    "count, page, num_pages, items",
+    [
+        (0, 1, 1, range(0)),
+        (5, 1, 3, range(0, 2)),
+        (5, 3, 3, range(4, 5)),
+        # Число элементов кратно числу элементов на странице
+        (6, 3, 3, range(4, 6)),
+        # Страница за последней
+        (6, 4, 3, range(0)),
+    ],
+)
+def test_paginator(count, page, num_pages, items) -> None:
+    op = Paginator(count, 0, page, 2)
+    assert op.num_pages == num_pages
+    assert positions(op) == (items, range(0))
+    assert op.has_previous == (page > 1)
+    assert op.has_next == (page < num_pages)
+
+
+def test_paginator_empty() -> None:
+    op = Paginator(0, 0)
+    assert positions(op) == (range(0), range(0))
+    assert op.num_pages == 1
+    assert not op.has_previous
+    assert not op.has_next
+    assert op.page_range == [1]
+
+
+@pytest.mark.parametrize(
+    "page, catalogs, books",
+    [
+        (1, range(0, 3), range(0)),
+        # Граница подкаталогов и книг внутри страницы
+        (2, range(3, 5), range(0, 1)),
+        (3, range(0), range(1, 4)),
+        (4, range(0), range(4, 5)),
+        (5, range(0), range(0)),
+    ],
+)
+def test_paginator_catalog(page, catalogs, books) -> None:
+    """Элементы страницы каталога: сначала подкаталоги (d1), затем книги (d2)"""
+    op = Paginator(5, 5, page, 3)
+    assert positions(op) == (catalogs, books)
+    assert op.num_pages == 4
+    assert op.has_next == (page < 4)
+
+
+def test_paginator_page_range() -> None:
+    op = Paginator(100, 0, 5, 10, half_pages_link=2)
+    assert op.page_range == [3, 4, 5, 6, 7]
+    op = Paginator(100, 0, 10, 10, half_pages_link=2)
+    assert op.page_range == [6, 7, 8, 9, 10]
+    assert not op.has_next
@@ -1,5 +1,5 @@
 from django.test import TestCase
-from opds_catalog.models import Catalog, bseries
+from opds_catalog.models import Author, Book, Catalog, Fingerprint, bseries
 
 from src.opds_catalog import opdsdb
 
@@ -85,3 +85,145 @@ class opdsdbTestCase(TestCase):
         ser = book.series.all()[0]
         self.assertEqual(ser.ser, "mywork")
         self.assertEqual(bseries.objects.get(ser=ser).ser_no, 1)
+
+    def test_book_writer(self):
+        """Тестирование пакетной записи книг BookWriter"""
+        cat = opdsdb.findcat("root/child")
+        writer = opdsdb.BookWriter(batch_size=2)
+        writer.add(
+            "book1.fb2",
+            "root/child",
+            cat,
+            "fb2",
+            "Book One",
+            "",
+            "",
+            "ru",
+            authors=["Test Author", "New Author"],
+            genres=["fantastic"],
+            series=[("mywork", 2)],
+        )
+        self.assertTrue(writer.is_pending("book1.fb2", "root/child"))
+        self.assertIsNone(opdsdb.findbook("book1.fb2", "root/child"))
+
+        writer.add(
+            "book2.fb2",
+            "root/child",
+            cat,
+            "fb2",
+            "Book Two",
+            "",
+            "",
+            "ru",
+            authors=["New Author"],
+            genres=["detective"],
+        )
+        self.assertEqual(len(writer), 0)
+        self.assertFalse(writer.is_pending("book1.fb2", "root/child"))
+
+        book = opdsdb.findbook("book1.fb2", "root/child")
+        self.assertEqual(book.avail, 2)
+        self.assertEqual(book.authors.count(), 2)
+        self.assertEqual(Author.objects.filter(full_name="Test Author").count(), 1)
+        self.assertEqual(Author.objects.filter(full_name="New Author").count(), 1)
+        self.assertEqual(bseries.objects.get(book=book).ser_no, 2)
+        self.assertEqual(book.genres.get().section, opdsdb.unknown_genre)
+
+        book = opdsdb.findbook("book2.fb2", "root/child")
+        self.assertEqual(book.authors.get().full_name, "New Author")
+        self.assertEqual(book.genres.get().subsection, "detective")
+        self.assertEqual(writer.flush(), 0)
+        self.assertEqual(
+            book.dup_key,
+            opdsdb.book_dup_key("BOOK TWO", book.authors.values_list("id", flat=True)),
+        )
+
+    def test_dup_keys(self):
+        """Тестирование ключа дубликатов book_dup_key и update_dup_keys"""
+        key = opdsdb.book_dup_key("Test  Book ", [2, 1])
+        self.assertEqual(key, opdsdb.book_dup_key("test book", [1, 2, 2]))
+        self.assertEqual(len(key), 32)
+        self.assertNotEqual(key, opdsdb.book_dup_key("test book", [1]))
+        self.assertNotEqual(key, opdsdb.book_dup_key("test book 2", [1, 2]))
+
+        # addbauthor не пересчитывает ключ
+        book = opdsdb.findbook("testbook.fb2", "root/child")
+        self.assertEqual(book.dup_key, "")
+        self.assertEqual(opdsdb.update_dup_keys(), 1)
+        self.assertEqual(opdsdb.update_dup_keys(), 0)
+        author = book.authors.get()
+        book.refresh_from_db()
+        self.assertEqual(book.dup_key, opdsdb.book_dup_key("Test Book", [author.id]))
+
+        cat = opdsdb.findcat("root/child")
+        for i in range(4):
+            other = opdsdb.addbook(
+                f"book{i}.fb2", "root/child", cat, ".fb2", "Test Book", "", "", "ru"
+            )
+            opdsdb.addbauthor(other, author)
+        Book.objects.update(dup_key="")
+        self.assertEqual(opdsdb.update_dup_keys(batch_size=2), 5)
+        self.assertEqual(Book.objects.filter(dup_key=book.dup_key).count(), 5)
+
+    def test_scan_cache(self):
+        """Тестирование кеша справочников на время сканирования"""
+        cache = opdsdb.scan_cache_start()
+        try:
+            self.assertIn("root/child", cache.catalogs)
+            self.assertIn("Test Author", cache.authors)
+            self.assertIn("fantastic", cache.genres)
+            self.assertIn("mywork", cache.series)
+
+            with self.assertNumQueries(0):
+                cat = opdsdb.findcat("root/child")
+                author = opdsdb.addauthor("Test Author")
+                genre = opdsdb.addgenre("fantastic")
+                series = opdsdb.addseries("mywork")
+            self.assertEqual(cat.cat_name, "child")
+            self.assertEqual(author.id, cache.authors["Test Author"])
+            self.assertEqual(genre.id, cache.genres["fantastic"])
+            self.assertEqual(series.id, cache.series["mywork"])
+
+            cat = opdsdb.addcattree("root/child/new", opdsdb.CAT_ZIP, 100)
+            self.assertIs(cache.catalogs["root/child/new"], cat)
+            author = opdsdb.addauthor("New Author")
+            self.assertEqual(cache.authors["New Author"], author.id)
+
+            writer = opdsdb.BookWriter()
+            self.assertIs(writer.authors, cache.authors)
+        finally:
+            opdsdb.scan_cache_stop()
+        self.assertIsNone(opdsdb.get_scan_cache())
+
+    def test_availability_marker(self):
+        """Тестирование пакетной установки признака avail"""
+        opdsdb.avail_check_prepare()
+        marker = opdsdb.AvailabilityMarker(batch_size=10)
+        self.assertTrue(marker.exists("testbook.fb2", "root/child"))
+        self.assertFalse(marker.exists("newbook.fb2", "root/child"))
+        self.assertEqual(opdsdb.findbook("testbook.fb2", "root/child").avail, 1)
+        self.assertEqual(marker.flush(), 1)
+        self.assertEqual(opdsdb.findbook("testbook.fb2", "root/child").avail, 2)
+
+    def test_fingerprint_index(self):
+        """Тестирование хранения отпечатков файлов и каталогов"""
+        index = opdsdb.FingerprintIndex()
+        index.preload()
+        self.assertIsNone(index.check("root/child", (500, 1, 10)))
+        index.store("root/child", (500, 1, 10))
+        index.store("root/old.zip", (100, 1, None))
+        self.assertEqual(index.flush(), 2)
+        self.assertEqual(Fingerprint.objects.count(), 2)
+
+        index = opdsdb.FingerprintIndex()
+        index.preload()
+        self.assertTrue(index.check("root/child", (500, 1, 10)))
+        self.assertFalse(index.check("root/child", (500, 2, 10)))
+        self.assertFalse(index.check("root/child", (500, 1, 11)))
+        index.store("root/child", (500, 2, 10))
+        self.assertEqual(index.flush(remove_stale=True), 1)
+        # Отпечаток архива, не встреченного при сканировании, удаляется
+        self.assertEqual(
+            list(Fingerprint.objects.values_list("path", "mtime")),
+            [("root/child", 2)],
+        )
@@ -1,12 +1,16 @@
 from opds_catalog.opdsdb import CAT_ZIP
 from opds_catalog.dl import getFileData
 import os
+from io import StringIO
 
 import pytest
 from constance import config
+from django.core.management import call_command
 
-from opds_catalog import opdsdb
-from opds_catalog.models import Author, Book, Catalog, Genre, Series
+from opds_catalog import covers, opdsdb, scan_workers, settings
+from opds_catalog.covers import COVER, thumbnail_variant
+from opds_catalog.utils import get_cover_cache
+from opds_catalog.models import Author, Book, Catalog, Genre, ScanCheckpoint, Series
 from opds_catalog.sopdscan import opdsScanner
 
 
@@ -249,6 +253,133 @@ class TestBookScaner(object):
         assert Series.objects.all().count() == 1
         assert Catalog.objects.all().count() == 5
 
+    def test_scanall_workers(self):
+        """Извлечение метаданных в пуле процессов дает тот же результат, что и scanall"""
+        opdsdb.clear_all()
+        scanner = opdsScanner(workers=2)
+        scanner.scan_all()
+        assert scanner.pool is None
+        assert scanner.books_added == 8
+        assert scanner.bad_books == 3
+        assert Book.objects.all().count() == 8
+        assert Author.objects.all().count() == 7
+        assert Genre.objects.all().count() == 6
+        assert Series.objects.all().count() == 1
+        assert Catalog.objects.all().count() == 5
+
+    def test_scanall_dup_keys(self, tmp_path, override_config):
+        """Сканер заполняет ключи дубликатов, sopds_duplicates_scanner их находит"""
+        opdsdb.clear_all()
+        opdsScanner().scan_all()
+        assert not Book.objects.filter(dup_key="").exists()
+        doubles = Book.objects.filter(title="The Sanctuary Sparrow")
+        assert doubles.count() > 1
+        assert doubles.values("dup_key").distinct().count() == 1
+
+        Book.objects.update(dup_key="")
+        out = StringIO()
+        with override_config(SOPDS_SCANNER_LOG=str(tmp_path / "scanner.log")):
+            call_command("sopds_duplicates_scanner", "start", stdout=out)
+        assert not Book.objects.filter(dup_key="").exists()
+        assert f"duplicates: {doubles.count() - 1}." in out.getvalue()
+
+    def test_scanall_extract_covers(self, cover_cache_dir, override_config):
+        """Обложки новых книг извлекаются в кэш при сканировании"""
+        opdsdb.clear_all()
+        with override_config(SOPDS_SCAN_EXTRACT_COVERS=True):
+            opdsScanner(workers=2).scan_all()
+        cache = get_cover_cache()
+        for book in Book.objects.all():
+            assert cache.contains(book.id, book.filesize, COVER)
+        book = Book.objects.get(filename=self.test_fb2, path=".")
+        assert len(cache.get(book.id, book.filesize, COVER)[1]) == 56360
+        thumb = thumbnail_variant(settings.THUMB_SIZE)
+        assert cache.contains(book.id, book.filesize, thumb)
+
+    def test_rescan_unchanged(self):
+        """Повторное сканирование не меняет состав книг и помечает их доступными"""
+        opdsdb.clear_all()
+        opdsScanner().scan_all()
+        scanner = opdsScanner()
+        scanner.scan_all()
+        assert scanner.books_added == 0
+        assert scanner.books_deleted[0] == 0
+        assert Book.objects.all().count() == 8
+        assert Book.objects.exclude(avail=2).count() == 0
+
+    def test_scanall_chunks(self):
+        """Сканирование с фиксацией результатов частями"""
+        opdsdb.clear_all()
+        config.SOPDS_SCAN_CHUNK_SIZE = 1
+        scanner = opdsScanner()
+        scanner.scan_all()
+        assert scanner.books_added == 8
+        assert Book.objects.all().count() == 8
+        assert Catalog.objects.all().count() == 5
+        assert ScanCheckpoint.objects.get_path() == ""
+
+    def test_scanall_resume(self):
+        """Продолжение прерванного сканирования пропускает обработанные каталоги"""
+        opdsdb.clear_all()
+        opdsScanner().scan_all()
+        # Корневой каталог обработан до прерывания сканирования
+        ScanCheckpoint.objects.set_path(".")
+        scanner = opdsScanner()
+        scanner.scan_all()
+        assert scanner.books_added == 0
+        assert scanner.books_skipped == 0
+        assert scanner.books_deleted[0] == 0
+        assert Book.objects.filter(avail=2).count() == 8
+        assert ScanCheckpoint.objects.get_path() == ""
+
+    def test_scan_changes(self):
+        """Обработка измененных и удаленных файлов в режиме наблюдения"""
+        opdsdb.clear_all()
+        scanner = opdsScanner()
+        scanner.scan_changes(
+            {
+                os.path.join(config.SOPDS_ROOT_LIB, self.test_fb2),
+                os.path.join(config.SOPDS_ROOT_LIB, self.test_zip),
+            },
+            set(),
+        )
+        in_zip = Book.objects.filter(path=self.test_zip).count()
+        assert in_zip > 0
+        assert scanner.books_added == in_zip + 1
+        assert Book.objects.filter(filename=self.test_fb2, path=".").exists()
+
+        # Повторная обработка архива не добавляет книги повторно
+        scanner.scan_changes(
+            {os.path.join(config.SOPDS_ROOT_LIB, self.test_zip)}, set()
+        )
+        assert scanner.books_added == 0
+        assert scanner.books_deleted == 0
+        assert Book.objects.filter(path=self.test_zip).count() == in_zip
+
+        scanner.scan_changes(
+            set(),
+            {
+                os.path.join(config.SOPDS_ROOT_LIB, self.test_fb2),
+                os.path.join(config.SOPDS_ROOT_LIB, self.test_zip),
+            },
+        )
+        assert scanner.books_deleted == in_zip + 1
+        assert Book.objects.count() == 0
+
+    def test_rescan_skip_unchanged(self):
+        """Повторное сканирование пропускает неизмененные каталоги и архивы"""
+        opdsdb.clear_all()
+        config.SOPDS_SCAN_SKIP_UNCHANGED = True
+        opdsScanner().scan_all()
+        scanner = opdsScanner()
+        scanner.scan_all()
+        assert scanner.dirs_skipped > 0
+        assert scanner.books_added == 0
+        assert scanner.bad_books == 0
+        assert scanner.books_deleted[0] == 0
+        assert Book.objects.all().count() == 8
+        assert Book.objects.exclude(avail=2).count() == 0
+
 
 @pytest.mark.django_db
 def test_inpx_scanner(fake_sopds_root_lib) -> None:
@@ -259,3 +390,37 @@ def test_inpx_scanner(fake_sopds_root_lib) -> None:
     assert scanner.books_added == 3
     assert scanner.bad_books == 0
     assert Book.objects.count() == scanner.books_added
+
+
+@pytest.mark.django_db
+def test_inpx_scanner_workers(fake_sopds_root_lib) -> None:
+    """Разбор INP файлов в пуле процессов"""
+    config.SOPDS_INPX_ENABLE = True
+    config.SOPDS_INPX_TEST_FILES = False
+    scanner = opdsScanner(workers=2)
+    scanner.scan_all()
+    assert scanner.books_added == 3
+    assert scanner.bad_books == 0
+    assert Book.objects.count() == scanner.books_added
+    assert Author.objects.count() > 0
+
+
+def test_parse_book_reuses_archive(monkeypatch) -> None:
+    """Обработчик пула открывает архив один раз для всех книг из него"""
+    opened = []
+    zip_file = covers.zipfile.ZipFile
+
+    def counting_zip_file(path, *args, **kwargs):
+        opened.append(path)
+        return zip_file(path, *args, **kwargs)
+
+    monkeypatch.setattr(covers.zipfile, "ZipFile", counting_zip_file)
+    path = os.path.join(os.path.dirname(__file__), "data", "books.zip")
+    names = ["539603.fb2", "539485.fb2", "539273.fb2"]
+    try:
+        titles = [scan_workers.parse_book(path, name, name).title for name in names]
+    finally:
+        covers.open_archive.close()
+
+    assert opened == [path]
+    assert all(titles)
@@ -1,9 +1,17 @@
+import os
+
 import pytest
 import zipfile
 
 from django.test import TestCase
 
-from opds_catalog.utils import get_lang_name, translit, get_infolist_filename
+from opds_catalog.utils import (
+    ZipCache,
+    ZipNameIndex,
+    get_lang_name,
+    translit,
+    get_infolist_filename,
+)
 
 
 class TestOpdsUtils(TestCase):
@@ -66,3 +74,71 @@ def test_get_infolist_filename(book_from_fs, filename, expected) -> None:
         infolist = zip.infolist()
     actual = get_infolist_filename(infolist, filename)
     assert actual == expected
+
+
+@pytest.mark.parametrize(
+    "book_from_fs, filenames, expected",
+    [
+        ("262001.zip", ["262002.fb2", "262001.fb2"], [None, "262001.fb2"]),
+        (
+            "wrong_encoded.zip",
+            ["Носов - Незнайка-путешественник.fb2", "missing.fb2"],
+            ["ì«ß«ó - ìÑº¡á⌐¬á-»πΓÑΦÑßΓóÑ¡¡¿¬.fb2", None],
+        ),
+    ],
+    indirect=["book_from_fs"],
+)
+def test_zip_name_index(book_from_fs, filenames, expected) -> None:
+    """Тест многократного поиска имен файлов в индексе zip архива."""
+
+    with zipfile.ZipFile(book_from_fs) as zip:
+        index = ZipNameIndex(zip.infolist())
+    assert [index.find(filename) for filename in filenames] == expected
+
+
+def write_zip(path, files: dict[str, bytes]) -> str:
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, content in files.items():
+            zf.writestr(name, content)
+    return str(path)
+
+
+def test_zip_cache(tmp_path) -> None:
+    """Архив открывается один раз и переоткрывается после изменения файла"""
+    cache = ZipCache(2)
+    path = write_zip(tmp_path / "books.zip", {"1.fb2": b"first"})
+
+    stream, size = cache.open(path, "1.fb2")
+    with stream:
+        assert (stream.read(), size) == (b"first", 5)
+    archive = cache.archives[path]
+    assert cache.find(path, "1.fb2").file_size == 5
+    assert cache.find(path, "2.fb2") is None
+    assert cache.archives[path] is archive
+
+    write_zip(path, {"1.fb2": b"changed", "2.fb2": b"second"})
+    os.utime(path, ns=(0, 0))
+    stream, size = cache.open(path, "2.fb2")
+    with stream:
+        assert stream.read() == b"second"
+    assert cache.archives[path] is not archive
+    assert archive.zipfile.fp is None
+    cache.clear()
+
+
+def test_zip_cache_evict(tmp_path) -> None:
+    """Давно не использовавшийся архив закрывается, открытые файлы остаются доступны"""
+    cache = ZipCache(2)
+    paths = [
+        write_zip(tmp_path / f"{i}.zip", {"book.fb2": str(i).encode()})
+        for i in range(3)
+    ]
+    stream, _size = cache.open(paths[0], "book.fb2")
+    cache.find(paths[1], "book.fb2")
+    cache.find(paths[0], "book.fb2")
+    cache.find(paths[2], "book.fb2")
+
+    assert list(cache.archives) == [paths[0], paths[2]]
+    cache.clear()
+    with stream:
+        assert stream.read() == b"0"
@@ -0,0 +1,48 @@
+import io
+import zipfile
+
+import pytest
+
+from opds_catalog.zipstream import ZipStream, can_copy
+
+CONTENT = b"<FictionBook>" + bytes(range(256)) * 1000 + b"</FictionBook>"
+
+
+def test_zip_stream_deflate() -> None:
+    zstream = ZipStream("книга.fb2", io.BytesIO(CONTENT), chunk_size=1000)
+    assert zstream.size is None
+    chunks = list(zstream)
+    assert len(chunks) > 3
+    assert zstream.source.closed
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == ["книга.fb2"]
+        assert zf.read("книга.fb2") == CONTENT
+
+
+@pytest.mark.parametrize("compression", [zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED])
+def test_zip_stream_copy(compression) -> None:
+    library = io.BytesIO()
+    with zipfile.ZipFile(library, "w", compression) as zf:
+        zf.writestr("other.fb2", b"other book")
+        zf.writestr("book.fb2", CONTENT)
+    with zipfile.ZipFile(library) as zf:
+        info = zf.getinfo("book.fb2")
+
+    assert can_copy(info) == (compression == zipfile.ZIP_DEFLATED)
+    if not can_copy(info):
+        return
+    zstream = ZipStream("book.fb2", library, info, chunk_size=100)
+    content = b"".join(zstream)
+    assert len(content) == zstream.size
+    with zipfile.ZipFile(io.BytesIO(content)) as zf:
+        assert zf.testzip() is None
+        assert zf.read("book.fb2") == CONTENT
+        assert zf.getinfo("book.fb2").compress_size == info.compress_size
+
+
+def test_zip_stream_close() -> None:
+    source = io.BytesIO(CONTENT)
+    ZipStream("book.fb2", source).close()
+    assert source.closed
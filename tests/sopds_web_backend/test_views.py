@@ -0,0 +1,47 @@
+import re
+
+import pytest
+
+
+@pytest.fixture
+def web_settings(settings, override_config):
+    settings.STORAGES = {
+        **settings.STORAGES,
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+        },
+    }
+    with override_config(SOPDS_AUTH=False, SOPDS_MAXITEMS=1, SOPDS_CACHE_TIME=0):
+        yield
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("load_db_data", "web_settings")
+@pytest.mark.parametrize(
+    "page, links, has_previous, has_next",
+    [
+        (1, ["2", "3"], False, True),
+        (2, ["1", "3"], True, True),
+        # Число книг кратно числу книг на странице: пустой страницы нет
+        (3, ["1", "2"], True, False),
+    ],
+)
+def test_catalog_page_links(client, page, links, has_previous, has_next) -> None:
+    """Ссылки на страницы каталога из трех книг по одной книге на странице"""
+    response = client.get(f"/web/catalog/?cat=4&page={page}")
+    assert response.status_code == 200
+    content = response.content.decode()
+    assert re.findall(r'aria-label="Page (\d+)"', content) == links
+    assert re.search(r'<li class="current">\s*%d\s*</li>' % page, content)
+    assert ('aria-label="Previous page"' in content) == has_previous
+    assert ('aria-label="Next page"' in content) == has_next
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("load_db_data", "web_settings")
+def test_search_books_page_links(client) -> None:
+    response = client.get("/web/search/books/?searchtype=m&searchterms=а")
+    assert response.status_code == 200
+    content = response.content.decode()
+    assert re.findall(r'aria-label="Page (\d+)"', content) == ["2", "3"]
+    assert "&after=" in content